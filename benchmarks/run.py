@@ -0,0 +1,377 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+import src.analysis as eda
+import src.artifact_io as aio
+import src.create_dataset as cd
+import src.evaluate_performance as ep
+import src.generate_features as gf
+import src.profiling as prof
+import src.score_model as sm
+import src.train_model as tm
+from benchmarks.synthetic import write_raw_data
+
+
+logger = logging.getLogger("benchmarks")
+
+STAGES = ("create_dataset", "generate_features", "save_figures", "train_model", "score_model",
+          "evaluate_performance")
+BASELINES = Path(__file__).with_name("baselines.json")
+
+
+def machine() -> dict:
+    """Describes the host, so that baselines are only compared on similar machines."""
+    return {"python": platform.python_version(), "platform": platform.platform(terse=True),
+            "processor": platform.machine(), "cpus": os.cpu_count()}
+
+
+def benchmark_size(raw_path: Path, cloud_data_index: dict, config: dict, work_dir: Path,
+                   stages: tuple = STAGES, repeat: int = 3) -> dict:
+    """Runs every stage function on one synthetic data file and measures it.
+
+    Each stage runs `repeat` times on the output of the previous stage, and the run
+    with the shortest wall time is kept; its CPU time and peak resident set size are
+    recorded by a `StageProfiler`. Stages that are not selected still run once, when a
+    selected stage needs their output.
+
+    Args:
+        raw_path: The synthetic raw data file, see `write_raw_data`.
+        cloud_data_index: The class blocks of the file.
+        config: The pipeline configuration providing the stage settings.
+        work_dir: A scratch directory for figures.
+        stages: The stages to measure.
+        repeat: The number of runs of each stage.
+
+    Returns:
+        Mapping of stage name to its best record: rows, wall and CPU seconds, peak RSS
+        and rows per second.
+    """
+    runners = {
+        "create_dataset": lambda out: cd.create_dataset(
+            raw_path, {**config["create_dataset"], "cloud_data_index": cloud_data_index}),
+        "generate_features": lambda out: gf.generate_features(out["create_dataset"], config["generate_features"]),
+        "save_figures": lambda out: eda.save_figures(out["generate_features"], work_dir, config["analysis"]),
+        "train_model": lambda out: tm.train_model(out["generate_features"], config["train_model"]),
+        "score_model": lambda out: sm.score_model(out["train_model"][1].test(config["score_model"]["initial_features"]),
+                                                  out["train_model"][0], config["score_model"]),
+        "evaluate_performance": lambda out: ep.evaluate_performance(
+            out["score_model"], out["train_model"][1].test([config["evaluate_performance"]["target"]]),
+            config["evaluate_performance"]),
+    }
+    # Rows each stage processes
+    rows = {
+        "create_dataset": lambda out: len(out["create_dataset"]),
+        "generate_features": lambda out: len(out["generate_features"]),
+        "save_figures": lambda out: len(out["generate_features"]),
+        "train_model": lambda out: len(out["train_model"][1].train_index),
+        "score_model": lambda out: len(out["score_model"]),
+        "evaluate_performance": lambda out: len(out["score_model"]),
+    }
+    last = max(STAGES.index(stage) for stage in stages)
+    outputs, results = {}, {}
+    for stage in STAGES[: last + 1]:
+        if stage not in stages:
+            outputs[stage] = runners[stage](outputs)
+            continue
+        best = None
+        for _ in range(repeat):
+            profiler = prof.StageProfiler(work_dir)
+            with profiler.stage(stage) as record:
+                outputs[stage] = runners[stage](outputs)
+                record["rows"] = rows[stage](outputs)
+            if best is None or record["wall_seconds"] < best["wall_seconds"]:
+                best = record
+        results[stage] = {name: best[name] for name in
+                          ("rows", "wall_seconds", "cpu_seconds", "peak_rss_mb", "rows_per_second")}
+        logger.info("%s on %d rows: %.4f s", stage, best["rows"], best["wall_seconds"])
+    return results
+
+
+def run_benchmarks(sizes: list[int], config: dict, stages: tuple = STAGES, repeat: int = 3,
+                   data_dir: Optional[Path] = None, random_state: int = 0, dtypes: bool = False,
+                   training: bool = False) -> dict:
+    """Benchmarks the stage functions on synthetic data of each size.
+
+    Args:
+        sizes: The numbers of rows of the synthetic data files.
+        config: The pipeline configuration providing the stage settings.
+        stages: The stages to measure.
+        repeat: The number of runs of each stage.
+        data_dir: A directory keeping the generated data files for later runs; they
+            are written to a temporary directory and deleted by default.
+        random_state: The seed of the synthetic data.
+        dtypes: Whether to compare the compact and float64 types instead of timing the
+            stages, see `compare_dtypes`.
+        training: Whether to compare out-of-core and in-memory training instead of
+            timing the stages, see `compare_training`.
+
+    Returns:
+        Mapping of "<stage>@<rows>" to the record of the stage on that many rows, or of
+        "dtypes@<rows>" or "training@<rows>" to the comparison on that many rows.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(data_dir or tmp)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        for size in sizes:
+            raw_path = data_dir / f"clouds-{size}-{random_state}.data"
+            index_path = raw_path.with_suffix(".json")
+            if raw_path.exists() and index_path.exists():
+                with open(index_path) as f:
+                    cloud_data_index = json.load(f)
+            else:
+                cloud_data_index = write_raw_data(raw_path, size, random_state)
+                with open(index_path, "w") as f:
+                    json.dump(cloud_data_index, f)
+            work_dir = Path(tmp) / f"work-{size}"
+            work_dir.mkdir()
+            if dtypes:
+                results[f"dtypes@{size}"] = compare_dtypes(raw_path, cloud_data_index, config, work_dir)
+                continue
+            if training:
+                results[f"training@{size}"] = compare_training(raw_path, cloud_data_index, config, work_dir)
+                continue
+            for stage, record in benchmark_size(raw_path, cloud_data_index, config, work_dir,
+                                                stages, repeat).items():
+                results[f"{stage}@{size}"] = record
+    return results
+
+
+def _directory_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file()) / prof.MB
+
+
+def compare_dtypes(raw_path: Path, cloud_data_index: dict, config: dict, work_dir: Path) -> dict:
+    """Runs the pipeline stages with float64 and with compact types, and compares them.
+
+    The features are measured in memory and as an npy artifact, the format whose size
+    follows the column types; the model is then trained, scored and evaluated in both
+    modes with the same configuration and, unless the configuration sets one, the
+    same forest seed.
+
+    Args:
+        raw_path: The synthetic raw data file, see `write_raw_data`.
+        cloud_data_index: The class blocks of the file.
+        config: The pipeline configuration providing the stage settings.
+        work_dir: A scratch directory for the artifacts.
+
+    Returns:
+        Mapping of "float64" and "compact" to the features' size in MB in memory and on
+        disk, the AUC and the accuracy of each mode, and a "difference" entry with the
+        compact minus float64 AUC and accuracy, the largest absolute difference of the
+        predicted probabilities and the number of changed predictions.
+    """
+    evaluate_config = {**config["evaluate_performance"], "bootstrap": None, "curve_points": None}
+    # Both modes grow the same forest, so that only the types differ
+    train_config = {**config["train_model"],
+                    "model_params": {"random_state": 0, **config["train_model"]["model_params"]}}
+    report, scores = {}, {}
+    for mode, compact in (("float64", False), ("compact", True)):
+        data = cd.create_dataset(raw_path, {**config["create_dataset"], "cloud_data_index": cloud_data_index,
+                                            "compact_dtypes": compact})
+        features = gf.generate_features(data, config["generate_features"])
+        artifact = work_dir / f"features-{mode}"
+        aio.save_frame(features, artifact, "npy")
+        model, split = tm.train_model(features, train_config)
+        scores[mode] = sm.score_model(split.test(config["score_model"]["initial_features"]), model,
+                                      config["score_model"])
+        metrics = ep.evaluate_performance(scores[mode], split.test([evaluate_config["target"]]),
+                                          evaluate_config)
+        report[mode] = {
+            "memory_mb": features.memory_usage(deep=True).sum() / prof.MB,
+            "artifact_mb": _directory_mb(artifact),
+            "auc": float(metrics["AUC"]),
+            "accuracy": float(metrics["Accuracy"]),
+        }
+        logger.info("%s features: %.1f MB in memory, AUC %.6f", mode, report[mode]["memory_mb"],
+                    report[mode]["auc"])
+    probability = [scores[mode]["predicted_probability"].to_numpy() for mode in ("float64", "compact")]
+    binary = [scores[mode]["predicted_binary"].to_numpy() for mode in ("float64", "compact")]
+    report["difference"] = {
+        "auc": report["compact"]["auc"] - report["float64"]["auc"],
+        "accuracy": report["compact"]["accuracy"] - report["float64"]["accuracy"],
+        "max_probability": float(abs(probability[1] - probability[0]).max()),
+        "changed_predictions": int((binary[1] != binary[0]).sum()),
+    }
+    return report
+
+
+def compare_training(raw_path: Path, cloud_data_index: dict, config: dict, work_dir: Path) -> dict:
+    """Trains in memory and out of core on the same features, and compares them.
+
+    The features are written as an npy artifact. Out-of-core training streams it with
+    the `train_model.out_of_core` settings, in this process so that its memory is
+    measured; in-memory training loads it whole, trains and saves the train and test
+    sets. Each model is scored and evaluated on its own test set.
+
+    Args:
+        raw_path: The synthetic raw data file, see `write_raw_data`.
+        cloud_data_index: The class blocks of the file.
+        config: The pipeline configuration providing the stage settings.
+        work_dir: A scratch directory for the artifacts.
+
+    Returns:
+        Mapping of "in_memory" and "out_of_core" to the wall seconds, peak RSS and peak
+        of traced allocations of training, and the AUC and accuracy of the model. The
+        RSS also counts the memory-mapped pages of the artifacts read and written.
+    """
+    evaluate_config = {**config["evaluate_performance"], "bootstrap": None, "curve_points": None}
+    train_config = {**config["train_model"],
+                    "model_params": {"random_state": 0, **config["train_model"]["model_params"]},
+                    "out_of_core": {**config["train_model"].get("out_of_core", {}), "processes": 1}}
+    features_path = work_dir / "cloud_cleaned"
+    data = cd.create_dataset(raw_path, {**config["create_dataset"], "cloud_data_index": cloud_data_index})
+    aio.save_frame(gf.generate_features(data, config["generate_features"]), features_path, "npy")
+    del data
+
+    def in_memory(out_dir):
+        model, split = tm.train_model(aio.load_frame(features_path, mmap=False), train_config)
+        tm.save_data(split, out_dir, "npy")
+        return model
+
+    runners = {
+        "out_of_core": lambda out_dir: tm.train_model_out_of_core(features_path, out_dir, train_config, "npy")[0],
+        "in_memory": in_memory,
+    }
+    report = {}
+    for mode, train in runners.items():
+        out_dir = work_dir / mode
+        out_dir.mkdir()
+        profiler = prof.StageProfiler(work_dir, trace_memory=True)
+        with profiler.stage(mode) as record:
+            model = train(out_dir)
+        test = aio.load_frame(out_dir / "test")
+        metrics = ep.evaluate_performance(sm.score_model(test, model, config["score_model"]), test,
+                                          evaluate_config)
+        report[mode] = {"wall_seconds": record["wall_seconds"], "peak_rss_mb": record["peak_rss_mb"],
+                        "heap_mb": record["tracemalloc_peak_mb"], "auc": float(metrics["AUC"]),
+                        "accuracy": float(metrics["Accuracy"])}
+        logger.info("%s training: %.1f s, peak RSS %.0f MB, AUC %.6f", mode, record["wall_seconds"],
+                    record["peak_rss_mb"], report[mode]["auc"])
+        del model, test
+    return report
+
+
+def compare(results: dict, baselines: dict, threshold: float = 0.25, min_seconds: float = 0.01) -> list[str]:
+    """Finds the benchmarks that became slower than their baseline.
+
+    Args:
+        results: The benchmark results, see `run_benchmarks`.
+        baselines: The stored results to compare against, keyed like the results.
+        threshold: The relative slowdown tolerated before a benchmark counts as a regression.
+        min_seconds: Wall times below this are timing noise and never count as regressions.
+
+    Returns:
+        A description of each regression; empty when there are none.
+    """
+    regressions = []
+    for name, record in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        limit = max(baseline["wall_seconds"] * (1 + threshold), min_seconds)
+        if record["wall_seconds"] > limit:
+            regressions.append(
+                f"{name}: {record['wall_seconds']:.4f} s vs baseline {baseline['wall_seconds']:.4f} s "
+                f"(+{record['wall_seconds'] / baseline['wall_seconds'] - 1:.0%})"
+            )
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic clouds data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000],
+                        help="Numbers of rows of the synthetic data")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="Stages to measure")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest is kept")
+    parser.add_argument("--config", default="config/default-config.yaml", help="Pipeline configuration")
+    parser.add_argument("--data-dir", help="Directory keeping the generated data files between runs")
+    parser.add_argument("--baselines", default=str(BASELINES), help="Stored baseline results")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Relative slowdown counted as a regression; defaults to the baselines' threshold")
+    parser.add_argument("--update", action="store_true", help="Store the results as the new baselines")
+    parser.add_argument("--output", help="File to write the results to as JSON")
+    parser.add_argument("--compare-dtypes", action="store_true",
+                        help="Compare the size and accuracy of compact and float64 types instead of timing")
+    parser.add_argument("--compare-training", action="store_true",
+                        help="Compare the memory and accuracy of out-of-core and in-memory training instead of timing")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger.setLevel(logging.INFO)
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    if args.compare_dtypes:
+        results = run_benchmarks(args.sizes, config, data_dir=args.data_dir, dtypes=True)
+        print(f"{'benchmark':<24}{'types':<10}{'memory MB':>11}{'disk MB':>10}{'AUC':>10}{'accuracy':>10}")
+        for name, report in results.items():
+            for mode in ("float64", "compact"):
+                record = report[mode]
+                print(f"{name:<24}{mode:<10}{record['memory_mb']:>11.1f}{record['artifact_mb']:>10.1f}"
+                      f"{record['auc']:>10.6f}{record['accuracy']:>10.6f}")
+            difference = report["difference"]
+            print(f"{name:<24}{'change':<10}{'':>21}{difference['auc']:>+10.6f}{difference['accuracy']:>+10.6f}"
+                  f"  max |dp| {difference['max_probability']:.2g}, "
+                  f"{difference['changed_predictions']} predictions changed")
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"machine": machine(), "results": results}, f, indent=2)
+        return 0
+    if args.compare_training:
+        results = run_benchmarks(args.sizes, config, data_dir=args.data_dir, training=True)
+        print(f"{'benchmark':<24}{'training':<13}{'wall s':>10}{'peak MB':>10}{'heap MB':>10}{'AUC':>10}"
+              f"{'accuracy':>10}")
+        for name, report in results.items():
+            for mode, record in report.items():
+                print(f"{name:<24}{mode:<13}{record['wall_seconds']:>10.2f}{record['peak_rss_mb']:>10.0f}"
+                      f"{record['heap_mb']:>10.0f}"
+                      f"{record['auc']:>10.6f}{record['accuracy']:>10.6f}")
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"machine": machine(), "results": results}, f, indent=2)
+        return 0
+    results = run_benchmarks(args.sizes, config, tuple(args.stages), args.repeat, args.data_dir)
+
+    print(f"{'benchmark':<32}{'wall s':>10}{'cpu s':>10}{'rows/s':>14}{'peak MB':>10}")
+    for name, record in results.items():
+        print(f"{name:<32}{record['wall_seconds']:>10.4f}{record['cpu_seconds']:>10.4f}"
+              f"{record['rows_per_second']:>14,.0f}{record['peak_rss_mb']:>10.0f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"machine": machine(), "results": results}, f, indent=2)
+
+    baselines_path = Path(args.baselines)
+    stored = {}
+    if baselines_path.exists():
+        with open(baselines_path) as f:
+            stored = json.load(f)
+    threshold = args.threshold if args.threshold is not None else stored.get("threshold", 0.25)
+    if args.update:
+        stored.update(machine=machine(), threshold=threshold,
+                      results={**stored.get("results", {}), **results})
+        with open(baselines_path, "w") as f:
+            json.dump(stored, f, indent=2)
+        print(f"Baselines updated in {baselines_path}")
+        return 0
+
+    if stored.get("machine") and stored["machine"] != machine():
+        logger.warning("Baselines were recorded on %s; timings may not be comparable", stored["machine"])
+    regressions = compare(results, stored.get("results", {}), threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regression beyond {threshold:.0%} of the baselines")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import argparse
+import logging
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# Layout of the source file: a free-text header, the first class block, a few
+# separator lines and the second class block, one fixed-width row per observation
+HEADER_LINES = 53
+SEPARATOR_LINES = 5
+N_COLUMNS = 10
+
+
+def _sample_block(rng: np.random.Generator, n_rows: int, label: int) -> np.ndarray:
+    """Draws measurements of one cloud type, in the column order of create_dataset.columns."""
+    shift = 10.0 * label
+    values = np.empty((n_rows, N_COLUMNS))
+    # Visible mean, max, min, mean distribution, contrast
+    values[:, :5] = np.abs(rng.normal(50 + shift, 20, (n_rows, 5))) + 0.01
+    # Visible entropy and second angular momentum
+    values[:, 5] = rng.uniform(0.01, 0.2 + 0.05 * label, n_rows)
+    values[:, 6] = rng.uniform(10, 90, n_rows)
+    # IR mean, max and min; max exceeds min so that the IR ranges are positive
+    values[:, 7] = rng.normal(160 + shift, 20, n_rows)
+    values[:, 8] = rng.normal(250 + shift, 20, n_rows)
+    values[:, 9] = values[:, 8] - rng.uniform(1, 50 + 10 * label, n_rows)
+    return np.round(values, 4)
+
+
+# ASCII of every 4-digit integer part (padded with spaces, as by printf) and fraction
+_INTEGER_PARTS = np.frombuffer("".join(f"{i:4d}" for i in range(10_000)).encode(), np.uint8).reshape(-1, 4)
+_FRACTIONS = np.frombuffer("".join(f"{i:04d}" for i in range(10_000)).encode(), np.uint8).reshape(-1, 4)
+
+
+def format_rows(values: np.ndarray) -> bytes:
+    """Formats non-negative values below 10,000 as fixed-width rows, like `%9.4f` per value.
+
+    The characters of all values are looked up at once, which is far faster than
+    formatting every value separately with `np.savetxt`.
+
+    Args:
+        values: The (rows x columns) values to format.
+
+    Returns:
+        The rows as text, one line per row.
+
+    Raises:
+        ValueError: If a value is negative or does not fit the fixed width.
+    """
+    scaled = np.rint(values * 10_000).astype(np.int64)
+    if scaled.size and (scaled.min() < 0 or scaled.max() >= 10 ** 8):
+        raise ValueError("Values must lie in [0, 10000) to be written as fixed-width rows")
+    integer, fraction = np.divmod(scaled, 10_000)
+    chars = np.empty(scaled.shape + (9,), dtype=np.uint8)
+    chars[..., :4] = _INTEGER_PARTS[integer]
+    chars[..., 4] = ord(".")
+    chars[..., 5:] = _FRACTIONS[fraction]
+    lines = np.empty((len(scaled), chars[0].size + 1), dtype=np.uint8)
+    lines[:, :-1] = chars.reshape(len(scaled), -1)
+    lines[:, -1] = ord("\n")
+    return lines.tobytes()
+
+
+def write_raw_data(path: Path, n_rows: int, random_state: Optional[int] = 0,
+                   chunk_rows: int = 100_000) -> dict:
+    """Writes a synthetic raw data file in the format read by `create_dataset`.
+
+    The file holds a header, `n_rows` observations split into two class blocks
+    (the first one taking the odd row), and separator lines between the blocks, with
+    the ten measurement columns of the source data. With 2,047 rows the blocks sit at
+    the lines of the default configuration. Rows are generated and written in chunks,
+    so files of any size are written in constant memory.
+
+    Args:
+        path: The file to write.
+        n_rows: The total number of observations.
+        random_state: The seed of the measurements.
+        chunk_rows: The number of rows generated at a time.
+
+    Returns:
+        The `cloud_data_index` of the file: the [start, stop) lines of each class block.
+    """
+    rng = np.random.default_rng(random_state)
+    n_first = (n_rows + 1) // 2
+    first = HEADER_LINES
+    second = first + n_first + SEPARATOR_LINES
+    with open(path, "wb") as f:
+        f.writelines(f"synthetic cloud data header line {i}\n".encode() for i in range(HEADER_LINES))
+        for label, n_block in enumerate((n_first, n_rows - n_first)):
+            if label:
+                f.write(b"\n" * SEPARATOR_LINES)
+            for start in range(0, n_block, chunk_rows):
+                f.write(format_rows(_sample_block(rng, min(chunk_rows, n_block - start), label)))
+    logger.info("Synthetic raw data with %d rows written to %s", n_rows, path)
+    return {"cloud1": [first, first + n_first], "cloud2": [second, second + n_rows - n_first]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic clouds raw data file")
+    parser.add_argument("path", help="File to write")
+    parser.add_argument("--rows", type=int, default=2047, help="Number of observations")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the measurements")
+    args = parser.parse_args()
+    print(write_raw_data(Path(args.path), args.rows, args.seed))
@@ -1,41 +1,57 @@
 import argparse
 import datetime
 import logging.config
+import time
 from pathlib import Path
 
 import yaml
 
-import src.acquire_data as ad
-import src.analysis as eda
-import src.aws_utils as aws
-import src.create_dataset as cd
-import src.evaluate_performance as ep
-import src.generate_features as gf
-import src.score_model as sm
-import src.train_model as tm
+# Stage modules are imported by the commands that need them, so that short commands
+# and --help start without loading pandas, scikit-learn, matplotlib or boto3
 
 logging.config.fileConfig("config/logging/local.conf")
 logger = logging.getLogger("clouds")
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(
-        description="Acquire, clean, and create features from clouds data"
-    )
-    parser.add_argument(
-        "--config",
-        default="config/default-config.yaml",
-        help="Path to configuration file",
-    )
-    args = parser.parse_args()
+DEFAULT_CONFIG = "config/default-config.yaml"
 
-    # Load configuration file for parameters and run config
-    with open(args.config, "r") as f:
+# Subcommands running one stage on an existing run directory: (stage function, help)
+STAGE_COMMANDS = {
+    "acquire": ("acquire", "Download the source data"),
+    "create": ("create", "Create the structured dataset from the raw data"),
+    "featurize": ("featurize", "Generate the features for model training"),
+    "analyze": ("analyze", "Save histograms of the features"),
+    "train": ("train", "Split the data and train the model"),
+    "score": ("score", "Score the model on the test set"),
+    "evaluate": ("evaluate", "Evaluate the model performance metrics"),
+    "cross-validate": ("cross_validate", "Cross-validate the model configuration"),
+}
+
+
+def load_config(path: Path) -> dict:
+    """Loads the pipeline configuration from a YAML file."""
+    with open(path, "r") as f:
         try:
             config = yaml.load(f, Loader=yaml.FullLoader)
-        except yaml.error.YAMLError as e:
-            logger.error("Error while loading configuration from %s", args.config)
-        else:
-            logger.info("Configuration file loaded from %s", args.config)
+        except yaml.error.YAMLError:
+            logger.error("Error while loading configuration from %s", path)
+            raise
+    logger.info("Configuration file loaded from %s", path)
+    return config
+
+
+def run_pipeline(config: dict) -> Path:
+    """Runs every stage into a new run directory and uploads it when configured.
+
+    Args:
+        config: The pipeline configuration.
+
+    Returns:
+        The run directory.
+    """
+    import src.dag as dag
+    import src.profiling as prof
+    import src.stage_cache as sc
+    import src.stages as st
 
     run_config = config.get("run_config", {})
 
@@ -48,36 +64,157 @@ if __name__ == "__main__":
     with (artifacts / "config.yaml").open("w") as f:
         yaml.dump(config, f)
 
-    # Acquire data from online repository and save to disk
-    ad.acquire_data(run_config["data_source"], artifacts / "clouds.data")
-
-    # Create structured dataset from raw data; save to disk
-    data = cd.create_dataset(artifacts / "clouds.data", config["create_dataset"])
-    cd.save_dataset(data, artifacts / "clouds.csv")
-
-    # Enrich dataset with features for model training; save to disk
-    features = gf.generate_features(data, config["generate_features"])
-    gf.save_dataset(features, artifacts / "cloud_cleaned.csv")  # <===================================
-
-    # Generate statistics and visualizations for summarizing the data; save to disk
-    figures = artifacts / "figures"
-    figures.mkdir()
-    eda.save_figures(features, figures, config["analysis"])  # <===================================
-
-    # Split data into train/test set and train model based on config; save each to disk
-    tmo, train, test = tm.train_model(features, config["train_model"])
-    tm.save_data(train, test, artifacts)
-    tm.save_model(tmo, artifacts / "trained_model_object.pkl")
-
-    # Score model on test set; save scores to disk
-    scores = sm.score_model(test, tmo, config["score_model"])
-    sm.save_scores(scores, artifacts / "scores.csv")
+    # Reuse outputs of stages whose inputs and config are unchanged since a previous run
+    cache = sc.StageCache(
+        run_config.get("cache_dir", ".cache/stages"), run_config.get("use_cache", True)
+    )
 
-    # Evaluate model performance metrics; save metrics to disk
-    metrics = ep.evaluate_performance(scores, test, config["evaluate_performance"],)  # <===================================
-    ep.save_metrics(metrics, artifacts / "metrics.yaml")
+    # Record the time and memory used by each stage
+    profile_config = run_config.get("profile", {})
+    profiler = prof.StageProfiler(
+        artifacts,
+        profile_config.get("enabled", True),
+        profile_config.get("cprofile", False),
+        profile_config.get("trace_memory", False),
+    )
 
-    # Upload all artifacts to S3
+    # Upload each artifact to S3 as soon as the stage producing it finishes
     aws_config = config.get("aws")
+    uploader = None
     if aws_config.get("upload", False):
-        aws.upload_artifacts(artifacts, aws_config)
+        import src.aws_utils as aws
+
+        uploader = aws.ArtifactUploader(artifacts, aws_config)
+        uploader.submit([artifacts / "config.yaml"])
+
+    # Run the stages as a dependency graph: a stage starts once the stages it reads
+    # from have finished, so independent stages run concurrently
+    paths = st.run_paths(artifacts, config)
+    executor = dag.DagExecutor(
+        artifacts,
+        cache,
+        profiler,
+        run_config.get("stage_workers", 4),
+        on_output=(lambda stage, outputs: uploader.submit(outputs)) if uploader else None,
+    )
+    try:
+        executor.run(st.pipeline_stages(config, paths))
+    finally:
+        # Report which stages were served from the cache
+        cache_report = cache.report()
+        logger.info("Stage cache report: %s", cache_report)
+        with (artifacts / "stage_cache.yaml").open("w") as f:
+            yaml.dump(cache_report, f)
+        for name, status in cache_report.items():
+            profiler.stages.get(name, {})["cache"] = status
+        profile_path = profiler.save()
+
+        # Wait for the remaining uploads; the profile is saved again afterwards with the
+        # upload wait, which therefore only appears in the local copy
+        if uploader is not None:
+            uploader.submit([artifacts / "stage_cache.yaml"] + ([profile_path] if profile_path else []))
+            with profiler.stage("upload_artifacts"):
+                uploader.close()
+            profiler.save()
+    return artifacts
+
+
+def run_stage(command: str, run_dir: Path, config: dict) -> None:
+    """Runs one stage on the artifacts of a run directory, overwriting its outputs.
+
+    Args:
+        command: The stage subcommand, one of STAGE_COMMANDS.
+        run_dir: The run directory; created by `acquire` if missing.
+        config: The pipeline configuration.
+    """
+    import src.stages as st
+
+    if command == "acquire":
+        run_dir.mkdir(parents=True, exist_ok=True)
+    elif not run_dir.is_dir():
+        raise FileNotFoundError(f"Run directory {run_dir} does not exist")
+    if not (run_dir / "config.yaml").exists():
+        with (run_dir / "config.yaml").open("w") as f:
+            yaml.dump(config, f)
+    if command == "acquire":
+        # Downloading needs no artifact paths, and thus no pandas
+        st.download(config, run_dir)
+    else:
+        getattr(st, STAGE_COMMANDS[command][0])({}, config, st.run_paths(run_dir, config))
+
+
+def upload(run_dir: Path, config: dict) -> list[str]:
+    """Uploads a run directory to S3, whatever the aws.upload setting."""
+    import src.aws_utils as aws
+
+    return aws.upload_artifacts(run_dir, {**config["aws"], "upload": True})
+
+
+def experiment_configs(paths: list[str]) -> dict:
+    """Loads the configurations of experiments, named after their files.
+
+    Args:
+        paths: Configuration files, or directories whose .yaml files are all loaded.
+
+    Returns:
+        Mapping of experiment name to configuration, in the given order.
+    """
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("*.yaml")) if path.is_dir() else [path])
+    configs = {}
+    for file in files:
+        name, n = file.stem, 1
+        while name in configs:
+            n += 1
+            name = f"{file.stem}-{n}"
+        configs[name] = load_config(file)
+    return configs
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Builds the command line parser with one subcommand per stage."""
+    parser = argparse.ArgumentParser(
+        description="Acquire, clean, and create features from clouds data, then train, score and evaluate a model"
+    )
+    parser.add_argument("--config", help=f"Path to configuration file (default: {DEFAULT_CONFIG})")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    run = commands.add_parser("run", help="Run the whole pipeline into a new run directory (default)")
+    run.add_argument("--config", default=argparse.SUPPRESS, help="Path to configuration file")
+    for command, (_, description) in STAGE_COMMANDS.items():
+        stage = commands.add_parser(command, help=description, description=description)
+        stage.add_argument("--run-dir", required=True, help="Run directory holding the artifacts")
+        stage.add_argument("--config", default=argparse.SUPPRESS,
+                           help="Path to configuration file (default: the run's config.yaml)")
+    upload_parser = commands.add_parser("upload", help="Upload a run directory to S3")
+    upload_parser.add_argument("--run-dir", required=True, help="Run directory holding the artifacts")
+    upload_parser.add_argument("--config", default=argparse.SUPPRESS,
+                               help="Path to configuration file (default: the run's config.yaml)")
+    experiments = commands.add_parser(
+        "experiments", help="Run several configurations, sharing the stages they have in common",
+        description="Run several configurations, sharing the stages they have in common, "
+                    "and compare their metrics in summary.csv")
+    experiments.add_argument("configs", nargs="+", help="Configuration files, or directories of .yaml files")
+    experiments.add_argument("--processes", type=int, default=1, help="Number of experiments running at once")
+    experiments.add_argument("--output", help="Directory for the experiments (default: run_config.output)")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    command = args.command or "run"
+    start = time.perf_counter()
+    if command == "run":
+        run_pipeline(load_config(args.config or DEFAULT_CONFIG))
+    elif command == "experiments":
+        import src.experiments as ex
+
+        ex.run_experiments(experiment_configs(args.configs), args.output, args.processes)
+    else:
+        run_dir = Path(args.run_dir)
+        config = load_config(args.config or run_dir / "config.yaml")
+        if command == "upload":
+            upload(run_dir, config)
+        else:
+            run_stage(command, run_dir, config)
+    logger.info("Command %s finished in %.2f s", command, time.perf_counter() - start)
@@ -0,0 +1,72 @@
+import argparse
+import datetime
+import logging.config
+import time
+from pathlib import Path
+
+import yaml
+
+import src.artifact_io as aio
+import src.generate_features as gf
+import src.model_store as ms
+import src.refresh_model as rm
+import src.train_model as tm
+
+logging.config.fileConfig("config/logging/local.conf")
+logger = logging.getLogger("clouds")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Add trees trained on newly arrived clouds data to a trained model"
+    )
+    parser.add_argument("--run-dir", required=True,
+                        help="Pipeline run or previous refresh directory with the trained model")
+    parser.add_argument("--new-data", required=True,
+                        help="Table of new observations (raw columns and class) in any artifact format")
+    parser.add_argument("--config", help="Path to configuration file; defaults to the run's config.yaml")
+    parser.add_argument("--output", help="Directory for the new model version; defaults to run_config.output")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    run_dir = Path(args.run_dir)
+    config_path = Path(args.config) if args.config else run_dir / "config.yaml"
+    with open(config_path, "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    logger.info("Configuration file loaded from %s", config_path)
+
+    train_config = config["train_model"]
+    store_config = train_config.get("model_store", {})
+    # Trees can only be added to the scikit-learn model, which is kept as a pickle
+    model = ms.load_model(ms.model_path(run_dir, "pickle"))
+    fmt = config["run_config"].get("artifact_format", "csv")
+    train = None
+    if not (run_dir / rm.LINEAGE_FILE).exists():
+        train = aio.load_frame(aio.artifact_path(run_dir, "train", fmt))
+    lineage = rm.load_lineage(run_dir, train)
+
+    # Featurize only the new rows
+    new_data = aio.load_frame(args.new_data)
+    features = gf.generate_features(new_data, config["generate_features"])
+    refresh_config = {
+        "target": train_config["target"],
+        "initial_features": train_config["initial_features"],
+        **config.get("refresh_model", {}),
+    }
+    model, lineage = rm.refresh_model(model, features, refresh_config, lineage)
+    lineage["parent"] = str(run_dir)
+
+    # Save the new model version next to the configuration it was trained with
+    now = int(datetime.datetime.now().timestamp())
+    output = Path(args.output or config["run_config"].get("output", "runs")) / f"refresh-{now}"
+    output.mkdir(parents=True)
+    with (output / "config.yaml").open("w") as f:
+        yaml.dump(config, f)
+    aio.save_frame(features, aio.artifact_path(output, "refresh", fmt), fmt)
+    tm.save_model(model, ms.model_path(output, "pickle"))
+    if store_config.get("format", "pickle") == "mapped":
+        ms.save_forest(model, ms.model_path(output, "mapped"), lineage["fingerprints"][-1],
+                       store_config.get("compress", False))
+    rm.save_lineage(lineage, output)
+    logger.info("Model version %d with %d trees saved in %s in %.1f s",
+                lineage["version"], lineage["n_trees"], output, time.perf_counter() - start)
@@ -0,0 +1,74 @@
+import argparse
+import json
+import logging.config
+import threading
+from pathlib import Path
+
+import yaml
+
+import src.artifact_io as aio
+import src.load_generator as lg
+import src.model_store as ms
+import src.serve_model as srv
+
+logging.config.fileConfig("config/logging/local.conf")
+logger = logging.getLogger("clouds")
+
+
+def load_config(run_dir: Path, config_path: str) -> dict:
+    """Loads the pipeline configuration, by default the one saved in the run directory."""
+    path = Path(config_path) if config_path else run_dir / "config.yaml"
+    with open(path, "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    logger.info("Configuration file loaded from %s", path)
+    return config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the trained clouds model over HTTP")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    start = subparsers.add_parser("start", help="Run the scoring server until interrupted")
+    load = subparsers.add_parser(
+        "load-test", help="Measure latency and throughput of a local scoring server"
+    )
+    for subparser in (start, load):
+        subparser.add_argument("--run-dir", required=True, help="Pipeline run directory with the trained model")
+        subparser.add_argument("--config", help="Path to configuration file; defaults to the run's config.yaml")
+        subparser.add_argument("--port", type=int, help="Port to listen on; overrides serve_model.port")
+    load.add_argument("--requests", type=int, default=2000, help="Number of requests to send")
+    load.add_argument("--concurrency", type=int, default=16, help="Number of concurrent clients")
+    load.add_argument("--rows-per-request", type=int, default=1, help="Rows in each request")
+    args = parser.parse_args()
+
+    run_dir = Path(args.run_dir)
+    config = load_config(run_dir, args.config)
+    serve_config = config.setdefault("serve_model", {})
+    if args.port is not None:
+        serve_config["port"] = args.port
+    store_format = config.get("train_model", {}).get("model_store", {}).get("format", "pickle")
+    model_path = ms.model_path(run_dir, store_format)
+
+    if args.command == "start":
+        srv.serve(model_path, config)
+    else:
+        # Serve on a free local port in this process and drive it with the load generator
+        if args.port is None:
+            serve_config["port"] = 0
+        server, batcher = srv.create_server(model_path, config)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+
+        fmt = config.get("run_config", {}).get("artifact_format", "csv")
+        raw_columns = config["create_dataset"]["columns"]
+        rows = aio.load_frame(aio.artifact_path(run_dir, "test", fmt), raw_columns)
+        results = lg.run_load(
+            f"http://{host}:{port}/score", rows, args.requests, args.concurrency, args.rows_per_request
+        )
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+        with (run_dir / "load_test.json").open("w") as f:
+            json.dump(results, f, indent=2)
+        print(json.dumps(results, indent=2))
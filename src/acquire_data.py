@@ -1,94 +1,278 @@
+import hashlib
+import json
 import logging
-import sys
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from time import sleep
+from typing import Optional, Union
 import requests
 from requests.exceptions import RequestException
 
 
 logger = logging.getLogger(__name__)
 
+SUMMARY_FILE = "acquire_summary.json"
 
-def get_data(
-    url: str, attempts: int = 4, wait: int = 3, wait_multiple: int = 2
-) -> bytes:
-    """Acquires data from URL
+
+def _read_meta(path: Path) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _write_meta(meta: dict, path: Path) -> None:
+    with open(path, "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def _validators(response: requests.Response) -> dict:
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def _fetch(url: str, path: Path, timeout: float, chunk_size: int) -> bool:
+    """Makes one attempt at bringing `path` up to date with `url`; see `download`."""
+    meta_path = path.with_name(path.name + ".json")
+    part_path = path.with_name(path.name + ".part")
+    part_meta_path = path.with_name(path.name + ".part.json")
+    meta = _read_meta(meta_path) if path.exists() else {}
+    part_meta = _read_meta(part_meta_path) if part_path.exists() else {}
+
+    # Byte ranges and lengths refer to the stored bytes, so ask for them unencoded
+    headers = {"Accept-Encoding": "identity"}
+    if meta.get("url") == url:
+        # Ask for the body only if the source changed since it was downloaded
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    offset = part_path.stat().st_size if part_meta.get("url") == url else 0
+    validator = part_meta.get("etag") or part_meta.get("last_modified")
+    if offset and validator:
+        # Resume the partial download, unless the source changed since it started
+        headers["Range"] = "bytes=%d-" % offset
+        headers["If-Range"] = validator
+
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            logger.info("%s is unchanged since it was downloaded to %s", url, path)
+            return False
+        if response.status_code == 416:
+            # The partial file does not match the source any more; start over
+            part_path.unlink()
+            raise RequestException("Range not satisfiable for %s; restarting the download" % url)
+        response.raise_for_status()
+
+        if response.status_code == 206:
+            logger.info("Resuming download of %s at byte %d", url, offset)
+            mode = "ab"
+        else:
+            offset = 0
+            mode = "wb"
+            _write_meta({"url": url, **_validators(response)}, part_meta_path)
+        expected = response.headers.get("Content-Length")
+        written = 0
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+        if expected is not None and written != int(expected):
+            raise RequestException("Incomplete download of %s: %d of %s bytes" % (url, written, expected))
+
+    part_path.replace(path)
+    _write_meta({"url": url, **_read_meta(part_meta_path), "size": path.stat().st_size}, meta_path)
+    part_meta_path.unlink()
+    logger.info("Downloaded %s to %s (%d bytes)", url, path, path.stat().st_size)
+    return True
+
+
+def download(
+    url: str,
+    path: Path,
+    attempts: int = 4,
+    wait: int = 3,
+    wait_multiple: int = 2,
+    timeout: float = 30,
+    chunk_size: int = 1 << 20,
+) -> bool:
+    """Downloads a URL to a file, streaming the body to disk in chunks.
+
+    The body is first written to `<path>.part`. A later call, e.g. a retry after the
+    connection dropped, resumes it with an HTTP Range request as long as the source is
+    unchanged (If-Range). The ETag and Last-Modified of a completed download are kept
+    in `<path>.json`; while the file exists, the next call sends a conditional request
+    and the body is only transferred again if the source changed.
 
     Args:
         url: The URL to download data from.
+        path: The path of the downloaded file.
         attempts: The number of download attempts.
         wait: The initial waiting time between download attempts.
         wait_multiple: The multiple of the waiting time to increase after each failed attempt.
+        timeout: The number of seconds to wait for the server to respond or send data.
+        chunk_size: The number of bytes written to disk at a time.
 
     Returns:
-        The content of the downloaded data as bytes.
+        Whether the body was downloaded, as opposed to the file being up to date already.
 
     Raises:
         RuntimeError: If the data could not be downloaded after the specified number of attempts.
     """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
     for attempt in range(attempts):
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            logger.debug("Acquire data from web successfully")
-
+            return _fetch(url, path, timeout, chunk_size)
         except RequestException as e:
             if attempt < attempts - 1:
                 logger.warning(
-                    "Error downloading data (attempt %d/%d): %s",
-                    attempt + 1,
-                    attempts,
-                    e,
+                    "Error downloading data (attempt %d/%d): %s", attempt + 1, attempts, e
                 )
                 sleep(wait)
                 wait *= wait_multiple
             else:
-                logger.error(
-                    "Failed to download data from %s after %s attempts", url, attempts
-                )
+                logger.error("Failed to download data from %s after %s attempts", url, attempts)
                 raise RuntimeError(
-                    "Failed to download data from %s after %s attempts"
-                    % (url, attempts)
+                    "Failed to download data from %s after %s attempts" % (url, attempts)
                 ) from e
+    return False
 
-        return response.content
 
+def acquire_data(url: str, save_path: Path, cache_dir: Optional[Path] = None,
+                 timeout: float = 30, attempts: int = 4, wait: float = 3) -> bool:
+    """Acquires data from specified URL
 
-def write_data(url_contents: bytes, save_path: Path) -> None:
-    """Writes data from url to a file
+    With a download cache, the data is downloaded once into `cache_dir` and later runs
+    only check that the source is unchanged; the cached file is then linked (or copied)
+    to `save_path`.
 
     Args:
-        url_contents: The data download from url to be written to the file, as bytes.
-        save_path: The path where the file should be saved.
+        url: URL for where data to be acquired is stored
+        save_path: Local path to write data to
+        cache_dir: Directory holding previously downloaded sources; None downloads to
+            `save_path` directly
+        timeout: The number of seconds to wait for the server to respond or send data
+        attempts: The number of download attempts
+        wait: The initial waiting time between download attempts
 
+    Returns:
+        Whether the body was downloaded, as opposed to the cached file being up to date.
+    
     Raises:
-        FileNotFoundError: If the specified path does not exist.
+        RuntimeError: If the data could not be downloaded.
+        OSError: If the data could not be written to `save_path`.
     """
+    save_path = Path(save_path)
+    target = save_path
+    if cache_dir is not None:
+        target = Path(cache_dir) / hashlib.sha256(url.encode()).hexdigest()[:32]
+    downloaded = download(url, target, attempts=attempts, wait=wait, timeout=timeout)
+    if target == save_path:
+        return downloaded
     try:
         save_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(save_path, "wb") as file:
-            file.write(url_contents)
+        if save_path.exists():
+            save_path.unlink()
+        try:
+            os.link(target, save_path)
+        except OSError:
+            shutil.copyfile(target, save_path)
         logger.info("Data written to %s successfully", save_path)
-    except FileNotFoundError as e:
-        logger.error("Error writing data to %s: %s", save_path, e)
+    except FileNotFoundError:
+        logger.critical("Please provide a valid file location to save dataset to.")
         raise
     except Exception as e:
-        logger.error("Error writing data to %s: %s", save_path, e)
+        logger.error("Error occurred while trying to write dataset to file: %s", e)
         raise
+    return downloaded
 
 
-def acquire_data(url: str, save_path: Path) -> None:
-    """Acquires data from specified URL
+def as_sources(data_source: Union[str, list[str]]) -> list[str]:
+    """Lists the URLs of `run_config.data_source`, a single URL or a list of URLs."""
+    sources = [data_source] if isinstance(data_source, str) else list(data_source)
+    if not sources:
+        raise ValueError("No data source given")
+    return sources
+
+
+def source_paths(sources: list[str], save_path: Path) -> list[Path]:
+    """Names the raw data file of every data source.
 
     Args:
-        url: URL for where data to be acquired is stored
-        save_path: Local path to write data to
+        sources: The URLs of the data sources.
+        save_path: The raw data file of a single source, e.g. `clouds.data`.
+
+    Returns:
+        `save_path` for a single source; otherwise one file per source next to it,
+        numbered in the order of the sources, e.g. `clouds-0.data`, `clouds-1.data`.
     """
-    url_contents = get_data(url)
-    try:
-        write_data(url_contents, save_path)
-    except FileNotFoundError:
-        logger.critical("Please provide a valid file location to save dataset to.")
-        sys.exit(1)
-    except Exception as e:
-        logger.error("Error occurred while trying to write dataset to file: %s", e)
+    save_path = Path(save_path)
+    if len(sources) == 1:
+        return [save_path]
+    return [save_path.with_name(f"{save_path.stem}-{i}{save_path.suffix}") for i in range(len(sources))]
+
+
+def acquire_sources(sources: list[str], save_path: Path, cache_dir: Optional[Path] = None,
+                    workers: int = 4, timeout: float = 30, attempts: int = 4, wait: float = 3,
+                    summary_path: Optional[Path] = None) -> list[Path]:
+    """Acquires several data sources concurrently, each into its own raw data file.
+
+    Every source is acquired by `acquire_data` on one of `workers` threads, with its own
+    attempts and backoff, so a slow or failing source only holds up its own thread; all
+    sources are attempted even if one fails. The outcome and timing of every source are
+    written as JSON to `summary_path`.
+
+    Args:
+        sources: The URLs of the data sources.
+        save_path: The raw data file of a single source, see `source_paths`.
+        cache_dir: Directory holding previously downloaded sources; None downloads to
+            the raw data files directly.
+        workers: The maximum number of sources downloaded at once.
+        timeout: The number of seconds to wait for a server to respond or send data.
+        attempts: The number of download attempts per source.
+        wait: The initial waiting time between download attempts of a source.
+        summary_path: The summary file; defaults to `acquire_summary.json` next to
+            `save_path`.
+
+    Returns:
+        The raw data files, in the order of the sources.
+
+    Raises:
+        RuntimeError: If any source could not be acquired, after all others finished.
+    """
+    paths = source_paths(sources, save_path)
+    summary_path = Path(summary_path) if summary_path is not None else Path(save_path).with_name(SUMMARY_FILE)
+
+    def fetch(url: str, path: Path) -> dict:
+        record = {"url": url, "path": path.name, "downloaded": None, "bytes": None, "error": None}
+        start = time.perf_counter()
+        try:
+            record["downloaded"] = acquire_data(url, path, cache_dir, timeout=timeout, attempts=attempts,
+                                                wait=wait)
+            record["bytes"] = path.stat().st_size
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Could not acquire %s: %s", url, e)
+            record["error"] = str(e)
+        record["seconds"] = time.perf_counter() - start
+        return record
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max(1, min(workers, len(sources)))) as pool:
+        records = list(pool.map(fetch, sources, paths))
+    summary = {"wall_seconds": time.perf_counter() - start, "sources": records}
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
+    _write_meta(summary, summary_path)
+    logger.info("Acquired %d sources in %.2f s; summary saved at %s", len(sources),
+                summary["wall_seconds"], summary_path)
+
+    failed = [record["url"] for record in records if record["error"] is not None]
+    if failed:
+        raise RuntimeError("Failed to acquire data from %s" % ", ".join(failed))
+    return paths
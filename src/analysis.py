@@ -1,7 +1,12 @@
+import json
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 import matplotlib.pyplot as plt
 import matplotlib as mpl
+import numpy as np
 import pandas as pd
 
 # from cycler import cycler
@@ -11,41 +16,188 @@ import pandas as pd
 logger = logging.getLogger(__name__)
 
 
-def save_figures(data: pd.DataFrame, dir: Path, config: dict) -> list[Path]:
+def _init_worker(config: dict) -> None:
+    """Prepares a rendering process: non-interactive backend and styling applied once.
+
+    Args:
+        config: The matplotlib rcParams to apply.
+    """
+    mpl.use("Agg")
+    mpl.rcParams.update(config)
+
+
+def compute_histograms(data: pd.DataFrame, target: str = "class", bins: int = 10,
+                       chunk_size: int = 1 << 20) -> dict:
+    """Computes per-class histograms of every feature in one vectorized pass.
+
+    Bin edges match those `ax.hist` derives from both classes together: `bins` equal
+    bins spanning the range of each feature. Each feature column is binned in chunks
+    and split by class with a single bincount, so no per-feature or per-class copy of
+    the data is made.
+
+    Args:
+        data: A DataFrame containing the features and the target variable.
+        target: The name of the target variable column.
+        bins: The number of bins per feature.
+        chunk_size: The number of rows processed at a time.
+
+    Returns:
+        A dictionary with the feature names ("features"), the classes ("classes"),
+        the bin edges of each feature ("edges", features x bins + 1) and the counts of
+        each feature and class ("counts", features x classes x bins).
+
+    Raises:
+        ValueError: If a feature has no finite range.
+    """
+    features = [col for col in data.columns if col != target]
+    classes = [0, 1]
+    labels = data[target].to_numpy()
+    in_classes = np.isin(labels, classes)
+    # Offset of each row's class block in the flattened counts; other labels go to an extra bin
+    offsets = np.where(in_classes, np.searchsorted(classes, labels) * bins, len(classes) * bins)
+
+    edges = np.empty((len(features), bins + 1))
+    counts = np.zeros((len(features), len(classes) * bins + 1), dtype=np.int64)
+    for i, feat in enumerate(features):
+        values = data[feat].to_numpy(dtype=np.float64)
+        selected = values if in_classes.all() else values[in_classes]
+        first_edge, last_edge = (selected.min(), selected.max()) if len(selected) else (np.nan, np.nan)
+        if not (np.isfinite(first_edge) and np.isfinite(last_edge)):
+            raise ValueError(f"Histogram range of {feat} is not finite")
+        if first_edge == last_edge:
+            # Same widening of empty ranges as np.histogram_bin_edges
+            first_edge, last_edge = first_edge - 0.5, last_edge + 0.5
+        edges[i] = np.linspace(first_edge, last_edge, bins + 1)
+
+        for start in range(0, len(values), chunk_size):
+            chunk = values[start : start + chunk_size]
+            # Bin index of every value, corrected to the exact edges as np.histogram does
+            indices = ((chunk - first_edge) / (last_edge - first_edge) * bins).astype(np.intp)
+            np.clip(indices, 0, bins - 1, out=indices)
+            indices -= chunk < edges[i, indices]
+            indices += (chunk >= edges[i, indices + 1]) & (indices != bins - 1)
+            np.clip(indices, 0, bins - 1, out=indices)
+            indices *= in_classes[start : start + chunk_size]
+            indices += offsets[start : start + chunk_size]
+            counts[i] += np.bincount(indices, minlength=counts.shape[1])
+
+    return {
+        "features": features,
+        "classes": classes,
+        "edges": edges,
+        "counts": counts[:, :-1].reshape(len(features), len(classes), bins),
+    }
+
+
+def save_histograms(histograms: dict, dir: Path) -> list[Path]:
+    """Saves precomputed histograms as histograms.npz and histograms.json.
+
+    Args:
+        histograms: The histograms returned by `compute_histograms`.
+        dir: The directory where the histogram files should be saved.
+
+    Returns:
+        The Paths of the saved files.
+    """
+    npz_path = dir / "histograms.npz"
+    np.savez_compressed(
+        npz_path,
+        features=np.array(histograms["features"]),
+        classes=np.array(histograms["classes"]),
+        edges=histograms["edges"],
+        counts=histograms["counts"],
+    )
+    json_path = dir / "histograms.json"
+    with open(json_path, "w") as f:
+        json.dump(
+            {
+                feat: {
+                    "edges": histograms["edges"][i].tolist(),
+                    "counts": {
+                        str(cls): histograms["counts"][i, j].tolist()
+                        for j, cls in enumerate(histograms["classes"])
+                    },
+                }
+                for i, feat in enumerate(histograms["features"])
+            },
+            f,
+        )
+    logger.debug("Histogram counts saved to %s and %s", npz_path, json_path)
+    return [npz_path, json_path]
+
+
+def _save_histogram(feat: str, edges: np.ndarray, counts: np.ndarray, dir: Path) -> Path:
+    """Renders and saves the histogram of one feature, separated by target class.
+
+    Args:
+        feat: The name of the feature.
+        edges: The bin edges of the feature.
+        counts: The precomputed counts of each target class in each bin.
+        dir: The directory where the histogram figure should be saved.
+
+    Returns:
+        The Path where the figure was saved.
+    """
+    fig, ax = plt.subplots()
+    try:
+        # Plot the precomputed histogram of the current feature, separated by target class
+        ax.hist([edges[:-1]] * len(counts), bins=edges, weights=list(counts))
+        ax.set_xlabel(" ".join(feat.split("_")).capitalize())
+        ax.set_ylabel("Number of observations")
+
+        # Save the figure to the specified directory with a descriptive file name
+        fig_path = dir / f"{feat}_histogram.png"
+        fig.savefig(fig_path)
+    finally:
+        # Release the figure so memory does not grow with the number of features
+        plt.close(fig)
+
+    logger.debug("%s histogram generated successfully.", feat)
+    return fig_path
+
+
+def save_figures(data: pd.DataFrame, dir: Path, config: dict, processes: int = 1) -> list[Path]:
     """Saves histograms of features in the given data to the specified directory.
 
     Args:
         data: A DataFrame containing the features for which histograms should be created.
         dir: The directory where the histogram figures should be saved.
         config (dict): A dictionary containing the feature generation configuration.
+        processes: The number of worker processes rendering figures; 1 renders in this process.
 
     Returns:
         A list of Paths where the saved figures are located.
-    """
 
-    mpl.rcParams.update(config)
-    saved_fig_paths = []
+    Raises:
+        ValueError: If the `hist.bins` setting is not a number of bins.
+    """
 
     try:
-        # Get the feature columns and target variable column from the data
-        features = data.drop("class", axis=1).columns
-        target = data["class"]
-
-        # Iterate over each feature in the DataFrame
-        for feat in features:
-            fig, ax = plt.subplots()
-            # Plot a histogram for the current feature, separated by target class
-            ax.hist([data[target == 0][feat].values, data[target == 1][feat].values])
-            ax.set_xlabel(" ".join(feat.split("_")).capitalize())
-            ax.set_ylabel("Number of observations")
-
-            # Save the figure to the specified directory with a descriptive file name
-            fig_path = dir / f"{feat}_histogram.png"
-            fig.savefig(fig_path)
-            # Add the saved figure's path to the list of saved figure paths
-            saved_fig_paths.append(fig_path)
-
-            logger.debug("%s histogram generated successfully.", feat)
+        # Bin every feature of both target classes once, and keep the counts as an artifact;
+        # the number of bins is the hist.bins of the styling, as for ax.hist
+        with mpl.rc_context(config):
+            bins = mpl.rcParams["hist.bins"]
+        if not isinstance(bins, int):
+            raise ValueError(f"hist.bins must be a number of bins, got {bins!r}")
+        histograms = compute_histograms(data, "class", bins)
+        save_histograms(histograms, dir)
+        features = histograms["features"]
+        args = (histograms["edges"], histograms["counts"], repeat(dir))
+
+        if processes > 1:
+            # Fan features out over worker processes, each styled once on the Agg backend
+            with ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(config,),
+            ) as executor:
+                saved_fig_paths = list(
+                    executor.map(_save_histogram, features, *args)
+                )
+        else:
+            mpl.rcParams.update(config)
+            saved_fig_paths = list(map(_save_histogram, features, *args))
 
         logger.info("Histogram figures saved successfully.")
 
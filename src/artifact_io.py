@@ -0,0 +1,330 @@
+import json
+import logging
+import shutil
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+# File suffix of each supported artifact format; npy artifacts are directories
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather", "npy": ""}
+
+
+def artifact_path(directory: Path, name: str, fmt: str = "csv") -> Path:
+    """Builds the path of a tabular artifact in the given format.
+
+    Args:
+        directory: The directory holding the artifact.
+        name: The name of the artifact without suffix, e.g. "clouds".
+        fmt: The artifact format, one of FORMATS.
+
+    Returns:
+        The path of the artifact.
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported artifact format {fmt}; expected one of {list(FORMATS)}")
+    return Path(directory) / f"{name}{FORMATS[fmt]}"
+
+
+def infer_format(path: Path) -> str:
+    """Infers the format of an existing artifact from its path.
+
+    Args:
+        path: The path of the artifact.
+
+    Returns:
+        The artifact format, one of FORMATS.
+
+    Raises:
+        ValueError: If the format cannot be inferred.
+    """
+    path = Path(path)
+    if path.is_dir() and (path / "columns.json").exists():
+        return "npy"
+    for fmt, suffix in FORMATS.items():
+        if suffix and path.suffix == suffix:
+            return fmt
+    raise ValueError(f"Cannot infer the artifact format of {path}")
+
+
+def save_frame(data: pd.DataFrame, path: Path, fmt: str = "csv") -> None:
+    """Writes a DataFrame to disk in the given format.
+
+    The npy format writes one .npy file per column into the directory `path`, which
+    can be memory-mapped column by column when loaded. Parquet and feather require the
+    optional pyarrow package; feather files are written uncompressed so that they can
+    be memory-mapped without decompression.
+
+    Args:
+        data: The DataFrame to write; its index is not saved.
+        path: The path of the artifact.
+        fmt: The artifact format, one of FORMATS.
+
+    Raises:
+        ValueError: If the format is not supported.
+        ImportError: If the format needs pyarrow and it is not installed.
+    """
+    path = Path(path)
+    if fmt == "csv":
+        data.to_csv(path, index=False)
+    elif fmt == "parquet":
+        _require_pyarrow(fmt)
+        data.to_parquet(path, index=False)
+    elif fmt == "feather":
+        _require_pyarrow(fmt)
+        data.reset_index(drop=True).to_feather(path, compression="uncompressed")
+    elif fmt == "npy":
+        if path.exists():
+            shutil.rmtree(path)
+        path.mkdir(parents=True)
+        for i, col in enumerate(data.columns):
+            np.save(path / f"{i}.npy", data[col].to_numpy())
+        with open(path / "columns.json", "w") as f:
+            json.dump([str(col) for col in data.columns], f)
+    else:
+        raise ValueError(f"Unsupported artifact format {fmt}; expected one of {list(FORMATS)}")
+    logger.debug("Wrote %d rows to %s as %s", len(data), path, fmt)
+
+
+def load_frame(path: Path, columns: Optional[list[str]] = None, fmt: Optional[str] = None,
+               mmap: bool = True) -> pd.DataFrame:
+    """Reads a DataFrame written by `save_frame`.
+
+    Binary formats only read the requested columns. With `mmap` set, npy and feather
+    artifacts are memory-mapped and the returned columns are read-only views of the
+    files rather than copies.
+
+    Args:
+        path: The path of the artifact.
+        columns: The columns to read; all columns if None.
+        fmt: The artifact format; inferred from the path if None.
+        mmap: Whether to memory-map the artifact when the format allows it.
+
+    Returns:
+        The DataFrame stored in the artifact.
+
+    Raises:
+        ValueError: If the format is not supported.
+        KeyError: If a requested column is not in the artifact.
+        ImportError: If the format needs pyarrow and it is not installed.
+    """
+    path = Path(path)
+    fmt = fmt or infer_format(path)
+    if fmt == "csv":
+        return pd.read_csv(path, usecols=columns)[columns] if columns else pd.read_csv(path)
+    if fmt == "parquet":
+        _require_pyarrow(fmt)
+        return pd.read_parquet(path, columns=columns, memory_map=mmap)
+    if fmt == "feather":
+        _require_pyarrow(fmt)
+        from pyarrow import feather  # pylint: disable=import-outside-toplevel
+
+        return feather.read_table(path, columns=columns, memory_map=mmap).to_pandas()
+    if fmt == "npy":
+        with open(path / "columns.json") as f:
+            stored = json.load(f)
+        positions = {col: i for i, col in enumerate(stored)}
+        missing = [col for col in columns or [] if col not in positions]
+        if missing:
+            raise KeyError(f"Columns {missing} not found in {path}")
+        return pd.DataFrame(
+            {
+                col: np.asarray(np.load(path / f"{positions[col]}.npy", mmap_mode="r" if mmap else None))
+                for col in columns or stored
+            },
+            copy=False,
+        )
+    raise ValueError(f"Unsupported artifact format {fmt}; expected one of {list(FORMATS)}")
+
+
+def compact_frame(data: pd.DataFrame) -> pd.DataFrame:
+    """Stores the numeric columns of a DataFrame in compact types.
+
+    Float columns become float32 and integer columns the smallest integer type holding
+    their values, e.g. int8 for class labels. Columns that are already compact, such as
+    those of binary artifacts written in compact types, are not copied.
+
+    Args:
+        data: The DataFrame to compact.
+
+    Returns:
+        The DataFrame with compact column types.
+    """
+    types = {}
+    for col, dtype in data.dtypes.items():
+        if pd.api.types.is_float_dtype(dtype) and dtype != np.float32:
+            types[col] = np.float32
+        elif pd.api.types.is_integer_dtype(dtype) and len(data):
+            low, high = data[col].min(), data[col].max()
+            types[col] = next(t for t in (np.int8, np.int16, np.int32, np.int64)
+                              if np.iinfo(t).min <= low and high <= np.iinfo(t).max)
+    types = {col: t for col, t in types.items() if data[col].dtype != t}
+    return data.astype(types) if types else data
+
+
+def iter_frame_chunks(path: Path, chunksize: int, columns: Optional[list[str]] = None,
+                      fmt: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """Reads a DataFrame written by `save_frame` in chunks of rows.
+
+    Only one chunk is held in memory at a time: CSV and parquet artifacts are read
+    incrementally, npy and feather artifacts are memory-mapped and sliced.
+
+    Args:
+        path: The path of the artifact.
+        chunksize: The number of rows in each chunk.
+        columns: The columns to read; all columns if None.
+        fmt: The artifact format; inferred from the path if None.
+
+    Yields:
+        Consecutive chunks of the DataFrame stored in the artifact.
+    """
+    path = Path(path)
+    fmt = fmt or infer_format(path)
+    if fmt == "csv":
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize):
+            yield chunk[columns] if columns else chunk
+    elif fmt == "parquet":
+        _require_pyarrow(fmt)
+        from pyarrow import parquet  # pylint: disable=import-outside-toplevel
+
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        data = load_frame(path, columns, fmt, mmap=True)
+        for start in range(0, len(data), chunksize):
+            yield data.iloc[start : start + chunksize]
+
+
+class FrameWriter:
+    """Writes a DataFrame to disk chunk by chunk, in any format of `save_frame`.
+
+    npy artifacts are preallocated on disk, so their total number of rows must be
+    known up front; the other formats are appended to as chunks arrive.
+
+    Attributes:
+        path: The path of the artifact.
+        fmt: The artifact format, one of FORMATS.
+        n_rows: The total number of rows, required for the npy format.
+    """
+
+    def __init__(self, path: Path, fmt: str = "csv", n_rows: Optional[int] = None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported artifact format {fmt}; expected one of {list(FORMATS)}")
+        if fmt == "npy" and n_rows is None:
+            raise ValueError("Writing an npy artifact in chunks requires the number of rows")
+        if fmt in ("parquet", "feather"):
+            _require_pyarrow(fmt)
+        self.path = Path(path)
+        self.fmt = fmt
+        self.n_rows = n_rows
+        self.rows_written = 0
+        self._writer = None
+        self._columns: list = []
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        """Appends a chunk of rows to the artifact.
+
+        Args:
+            chunk: The rows to append; every chunk must have the same columns.
+        """
+        # pylint: disable=import-outside-toplevel
+        if self.fmt == "csv":
+            chunk.to_csv(self.path, index=False, mode="a" if self.rows_written else "w",
+                         header=not self.rows_written)
+        elif self.fmt in ("parquet", "feather"):
+            import pyarrow as pa
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                if self.fmt == "parquet":
+                    from pyarrow import parquet
+
+                    self._writer = parquet.ParquetWriter(self.path, table.schema)
+                else:
+                    self._writer = pa.ipc.new_file(str(self.path), table.schema)
+            self._writer.write_table(table)
+        else:
+            if self._writer is None:
+                if self.path.exists():
+                    shutil.rmtree(self.path)
+                self.path.mkdir(parents=True)
+                self._columns = [str(col) for col in chunk.columns]
+                self._writer = [
+                    np.lib.format.open_memmap(
+                        self.path / f"{i}.npy", mode="w+", dtype=chunk[col].dtype, shape=(self.n_rows,)
+                    )
+                    for i, col in enumerate(chunk.columns)
+                ]
+            for array, col in zip(self._writer, chunk.columns):
+                array[self.rows_written : self.rows_written + len(chunk)] = chunk[col].to_numpy()
+        self.rows_written += len(chunk)
+
+    def close(self) -> None:
+        """Finalizes the artifact."""
+        if self.fmt == "npy":
+            if self.rows_written != self.n_rows:
+                raise ValueError(f"Wrote {self.rows_written} rows to {self.path}, expected {self.n_rows}")
+            for array in self._writer or []:
+                array.flush()
+            with open(self.path / "columns.json", "w") as f:
+                json.dump(self._columns, f)
+        elif self._writer is not None:
+            self._writer.close()
+        self._writer = None
+        logger.debug("Wrote %d rows to %s as %s in chunks", self.rows_written, self.path, self.fmt)
+
+    def __enter__(self) -> "FrameWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if exc_info[0] is None:
+            self.close()
+            return
+        # Release the files without checking the row count, so the original error propagates
+        if self.fmt in ("parquet", "feather") and self._writer is not None:
+            self._writer.close()
+        self._writer = None
+
+
+def count_rows(path: Path, fmt: Optional[str] = None) -> int:
+    """Counts the rows of an artifact without loading it.
+
+    Args:
+        path: The path of the artifact.
+        fmt: The artifact format; inferred from the path if None.
+
+    Returns:
+        The number of rows.
+    """
+    path = Path(path)
+    fmt = fmt or infer_format(path)
+    if fmt == "csv":
+        with open(path, "rb") as f:
+            return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b"")) - 1
+    if fmt == "parquet":
+        _require_pyarrow(fmt)
+        from pyarrow import parquet  # pylint: disable=import-outside-toplevel
+
+        return parquet.ParquetFile(path).metadata.num_rows
+    if fmt == "feather":
+        _require_pyarrow(fmt)
+        from pyarrow import feather  # pylint: disable=import-outside-toplevel
+
+        return feather.read_table(path, memory_map=True).num_rows
+    with open(path / "columns.json") as f:
+        n_columns = len(json.load(f))
+    return len(np.load(path / "0.npy", mmap_mode="r")) if n_columns else 0
+
+
+def _require_pyarrow(fmt: str) -> None:
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel,unused-import
+    except ImportError as e:
+        raise ImportError(f"The {fmt} artifact format requires the pyarrow package") from e
@@ -1,62 +1,199 @@
-import os
+import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Optional
+
 import boto3
+import botocore.config
+from boto3.s3.transfer import TransferConfig
+
+from src.stage_cache import fingerprint_file
 
 
 logger = logging.getLogger(__name__)
 
+MB = 1024 * 1024
+
+
+def load_manifest(path: Optional[Path]) -> dict[str, str]:
+    """Loads the manifest of previously uploaded files.
+
+    Args:
+        path: The path of the manifest; None disables the manifest.
+
+    Returns:
+        Mapping of S3 URI to the SHA-256 of the file last uploaded there.
+    """
+    if path is None or not Path(path).exists():
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning("Ignoring unreadable upload manifest %s: %s", path, e)
+        return {}
+
+
+def save_manifest(manifest: dict[str, str], path: Optional[Path]) -> None:
+    """Writes the manifest of uploaded files, replacing the previous one atomically.
+
+    Args:
+        manifest: Mapping of S3 URI to the SHA-256 of the file uploaded there.
+        path: The path of the manifest; None disables the manifest.
+    """
+    if path is None:
+        return
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = path.with_name(path.name + ".tmp")
+    with open(staging, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    staging.replace(path)
+
+
+def _upload_file(s3, file_path: Path, bucket_name: str, s3_key: str, transfer_config: TransferConfig) -> None:
+    s3.upload_file(Filename=str(file_path), Bucket=bucket_name, Key=s3_key, Config=transfer_config)
+
+
+class ArtifactUploader:
+    """Uploads run artifacts to S3 in the background as they are submitted.
+
+    Files are uploaded concurrently by `max_workers` threads sharing one client; large
+    files are split into multipart uploads of `multipart_chunksize_mb` parts sent over
+    `max_concurrency` connections each. A manifest of the SHA-256 of every uploaded
+    file (`manifest`, None to disable) lets later uploads skip files whose content is
+    unchanged. Files that fail are retried by `close` up to `retries` times, without
+    uploading the others again; files still failing are logged and left out of the result.
+
+    Attributes:
+        artifacts: The run directory; S3 keys are the file paths relative to it, after `prefix`.
+        bucket_name: The S3 bucket.
+        prefix: The prefix of every S3 key.
+    """
+
+    def __init__(self, artifacts: Path, config: dict):
+        self.artifacts = Path(artifacts)
+        self.bucket_name = config["bucket_name"]
+        self.prefix = config["prefix"]
+        self._config = config
+        max_workers = config.get("max_workers", 8)
+        max_concurrency = config.get("max_concurrency", 4)
+        self._transfer_config = TransferConfig(
+            multipart_threshold=int(config.get("multipart_threshold_mb", 8) * MB),
+            multipart_chunksize=int(config.get("multipart_chunksize_mb", 8) * MB),
+            max_concurrency=max_concurrency,
+        )
+        self._manifest_path = config.get("manifest")
+        self._manifest = load_manifest(self._manifest_path)
+
+        # One client is shared by all threads; its pool holds a connection per transfer thread
+        session = boto3.Session()
+        self._s3 = session.client(
+            "s3", config=botocore.config.Config(max_pool_connections=max_workers * max_concurrency)
+        )
+        self._pool = ThreadPoolExecutor(max_workers)
+        self._futures: dict = {}
+        self._unchanged: list[str] = []
+        self._submitted: set[Path] = set()
+
+    def _upload_changed(self, file_path: Path, s3_key: str, uri: str) -> Optional[str]:
+        # Hashing happens in the upload threads, off the submitting thread
+        digest = fingerprint_file(file_path)
+        if self._manifest.get(uri) == digest:
+            return None
+        _upload_file(self._s3, file_path, self.bucket_name, s3_key, self._transfer_config)
+        return digest
+
+    def submit(self, paths: list[Path]) -> None:
+        """Queues files for upload; directories are uploaded with all the files they contain.
+
+        Files already submitted are not uploaded twice.
+
+        Args:
+            paths: Files or directories inside the run directory.
+        """
+        for path in paths:
+            path = Path(path)
+            files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+            for file_path in files:
+                if file_path in self._submitted:
+                    continue
+                self._submitted.add(file_path)
+                s3_key = self.prefix + file_path.relative_to(self.artifacts).as_posix()
+                uri = "s3://%s/%s" % (self.bucket_name, s3_key)
+                self._futures[self._pool.submit(self._upload_changed, file_path, s3_key, uri)] = (
+                    uri, file_path, s3_key)
+
+    def close(self) -> list[str]:
+        """Waits for all uploads, retries the failed ones and saves the manifest.
+
+        Returns:
+            List of S3 uri's for each file that is in S3 after the upload, uploaded now or unchanged
+        """
+        uploaded_uris = []
+        pending = {}
+        retries = self._config.get("retries", 2)
+        futures = self._futures
+        for attempt in range(retries + 1):
+            if attempt:
+                if not pending:
+                    break
+                logger.warning("Retrying %d failed uploads (attempt %d of %d)", len(pending), attempt, retries)
+                time.sleep(self._config.get("retry_backoff", 1.0) * 2 ** (attempt - 1))
+                futures = {self._pool.submit(self._upload_changed, file_path, s3_key, uri): (uri, file_path, s3_key)
+                           for uri, (file_path, s3_key) in pending.items()}
+                pending = {}
+            for future in as_completed(futures):
+                uri, file_path, s3_key = futures[future]
+                try:
+                    digest = future.result()
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.debug("Failed to upload %s to %s: %s", file_path, uri, e)
+                    pending[uri] = (file_path, s3_key)
+                    continue
+                if digest is None:
+                    self._unchanged.append(uri)
+                else:
+                    self._manifest[uri] = digest
+                    uploaded_uris.append(uri)
+                    logger.debug("Successfully uploaded %s to %s", file_path, uri)
+        self._pool.shutdown()
+        self._futures = {}
+
+        # Record successful uploads even when some files failed, so they are not repeated
+        try:
+            save_manifest(self._manifest, self._manifest_path)
+        except OSError as e:
+            logger.warning("Failed to save the upload manifest %s: %s", self._manifest_path, e)
+
+        if pending:
+            logger.error("Failed to upload %d files, e.g. %s", len(pending), next(iter(pending)))
+        else:
+            logger.info("All files have been uploaded successfully.")
+        logger.info("Uploaded %d files, skipped %d unchanged files", len(uploaded_uris), len(self._unchanged))
+        return sorted(uploaded_uris + self._unchanged)
+
 
 def upload_artifacts(artifacts: Path, config: dict) -> list[str]:
     """Upload all the artifacts in the specified directory to S3
 
+    See `ArtifactUploader` for how files are uploaded, skipped when unchanged and retried.
+
     Args:
         artifacts: Directory containing all the artifacts from a given experiment
         config: Config required to upload artifacts to S3; see example config file for structure
 
     Returns:
-        List of S3 uri's for each file that was uploaded
+        List of S3 uri's for each file that is in S3 after the upload, uploaded now or unchanged
     """
-    # Retrieve the S3 configuration from the config dictionary
-    upload = config["upload"]
-    bucket_name = config["bucket_name"]
-    prefix = config["prefix"]
-
     # If the upload flag is set to False, skip the upload process
-    if not upload:
+    if not config["upload"]:
         logger.info("Upload is disabled in the configuration.")
         return []
 
-    # Create a boto3 session and S3 client
-    session = boto3.Session()
-    s3 = session.client("s3")
-
-    # Initialize a list to store the S3 URIs of the uploaded files
-    uploaded_uris = []
-
-    try:
-        # Iterate through all files in the artifacts directory
-        for root, _, files in os.walk(artifacts):
-            for file in files:
-                file_path = os.path.join(root, file)
-                # Create the S3 key by replacing the local artifacts path with the prefix
-                s3_key = prefix + file_path.replace(str(artifacts), "", 1).lstrip(
-                    os.sep
-                )
-
-                # Upload the file to S3
-                s3.upload_file(Filename=file_path, Bucket=bucket_name, Key=s3_key)
-
-                # Add the uploaded file's S3 URI to the list
-                uploaded_uri = "s3://%s/%s" % (bucket_name, s3_key)
-                uploaded_uris.append(uploaded_uri)
-
-                logger.debug("Successfully uploaded %s to %s", file_path, uploaded_uri)
-
-    except Exception as e:
-        logger.error("Failed to upload files: %s", str(e))
-        return []
-
-    logger.info("All files have been uploaded successfully.")
-
-    return uploaded_uris
+    uploader = ArtifactUploader(artifacts, config)
+    logger.info("Uploading %s to s3://%s/%s", artifacts, uploader.bucket_name, uploader.prefix)
+    uploader.submit([artifacts])
+    return uploader.close()
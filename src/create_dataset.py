@@ -1,16 +1,151 @@
 import logging
+import mmap
 import pandas as pd
 import numpy as np
 
+import src.artifact_io as aio
+
 
 # Set up the logger
 logger = logging.getLogger(__name__)
 
 
+def _line_offsets(mm: mmap.mmap, lines: list[int], chunk_size: int) -> dict[int, int]:
+    """
+    Find the byte offsets at which the requested lines start.
+
+    Args:
+        mm: The memory-mapped raw data file.
+        lines: The zero-based line numbers to locate.
+        chunk_size: The number of bytes scanned for newlines at a time.
+
+    Returns:
+        A dictionary mapping each requested line number to its starting byte offset.
+
+    Raises:
+        ValueError: If the file has fewer lines than requested.
+    """
+    wanted = sorted(set(lines))
+    offsets = {line: 0 for line in wanted if line == 0}
+    pending = [line for line in wanted if line > 0]
+    seen = 0
+    for start in range(0, len(mm), chunk_size):
+        if not pending:
+            break
+        chunk = np.frombuffer(mm, dtype=np.uint8, count=min(chunk_size, len(mm) - start), offset=start)
+        newlines = np.flatnonzero(chunk == ord("\n"))
+        # Line n starts right after the n-th newline of the file
+        while pending and pending[0] <= seen + len(newlines):
+            offsets[pending[0]] = start + int(newlines[pending[0] - seen - 1]) + 1
+            pending.pop(0)
+        seen += len(newlines)
+    for line in pending:
+        # A final line without a trailing newline ends at the end of the file
+        if line == seen + 1 and mm[-1:] != b"\n":
+            offsets[line] = len(mm)
+        else:
+            raise ValueError(f"Raw data file has no line {line}")
+    return offsets
+
+
+def _parse_block(mm: mmap.mmap, start: int, stop: int, out: np.ndarray, chunk_size: int) -> None:
+    """
+    Parse whitespace separated numbers between two byte offsets into a preallocated array.
+
+    Args:
+        mm: The memory-mapped raw data file.
+        start: The byte offset of the first line of the block.
+        stop: The byte offset just past the last line of the block.
+        out: The (possibly strided) array view the parsed rows are written to.
+        chunk_size: The approximate number of bytes parsed at a time.
+
+    Raises:
+        ValueError: If the block does not hold exactly as many rows and columns as the output array.
+    """
+    n_rows, n_columns = out.shape
+    row = 0
+    while start < stop:
+        # Cut pieces on line boundaries so no row is split in two
+        end = stop if stop - start <= chunk_size else mm.rfind(b"\n", start, start + chunk_size) + 1
+        if end <= start:
+            end = mm.find(b"\n", start + chunk_size, stop) + 1 or stop
+        values = np.fromstring(mm[start:end], dtype=out.dtype, sep=" ")
+        rows = len(values) // n_columns
+        if len(values) % n_columns or row + rows > n_rows:
+            raise ValueError(
+                f"Raw data block does not hold {n_rows} rows of {n_columns} columns"
+            )
+        out[row : row + rows] = values.reshape(rows, n_columns)
+        row += rows
+        start = end
+    if row != n_rows:
+        raise ValueError(f"Raw data block has {row} rows, expected {n_rows}")
+
+
+def _parse_mmap(raw_data_path: str, columns: list[str], row_ranges: list[tuple[int, int]],
+                chunk_size: int, dtype: np.dtype = np.float64) -> np.ndarray:
+    """
+    Parse row ranges of the raw data file into one array using a memory map.
+
+    Args:
+        raw_data_path: The path to the raw data file.
+        columns: The names of the measurement columns.
+        row_ranges: The [start, stop) line numbers of each class block.
+        chunk_size: The number of bytes processed at a time.
+        dtype: The float type the numbers are parsed into.
+
+    Returns:
+        A float array with one row per observation and one column per measurement,
+        plus a trailing column holding the index of the block each row came from.
+    """
+    n_rows = sum(stop - start for start, stop in row_ranges)
+    values = np.empty((n_rows, len(columns) + 1), dtype=dtype)
+
+    with open(raw_data_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offsets = _line_offsets(mm, [line for rows in row_ranges for line in rows], chunk_size)
+        row = 0
+        for label, (start, stop) in enumerate(row_ranges):
+            block = values[row : row + stop - start]
+            _parse_block(mm, offsets[start], offsets[stop], block[:, :-1], chunk_size)
+            block[:, -1] = label
+            row += len(block)
+    return values
+
+
+def _parse_python(raw_data_path: str, columns: list[str], row_ranges: list[tuple[int, int]],
+                  dtype: np.dtype = np.float64) -> np.ndarray:
+    """
+    Parse row ranges of the raw data file line by line in Python.
+
+    Kept as the reference implementation for the memory-mapped parser.
+
+    Args:
+        raw_data_path: The path to the raw data file.
+        columns: The names of the measurement columns.
+        row_ranges: The [start, stop) line numbers of each class block.
+        dtype: The float type of the returned array.
+
+    Returns:
+        The same array as `_parse_mmap`.
+    """
+    with open(raw_data_path, "r") as f:
+        data = [[s for s in line.split(" ") if s != ""] for line in f.readlines()]
+
+    blocks = []
+    for label, (start, stop) in enumerate(row_ranges):
+        block = [[float(s) for s in cloud] + [label] for cloud in data[start:stop]]
+        blocks.append(np.array(block, dtype=np.float64).reshape(-1, len(columns) + 1))
+    return np.concatenate(blocks).astype(dtype, copy=False)
+
+
 def create_dataset(raw_data_path: str, config: dict) -> pd.DataFrame:
     """
     Create a dataset from the raw data.
 
+    With `compact_dtypes` set in the configuration, the measurements are parsed into
+    float32 rather than float64 columns and the class is stored as int8, which halves
+    the memory and artifact size of the dataset and of the features derived from it.
+
     Args:
         raw_data_path: The path to the raw data file.
         config: A dictionary containing the dataset configuration, such as columns.
@@ -22,22 +157,27 @@ def create_dataset(raw_data_path: str, config: dict) -> pd.DataFrame:
     try:
         columns = config["columns"]
         cloud_data_index = config["cloud_data_index"]
-
-        with open(raw_data_path, "r") as f:
-            data = [[s for s in line.split(" ") if s != ""] for line in f.readlines()]
+        parser = config.get("parser", "mmap")
+        compact = config.get("compact_dtypes", False)
+        dtype = np.float32 if compact else np.float64
+        row_ranges = [tuple(cloud_data_index[cloud]) for cloud in ("cloud1", "cloud2")]
+
+        if parser == "mmap":
+            values = _parse_mmap(raw_data_path, columns, row_ranges, config.get("chunk_size", 1 << 24),
+                                 dtype)
+        elif parser == "python":
+            values = _parse_python(raw_data_path, columns, row_ranges, dtype)
+        else:
+            raise ValueError(f"Unknown raw data parser: {parser}")
         logger.debug("Data read successfully.")
 
-        first_cloud = data[cloud_data_index["cloud1"][0] : cloud_data_index["cloud1"][1]]
-        first_cloud = [[float(s.replace("/n", "")) for s in cloud] for cloud in first_cloud]
-        first_cloud = pd.DataFrame(first_cloud, columns=columns)
-        first_cloud["class"] = np.zeros(len(first_cloud))
-
-        second_cloud = data[cloud_data_index["cloud2"][0] : cloud_data_index["cloud2"][1]]
-        second_cloud = [[float(s.replace("/n", "")) for s in cloud] for cloud in second_cloud]
-        second_cloud = pd.DataFrame(second_cloud, columns=columns)
-        second_cloud["class"] = np.ones(len(second_cloud))
-
-        combined_data = pd.concat([first_cloud, second_cloud])
+        # Each class block keeps its own 0-based index, as when concatenating per-class frames
+        index = np.concatenate([np.arange(stop - start) for start, stop in row_ranges])
+        if compact:
+            combined_data = pd.DataFrame(values[:, :-1], columns=columns, index=index, copy=False)
+            combined_data["class"] = values[:, -1].astype(np.int8)
+        else:
+            combined_data = pd.DataFrame(values, columns=columns + ["class"], index=index, copy=False)
         logger.info("Dataset created successfully.")
 
     except FileNotFoundError as e:
@@ -56,17 +196,18 @@ def create_dataset(raw_data_path: str, config: dict) -> pd.DataFrame:
     return combined_data
 
 
-def save_dataset(data: pd.DataFrame, save_data_path: str):
+def save_dataset(data: pd.DataFrame, save_data_path: str, fmt: str = "csv"):
     """
-    Save the dataset to a CSV file.
+    Save the dataset to disk.
 
     Args:
         data: A pandas DataFrame containing the dataset.
-        save_data_path: The path where the CSV file should be saved.
+        save_data_path: The path where the dataset should be saved.
+        fmt: The artifact format, one of `artifact_io.FORMATS`.
     """
 
     try:
-        data.to_csv(save_data_path, index=False)
+        aio.save_frame(data, save_data_path, fmt)
         logger.info("Dataset saved successfully at %s", save_data_path)
     except FileNotFoundError as e:
         logger.error(
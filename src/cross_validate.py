@@ -0,0 +1,142 @@
+import logging
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import sklearn.ensemble
+import sklearn.model_selection
+import yaml
+
+import src.evaluate_performance as ep
+import src.score_model as sm
+import src.train_model as tm
+
+
+logger = logging.getLogger(__name__)
+
+# Features and target shared read-only by the fold worker processes
+_worker_data: dict = {}
+
+
+def fold_indices(y: np.ndarray, n_splits: int = 5, random_state: Optional[int] = None) -> list:
+    """Computes stratified k-fold indices once for all folds.
+
+    Args:
+        y: The target of every row.
+        n_splits: The number of folds.
+        random_state: The seed shuffling rows before they are assigned to folds.
+
+    Returns:
+        A list of (train index, test index) arrays, one pair per fold.
+    """
+    folds = sklearn.model_selection.StratifiedKFold(n_splits, shuffle=True, random_state=random_state)
+    return list(folds.split(np.zeros(len(y)), y))
+
+
+def _init_worker(X_path: str, y: np.ndarray, config: dict) -> None:
+    _worker_data.update(X=np.load(X_path, mmap_mode="r"), y=y, config=config)
+
+
+def _evaluate_fold(train_index: np.ndarray, test_index: np.ndarray) -> dict:
+    """Fits the model on one fold and evaluates it on the held-out rows."""
+    X, y, config = _worker_data["X"], _worker_data["y"], _worker_data["config"]
+    model = sklearn.ensemble.RandomForestClassifier(**config["train_model"]["model_params"])
+    model.fit(X[train_index], y[train_index])
+    proba = model.predict_proba(X[test_index])
+    threshold = config.get("score_model", {}).get("threshold", 0.5)
+    # Folds are summarized by their spread; per-fold curves and bootstraps are not needed
+    evaluate_config = {**config["evaluate_performance"], "bootstrap": None, "curve_points": None}
+    scores = pd.DataFrame({evaluate_config["prob_col"]: proba[:, 1],
+                           evaluate_config["bin_col"]: sm.predict_binary(proba, model.classes_, threshold)})
+    test = pd.DataFrame({evaluate_config["target"]: y[test_index]})
+    return ep.evaluate_performance(scores, test, evaluate_config)
+
+
+def cross_validate(data: pd.DataFrame, config: dict) -> dict:
+    """Evaluates the configured model with stratified k-fold cross-validation.
+
+    Fold indices are computed once. The features are written once to a temporary
+    .npy file that `processes` worker processes memory-map, so each fold only
+    receives its row indices. Every fold is scored and evaluated like the pipeline's
+    test set, with `evaluate_performance`.
+
+    Args:
+        data: A DataFrame containing the features and target variable.
+        config: The full pipeline configuration; the cross_validate section sets
+            n_splits, processes and random_state, and the model is built from the
+            train_model section.
+
+    Returns:
+        A dictionary with the metrics of each fold, the mean and standard deviation
+        of the AUC and accuracy across folds, and the confusion matrix summed over folds.
+
+    Raises:
+        ValueError: If train_model.model_params declare a hyperparameter search.
+    """
+    cv_config = config.get("cross_validate", {})
+    train_config = config["train_model"]
+    n_splits = cv_config.get("n_splits", 5)
+    processes = cv_config.get("processes", 1)
+    try:
+        if tm.is_search(train_config["model_params"]):
+            raise ValueError("Cross-validation needs fixed train_model.model_params, not a search")
+        y = data[train_config["target"]].to_numpy()
+        folds = fold_indices(y, n_splits, cv_config.get("random_state"))
+        logger.info("Cross-validating over %d folds with %d process(es)", n_splits, processes)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            X_path = str(Path(tmp) / "X.npy")
+            # Forests train on float32 features; converting once avoids a copy per fold
+            np.save(X_path, data[train_config["initial_features"]].to_numpy(dtype=np.float32))
+            init_args = (X_path, y, config)
+            if processes <= 1:
+                _init_worker(*init_args)
+                fold_metrics = [_evaluate_fold(*fold) for fold in folds]
+                _worker_data.clear()
+            else:
+                with ProcessPoolExecutor(processes, multiprocessing.get_context("spawn"),
+                                         _init_worker, init_args) as pool:
+                    fold_metrics = list(pool.map(_evaluate_fold, *zip(*folds)))
+    except KeyError as e:
+        logger.error("Missing key in the configuration: %s", e)
+        raise
+    except ValueError as e:
+        logger.error("Invalid value encountered: %s", e)
+        raise
+
+    summary = {"n_splits": n_splits}
+    for metric in ("AUC", "Accuracy"):
+        values = np.array([metrics[metric] for metrics in fold_metrics], dtype=float)
+        summary[metric] = {"mean": float(values.mean()), "std": float(values.std(ddof=1))}
+    summary["Confusion Matrix"] = np.sum(
+        [metrics["Confusion Matrix"] for metrics in fold_metrics], axis=0
+    ).tolist()
+    summary["folds"] = [
+        {**metrics, "AUC": float(metrics["AUC"]), "Accuracy": float(metrics["Accuracy"])}
+        for metrics in fold_metrics
+    ]
+    logger.info("Cross-validated AUC %.4f +/- %.4f, accuracy %.4f +/- %.4f",
+                summary["AUC"]["mean"], summary["AUC"]["std"],
+                summary["Accuracy"]["mean"], summary["Accuracy"]["std"])
+    return summary
+
+
+def save_cv_metrics(summary: dict, file_path: Path) -> None:
+    """
+    Save the cross-validation metrics to a YAML file.
+
+    Args:
+        summary: The cross-validation metrics returned by `cross_validate`.
+        file_path: The path where the YAML file should be saved.
+    """
+    try:
+        with open(file_path, "w") as f:
+            yaml.dump(summary, f, default_flow_style=False, sort_keys=False)
+        logger.info("Cross-validation metrics saved successfully at %s", file_path)
+    except FileNotFoundError as e:
+        logger.error("Error while saving the cross-validation metrics: %s", e)
+        raise
@@ -0,0 +1,161 @@
+import contextlib
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, NamedTuple, Optional
+
+from src.profiling import StageProfiler
+from src.stage_cache import StageCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class Stage(NamedTuple):
+    """A pipeline stage and what it depends on.
+
+    Attributes:
+        name: The name of the stage, unique in the pipeline.
+        run: Computes the stage outputs. It receives the in-memory values returned by
+            the stages that ran before it, and returns new values for later stages,
+            or None. A "rows" value is recorded by the profiler rather than shared.
+            Values of a stage restored from the cache are missing, so stages read
+            their inputs from the run directory when a value is absent.
+        requires: The names of the stages that must finish first.
+        inputs: The artifacts whose content is part of the cache key of the stage.
+        outputs: The names of the files or directories the stage writes to the run directory.
+        config: The configuration that is part of the cache key of the stage.
+        cacheable: Whether the outputs are cached; stages without outputs never are.
+    """
+
+    name: str
+    run: Callable[[dict], Optional[dict]]
+    requires: tuple = ()
+    inputs: tuple = ()
+    outputs: tuple = ()
+    config: Any = None
+    cacheable: bool = True
+
+
+def topological_order(stages: list[Stage]) -> list[Stage]:
+    """Orders stages so that every stage comes after the stages it requires.
+
+    Stages keep their given order where the dependencies allow it.
+
+    Args:
+        stages: The stages of the pipeline.
+
+    Returns:
+        The stages in a valid execution order.
+
+    Raises:
+        ValueError: If stage names repeat, a required stage is missing, or the
+            dependencies form a cycle.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("Stage names must be unique")
+    for stage in stages:
+        missing = [name for name in stage.requires if name not in by_name]
+        if missing:
+            raise ValueError(f"Stage {stage.name} requires unknown stages {missing}")
+    ordered, done = [], set()
+    while len(ordered) < len(stages):
+        ready = [stage for stage in stages
+                 if stage.name not in done and all(name in done for name in stage.requires)]
+        if not ready:
+            cycle = sorted(stage.name for stage in stages if stage.name not in done)
+            raise ValueError(f"Stages {cycle} depend on each other")
+        ordered.extend(ready)
+        done.update(stage.name for stage in ready)
+    return ordered
+
+
+class DagExecutor:
+    """Runs a dependency graph of stages, with independent stages running concurrently.
+
+    A stage starts as soon as all the stages it requires have finished, on one of
+    `max_workers` threads, so the run takes as long as its critical path rather than
+    the sum of its stages. Stages are served from the stage cache when their inputs
+    and configuration are unchanged, and are profiled when a profiler is given. When a
+    stage finishes, `on_output` receives the paths of its outputs, e.g. to upload them
+    while the other stages are still running. When a stage fails, no new stage is
+    started, and the first error is raised once the running stages have finished.
+
+    Attributes:
+        artifacts: The run directory the stages write to.
+        cache: The stage cache, or None to always run the stages.
+        profiler: The profiler recording each stage, or None.
+        max_workers: The largest number of stages running at once.
+        on_output: Called with the stage and the paths of its outputs when it finishes.
+    """
+
+    def __init__(self, artifacts: Path, cache: Optional[StageCache] = None,
+                 profiler: Optional[StageProfiler] = None, max_workers: int = 4,
+                 on_output: Optional[Callable[[Stage, list[Path]], None]] = None):
+        self.artifacts = Path(artifacts)
+        self.cache = cache
+        self.profiler = profiler
+        self.max_workers = max_workers
+        self.on_output = on_output
+
+    def _execute(self, stage: Stage, values: dict) -> dict:
+        """Runs one stage, or restores its outputs from the cache."""
+        profile = self.profiler.stage(stage.name) if self.profiler is not None else contextlib.nullcontext({})
+        with profile as record:
+            key = None
+            if self.cache is not None and stage.cacheable and stage.outputs:
+                key = self.cache.key(stage.name, list(stage.inputs), stage.config)
+                if self.cache.restore(stage.name, key, self.artifacts, list(stage.outputs)):
+                    return {}
+            result = dict(stage.run(values) or {})
+            record["rows"] = result.pop("rows", None)
+            if key is not None:
+                self.cache.store(stage.name, key, self.artifacts, list(stage.outputs))
+            return result
+
+    def run(self, stages: list[Stage]) -> dict:
+        """Runs all stages.
+
+        Args:
+            stages: The stages of the pipeline.
+
+        Returns:
+            The in-memory values returned by the stages.
+
+        Raises:
+            ValueError: If the stages do not form a valid dependency graph.
+        """
+        pending = topological_order(stages)
+        values: dict = {}
+        done: set = set()
+        error: Optional[BaseException] = None
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            running = {}
+            while pending or running:
+                if error is None:
+                    ready = [stage for stage in pending if all(name in done for name in stage.requires)]
+                    for stage in ready:
+                        pending.remove(stage)
+                        logger.debug("Starting stage %s", stage.name)
+                        running[pool.submit(self._execute, stage, dict(values))] = stage
+                elif not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    try:
+                        values.update(future.result())
+                    except Exception as e:  # pylint: disable=broad-except
+                        logger.error("Stage %s failed: %s", stage.name, e)
+                        error = error or e
+                        continue
+                    done.add(stage.name)
+                    if self.on_output is not None and stage.outputs:
+                        self.on_output(stage, [self.artifacts / name for name in stage.outputs])
+        if error is not None:
+            skipped = [stage.name for stage in pending]
+            if skipped:
+                logger.warning("Stages not run after the failure: %s", skipped)
+            raise error
+        return values
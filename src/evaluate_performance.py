@@ -1,5 +1,8 @@
 import logging
 from pathlib import Path
+from typing import Optional
+
+import numpy as np
 import pandas as pd
 import sklearn.metrics
 import yaml
@@ -8,10 +11,141 @@ import yaml
 logger = logging.getLogger(__name__)
 
 
+def threshold_curves(y_true: np.ndarray, y_score: np.ndarray) -> dict:
+    """Computes classification metrics at every distinct score threshold.
+
+    Scores are sorted once; true and false positive counts at each threshold are
+    cumulative sums over the sorted rows, so every curve costs O(n log n) in total.
+    A row is predicted positive when its score is at least the threshold, and the
+    positive class is the greater label. As in `sklearn.metrics.roc_curve`, the curves
+    start at an infinite threshold, where no row is predicted positive.
+
+    Args:
+        y_true: The true labels, with two distinct values.
+        y_score: The predicted probability of the positive class.
+
+    Returns:
+        A dictionary of arrays, one entry per threshold in decreasing order:
+        thresholds, tp and fp counts, fpr, tpr (= recall), precision (1 where nothing
+        is predicted positive) and accuracy, plus the numbers of positives and negatives.
+
+    Raises:
+        ValueError: If `y_true` does not hold exactly two classes.
+    """
+    y_true = np.asarray(y_true)
+    labels = np.unique(y_true)
+    if len(labels) != 2:
+        raise ValueError(f"Threshold curves need two classes in y_true, got {len(labels)}")
+    positive = y_true == labels[-1]
+    order = np.argsort(-np.asarray(y_score, dtype=np.float64), kind="mergesort")
+    scores = np.asarray(y_score, dtype=np.float64)[order]
+    positive = positive[order]
+    # The last row of each group of tied scores closes a threshold
+    ends = np.r_[np.nonzero(np.diff(scores))[0], len(scores) - 1]
+    tp = np.r_[0, np.cumsum(positive)[ends]]
+    fp = np.r_[0, ends + 1] - tp
+    n_pos, n_neg = int(positive.sum()), int(len(positive) - positive.sum())
+    precision = np.ones(len(tp))
+    precision[1:] = tp[1:] / (tp[1:] + fp[1:])
+    return {
+        "thresholds": np.r_[np.inf, scores[ends]],
+        "tp": tp,
+        "fp": fp,
+        "fpr": fp / n_neg,
+        "tpr": tp / n_pos,
+        "precision": precision,
+        "accuracy": (tp + n_neg - fp) / len(scores),
+        "n_pos": n_pos,
+        "n_neg": n_neg,
+    }
+
+
+def curve_auc(curves: dict) -> float:
+    """Computes the ROC AUC from threshold curves with the trapezoidal rule.
+
+    Args:
+        curves: The threshold curves, see `threshold_curves`.
+
+    Returns:
+        The area under the ROC curve.
+    """
+    fpr, tpr = curves["fpr"], curves["tpr"]
+    return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+
+def average_precision(curves: dict) -> float:
+    """Computes the average precision, the step-wise area under the precision-recall curve.
+
+    Args:
+        curves: The threshold curves, see `threshold_curves`.
+
+    Returns:
+        The average precision.
+    """
+    return float(np.sum(np.diff(curves["tpr"]) * curves["precision"][1:]))
+
+
+def bootstrap_auc(y_true: np.ndarray, y_score: np.ndarray, replicates: int = 1000,
+                  random_state: Optional[int] = None, batch_cells: int = 1 << 23) -> np.ndarray:
+    """Computes bootstrap replicates of the ROC AUC in batched NumPy form.
+
+    Rows are sorted by score once. Each replicate resamples the rows with replacement,
+    which is expressed as a row of multiplicity weights; for a batch of replicates the
+    weighted true and false positive counts at every threshold are cumulative sums
+    over a (replicates x rows) weight matrix, and the AUC of every replicate follows
+    with the trapezoidal rule. Batches hold at most `batch_cells` weights.
+
+    Args:
+        y_true: The true labels, with two distinct values.
+        y_score: The predicted probability of the positive class.
+        replicates: The number of bootstrap replicates.
+        random_state: The seed of the resampling.
+        batch_cells: The largest number of weights in memory at a time.
+
+    Returns:
+        The AUC of every replicate; NaN for replicates without both classes.
+    """
+    y_true = np.asarray(y_true)
+    order = np.argsort(-np.asarray(y_score, dtype=np.float64), kind="mergesort")
+    scores = np.asarray(y_score, dtype=np.float64)[order]
+    positive = (y_true == np.unique(y_true)[-1])[order]
+    ends = np.r_[np.nonzero(np.diff(scores))[0], len(scores) - 1]
+    n = len(scores)
+    rng = np.random.default_rng(random_state)
+    batch = max(1, min(replicates, batch_cells // max(n, 1)))
+    aucs = np.empty(replicates)
+    for start in range(0, replicates, batch):
+        size = min(batch, replicates - start)
+        # Multiplicity of every (sorted) row in each resample
+        draws = rng.integers(0, n, (size, n)) + (np.arange(size) * n)[:, np.newaxis]
+        weights = np.bincount(draws.ravel(), minlength=size * n).reshape(size, n)
+        tp = np.cumsum(weights * positive, axis=1)[:, ends]
+        fp = np.cumsum(weights * ~positive, axis=1)[:, ends]
+        tp = np.hstack([np.zeros((size, 1)), tp])
+        fp = np.hstack([np.zeros((size, 1)), fp])
+        area = np.sum(np.diff(fp, axis=1) * (tp[:, 1:] + tp[:, :-1]), axis=1) / 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            aucs[start : start + size] = area / (tp[:, -1] * fp[:, -1])
+    return aucs
+
+
+def _sample_curves(curves: dict, max_points: int) -> dict:
+    # Evenly spaced thresholds keep the saved curves small for large test sets
+    keep = np.unique(np.linspace(0, len(curves["thresholds"]) - 1, max_points).round().astype(int))
+    return {name: curves[name][keep].tolist()
+            for name in ("thresholds", "fpr", "tpr", "precision", "accuracy")}
+
+
 def evaluate_performance(scores: pd.DataFrame, test: pd.DataFrame, config: dict) -> dict:
     """
     Evaluates the performance of a model based on the provided scores and configuration.
 
+    The scores are sorted once to derive the ROC and precision-recall curves and the
+    accuracy at every threshold, from which the AUC and average precision follow.
+    With `bootstrap.replicates` set, a confidence interval of the AUC is estimated
+    from that many bootstrap resamples of the test set, computed in batches (see
+    `bootstrap_auc`). The curves are saved at up to `curve_points` thresholds.
+
     Args:
         scores: A DataFrame containing the predicted probabilities and binary predictions.
         test: A pandas DataFrame containing the test data.
@@ -22,11 +156,13 @@ def evaluate_performance(scores: pd.DataFrame, test: pd.DataFrame, config: dict)
     """
 
     try:
-        y_true = test[config["target"]]
-        ypred_proba = scores[config["prob_col"]]
+        y_true = test[config["target"]].to_numpy()
+        ypred_proba = scores[config["prob_col"]].to_numpy()
         ypred_bin = scores[config["bin_col"]]
 
-        auc = sklearn.metrics.roc_auc_score(y_true, ypred_proba)
+        curves = threshold_curves(y_true, ypred_proba)
+        logger.debug("Threshold curves calculated at %d thresholds.", len(curves["thresholds"]))
+        auc = curve_auc(curves)
         logger.debug("AUC calculated.")
         confusion = sklearn.metrics.confusion_matrix(y_true, ypred_bin)
         logger.debug("Confusion matrix calculated.")
@@ -35,12 +171,35 @@ def evaluate_performance(scores: pd.DataFrame, test: pd.DataFrame, config: dict)
         classification_report = sklearn.metrics.classification_report(y_true, ypred_bin)
         logger.debug("Classification report calculated.")
 
+        best = int(np.argmax(curves["accuracy"]))
+        # The curves predict scores at or above a threshold as positive, while scoring
+        # predicts scores above it: the next lower distinct score gives the same labels
+        thresholds = curves["thresholds"]
+        best_threshold = (thresholds[best + 1] if best + 1 < len(thresholds)
+                          else np.nextafter(thresholds[best], -np.inf))
         metrics = {
             "AUC": auc,
             "Confusion Matrix": confusion.tolist(),
             "Accuracy": accuracy,
-            "Classification Report": classification_report
+            "Classification Report": classification_report,
+            "Average Precision": average_precision(curves),
+            "Best Threshold": {"threshold": float(best_threshold),
+                               "accuracy": float(curves["accuracy"][best])},
         }
+
+        bootstrap = config.get("bootstrap") or {}
+        replicates = bootstrap.get("replicates", 0)
+        if replicates:
+            level = bootstrap.get("level", 0.95)
+            aucs = bootstrap_auc(y_true, ypred_proba, replicates, bootstrap.get("random_state"))
+            lower, upper = np.nanpercentile(aucs, [50 * (1 - level), 50 * (1 + level)])
+            metrics["AUC Confidence Interval"] = {
+                "level": level, "lower": lower, "upper": upper,
+                "std": np.nanstd(aucs, ddof=1), "replicates": replicates,
+            }
+            logger.debug("Bootstrap AUC confidence interval calculated from %d replicates.", replicates)
+        if config.get("curve_points"):
+            metrics["Curves"] = _sample_curves(curves, config["curve_points"])
         logger.info("Performance evaluation completed successfully.")
         return metrics
     except Exception as e:
@@ -48,6 +207,17 @@ def evaluate_performance(scores: pd.DataFrame, test: pd.DataFrame, config: dict)
         raise
 
 
+def _to_builtin(value):
+    # Numpy scalars and arrays are written to YAML as plain numbers and lists
+    if isinstance(value, dict):
+        return {key: _to_builtin(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_to_builtin(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
 def save_metrics(metrics: dict, file_path: Path):
     """
     Save the evaluation metrics to a YAML file.
@@ -59,9 +229,7 @@ def save_metrics(metrics: dict, file_path: Path):
 
     try:
         # Convert numpy scalar values to Python built-in types
-        metrics["AUC"] = float(metrics["AUC"])
-        metrics["Accuracy"] = float(metrics["Accuracy"])
-        metrics["Confusion Matrix"] = metrics["Confusion Matrix"]
+        metrics = _to_builtin(metrics)
 
         with open(file_path, "w") as f:
             yaml.dump(metrics, f, default_flow_style=False)
@@ -0,0 +1,239 @@
+import datetime
+import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import yaml
+
+import src.dag as dag
+import src.profiling as prof
+import src.stage_cache as sc
+import src.stages as st
+
+
+logger = logging.getLogger(__name__)
+
+SHARED_DIR = "shared"
+SUMMARY_FILE = "summary.csv"
+
+# Metrics of metrics.yaml and cv_metrics.yaml compared across experiments: (column, keys)
+SUMMARY_METRICS = [
+    ("AUC", ("AUC",)),
+    ("AUC lower", ("AUC Confidence Interval", "lower")),
+    ("AUC upper", ("AUC Confidence Interval", "upper")),
+    ("Accuracy", ("Accuracy",)),
+    ("Average Precision", ("Average Precision",)),
+    ("Best Threshold", ("Best Threshold", "threshold")),
+]
+CV_SUMMARY_METRICS = [
+    ("CV AUC mean", ("AUC", "mean")),
+    ("CV AUC std", ("AUC", "std")),
+    ("CV Accuracy mean", ("Accuracy", "mean")),
+]
+
+
+def stage_signatures(config: dict, stages: list[dag.Stage]) -> dict[str, str]:
+    """Identifies every stage by what its outputs depend on.
+
+    The signature of a stage hashes its configuration, the data source, the artifact
+    format and the signatures of the stages it requires, so two configurations give a
+    stage the same signature exactly when it would produce the same outputs.
+
+    Args:
+        config: The pipeline configuration.
+        stages: The stages of the pipeline, see `stages.pipeline_stages`.
+
+    Returns:
+        Mapping of stage name to its signature.
+    """
+    run_config = config["run_config"]
+    context = [run_config["data_source"], run_config.get("artifact_format", "csv")]
+    signatures: dict[str, str] = {}
+    for stage in dag.topological_order(stages):
+        signatures[stage.name] = sc.stage_key(
+            stage.name, [signatures[name] for name in stage.requires], [stage.config, context]
+        )
+    return signatures
+
+
+def shared_stages(configs: list[dict]) -> list[str]:
+    """Finds the stages that every configuration runs identically.
+
+    Args:
+        configs: The pipeline configurations of the experiments.
+
+    Returns:
+        The names of the shared stages, in pipeline order. Since a signature covers the
+        required stages, the stages a shared stage requires are shared too.
+    """
+    signatures = [
+        stage_signatures(config, st.pipeline_stages(config, st.run_paths(Path("."), config)))
+        for config in configs
+    ]
+    return [name for name, signature in signatures[0].items()
+            if all(other.get(name) == signature for other in signatures[1:])]
+
+
+def _link(src: Path, dst: Path) -> None:
+    """Hard-links a file or directory tree, copying where links are not supported."""
+
+    def link(source, target):
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+    if src.is_dir():
+        shutil.copytree(src, dst, copy_function=link, dirs_exist_ok=True)
+    else:
+        link(src, dst)
+
+
+def _run_stages(config: dict, artifacts: Path, stages: list[dag.Stage]) -> None:
+    """Runs stages into a run directory with the stage cache and profiler of the configuration."""
+    run_config = config["run_config"]
+    cache = sc.StageCache(run_config.get("cache_dir", ".cache/stages"), run_config.get("use_cache", True))
+    profile_config = run_config.get("profile", {})
+    profiler = prof.StageProfiler(artifacts, profile_config.get("enabled", True),
+                                  profile_config.get("cprofile", False), profile_config.get("trace_memory", False))
+    try:
+        dag.DagExecutor(artifacts, cache, profiler, run_config.get("stage_workers", 4)).run(stages)
+    finally:
+        with (artifacts / "stage_cache.yaml").open("w") as f:
+            yaml.dump(cache.report(), f)
+        profiler.save()
+
+
+def _run_experiment(config: dict, artifacts: Path, shared: list[str]) -> Path:
+    """Runs the stages of one experiment that are not shared, reading the shared outputs."""
+    paths = st.run_paths(artifacts, config)
+    stages = [stage._replace(requires=tuple(name for name in stage.requires if name not in shared))
+              for stage in st.pipeline_stages(config, paths) if stage.name not in shared]
+    _run_stages(config, artifacts, stages)
+    return artifacts
+
+
+def _lookup(metrics: dict, keys: tuple):
+    for key in keys:
+        if not isinstance(metrics, dict) or key not in metrics:
+            return None
+        metrics = metrics[key]
+    return metrics
+
+
+def _flatten(config: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in config.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def summarize(runs: dict[str, Path], configs: dict[str, dict]) -> pd.DataFrame:
+    """Compares the metrics of experiment runs.
+
+    Args:
+        runs: Mapping of experiment name to its run directory.
+        configs: Mapping of experiment name to its pipeline configuration.
+
+    Returns:
+        One row per experiment, sorted by decreasing AUC, with the configuration
+        settings that differ between experiments, the metrics of metrics.yaml and,
+        when cross-validation ran, of cv_metrics.yaml.
+    """
+    flat = {name: _flatten(config) for name, config in configs.items()}
+    keys = sorted({key for settings in flat.values() for key in settings})
+    varying = [key for key in keys
+               if len({repr(settings.get(key)) for settings in flat.values()}) > 1]
+    rows = []
+    for name, run_dir in runs.items():
+        row = {"experiment": name}
+        row.update({key: flat[name].get(key) for key in varying})
+        for path, columns in (("metrics.yaml", SUMMARY_METRICS), ("cv_metrics.yaml", CV_SUMMARY_METRICS)):
+            if (run_dir / path).exists():
+                with open(run_dir / path) as f:
+                    metrics = yaml.safe_load(f)
+                row.update({column: _lookup(metrics, path_keys) for column, path_keys in columns})
+        row["run_dir"] = str(run_dir)
+        rows.append(row)
+    summary = pd.DataFrame(rows)
+    if "AUC" in summary.columns:
+        summary = summary.sort_values("AUC", ascending=False, kind="mergesort")
+    return summary.reset_index(drop=True)
+
+
+def run_experiments(configs: dict[str, dict], output: Optional[Path] = None, processes: int = 1) -> Path:
+    """Runs several pipeline configurations, computing the stages they share once.
+
+    The stages that every configuration runs identically, e.g. the download, dataset
+    and features when the configurations only differ in `train_model`, run once into
+    the `shared` directory. Their outputs are hard-linked into the run directory of
+    each experiment, and the remaining stages of the experiments run in `processes`
+    worker processes. The metrics of all experiments are compared in summary.csv.
+    Artifacts are not uploaded; use `pipeline.py upload` on a run directory.
+
+    Args:
+        configs: Mapping of experiment name to its pipeline configuration.
+        output: The directory the experiments directory is created in; defaults to
+            `run_config.output` of the first configuration.
+        processes: The number of experiments running at once.
+
+    Returns:
+        The experiments directory, holding the shared outputs, one run directory per
+        experiment and the summary.
+
+    Raises:
+        ValueError: If no configuration is given.
+    """
+    if not configs:
+        raise ValueError("No experiment configuration given")
+    first = next(iter(configs.values()))
+    now = int(datetime.datetime.now().timestamp())
+    root = Path(output or first["run_config"].get("output", "runs")) / f"experiments-{now}"
+
+    shared = shared_stages(list(configs.values()))
+    logger.info("Running %d experiments; stages run once for all: %s", len(configs), shared)
+    shared_dir = root / SHARED_DIR
+    shared_dir.mkdir(parents=True)
+    with (shared_dir / "config.yaml").open("w") as f:
+        yaml.dump(first, f)
+    common = [stage for stage in st.pipeline_stages(first, st.run_paths(shared_dir, first))
+                      if stage.name in shared]
+    _run_stages(first, shared_dir, common)
+
+    runs = {}
+    for name, config in configs.items():
+        run_dir = root / name
+        run_dir.mkdir()
+        with (run_dir / "config.yaml").open("w") as f:
+            yaml.dump(config, f)
+        for stage in common:
+            for output_name in stage.outputs:
+                _link(shared_dir / output_name, run_dir / output_name)
+        runs[name] = run_dir
+
+    if processes <= 1:
+        for name, config in configs.items():
+            _run_experiment(config, runs[name], shared)
+    else:
+        with ProcessPoolExecutor(processes, multiprocessing.get_context("spawn")) as pool:
+            futures = {name: pool.submit(_run_experiment, config, runs[name], shared)
+                       for name, config in configs.items()}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error("Experiment %s failed: %s", name, e)
+                    raise
+
+    summary = summarize(runs, configs)
+    summary.to_csv(root / SUMMARY_FILE, index=False)
+    logger.info("Experiment summary saved at %s", root / SUMMARY_FILE)
+    return root
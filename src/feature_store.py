@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+import src.generate_features as gf
+import src.stage_cache as sc
+
+
+logger = logging.getLogger(__name__)
+
+# Kinds of generated features, in the order `generate_features.compile_plan` defines them
+FEATURE_KINDS = ("log_transform", "multiply", "calculate_range", "calculate_norm_range")
+
+
+def dataset_key(raw_data_path: Union[Path, Sequence[Path]], dataset_config: dict) -> str:
+    """Identifies a dataset by the content of its raw data and how it was parsed.
+
+    Args:
+        raw_data_path: The raw data file, or the files of several data sources.
+        dataset_config: The create_dataset configuration.
+
+    Returns:
+        The hex digest identifying the dataset.
+    """
+    raw_paths = [raw_data_path] if isinstance(raw_data_path, (str, Path)) else raw_data_path
+    return sc.stage_key("create_dataset", [sc.fingerprint_file(path) for path in raw_paths], dataset_config)
+
+
+def feature_keys(config: dict) -> dict[str, str]:
+    """Identifies every configured feature by its definition.
+
+    The key of a feature hashes its kind and configuration entry, and the keys of the
+    generated features it refers to, so that redefining a feature also changes the
+    keys of the features computed from it. Features with the same definition share a
+    key, whatever their names.
+
+    Args:
+        config: The feature generation configuration.
+
+    Returns:
+        Mapping of feature name to its key.
+    """
+    keys: dict[str, str] = {}
+    for kind in FEATURE_KINDS:
+        for name, entry in config.get(kind, {}).items():
+            columns = [entry] if isinstance(entry, str) else list(entry.values())
+            upstream = {col: keys[col] for col in columns if col in keys}
+            payload = json.dumps([kind, entry, upstream], sort_keys=True, default=str)
+            keys[name] = hashlib.sha256(payload.encode()).hexdigest()
+    return keys
+
+
+class FeatureStore:
+    """Persists generated feature columns across runs.
+
+    Every column is stored as an .npy file under the key of the dataset it was computed
+    from (see `dataset_key`) and the key of its definition (see `feature_keys`), with a
+    JSON file recording its name. Generating features through the store only computes
+    the columns it does not hold yet: adding a feature to the configuration computes
+    that feature alone. Stored columns are memory-mapped when loaded.
+
+    Attributes:
+        root: The directory holding the stored features.
+        enabled: Whether features are read from and written to the store.
+        loaded: The names of the features loaded from the store by `generate`.
+        computed: The names of the features computed by `generate`.
+    """
+
+    def __init__(self, root: Path, enabled: bool = True):
+        self.root = Path(root)
+        self.enabled = enabled
+        self.loaded: list[str] = []
+        self.computed: list[str] = []
+
+    def _path(self, data_key: str, feature_key: str) -> Path:
+        return self.root / data_key / f"{feature_key}.npy"
+
+    def get(self, data_key: str, feature_key: str, n_rows: Optional[int] = None) -> Optional[np.ndarray]:
+        """Loads a stored feature column.
+
+        Args:
+            data_key: The key of the dataset.
+            feature_key: The key of the feature.
+            n_rows: The expected number of rows; a column of another length is ignored.
+
+        Returns:
+            The read-only, memory-mapped column, or None if it is not stored.
+        """
+        path = self._path(data_key, feature_key)
+        if not self.enabled or not path.exists():
+            return None
+        try:
+            values = np.asarray(np.load(path, mmap_mode="r"))
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load stored feature %s: %s", path, e)
+            return None
+        if n_rows is not None and len(values) != n_rows:
+            logger.warning("Stored feature %s has %d rows, expected %d", path, len(values), n_rows)
+            return None
+        return values
+
+    def put(self, data_key: str, feature_key: str, name: str, values: np.ndarray) -> None:
+        """Stores a feature column.
+
+        The column is written to a temporary file that replaces the stored one, so that
+        concurrent runs never read a partial file.
+
+        Args:
+            data_key: The key of the dataset.
+            feature_key: The key of the feature.
+            name: The name of the feature.
+            values: The column.
+        """
+        if not self.enabled:
+            return
+        path = self._path(data_key, feature_key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            staging = path.with_name(f"{feature_key}.{os.getpid()}.tmp.npy")
+            np.save(staging, np.ascontiguousarray(values))
+            os.replace(staging, path)
+            with open(path.with_suffix(".json"), "w") as f:
+                json.dump({"name": name, "rows": len(values), "dtype": str(values.dtype)}, f)
+        except OSError as e:
+            logger.warning("Could not store feature %s: %s", name, e)
+
+    def columns(self, data_key: str) -> dict[str, list[str]]:
+        """Lists the features stored for a dataset.
+
+        Args:
+            data_key: The key of the dataset.
+
+        Returns:
+            Mapping of feature name to its stored keys, most recently stored first.
+        """
+        stored: dict[str, list[tuple[float, str]]] = {}
+        for meta in (self.root / data_key).glob("*.json"):
+            if not meta.with_suffix(".npy").exists():
+                continue
+            with open(meta) as f:
+                name = json.load(f)["name"]
+            stored.setdefault(name, []).append((meta.stat().st_mtime, meta.stem))
+        return {name: [key for _, key in sorted(keys, reverse=True)] for name, keys in stored.items()}
+
+    def query(self, data_key: str, columns: list[str], config: Optional[dict] = None) -> pd.DataFrame:
+        """Loads stored features by name, e.g. the features a model is trained on or scores.
+
+        Args:
+            data_key: The key of the dataset.
+            columns: The names of the features.
+            config: The feature generation configuration defining the features; without
+                it, the most recently stored feature of each name is loaded.
+
+        Returns:
+            The features, one column each, in the given order.
+
+        Raises:
+            KeyError: If a feature is not stored.
+        """
+        if config is not None:
+            keys = feature_keys(config)
+            missing = [col for col in columns if col not in keys]
+            if missing:
+                raise KeyError(f"Features {missing} are not configured")
+            candidates = {col: [keys[col]] for col in columns}
+        else:
+            stored = self.columns(data_key)
+            candidates = {col: stored.get(col, [])[:1] for col in columns}
+        values = {}
+        for col, options in candidates.items():
+            column = self.get(data_key, options[0]) if options else None
+            if column is None:
+                raise KeyError(f"Feature {col} is not stored for dataset {data_key[:12]}")
+            values[col] = column
+        return pd.DataFrame(values, copy=False)
+
+    def generate(self, data: pd.DataFrame, config: dict, data_key: str) -> pd.DataFrame:
+        """Generates the features of a dataset, loading the stored ones.
+
+        Args:
+            data: The input dataset.
+            config: The feature generation configuration.
+            data_key: The key of the dataset, see `dataset_key`.
+
+        Returns:
+            The dataset with the generated features, as `generate_features.generate_features`.
+        """
+        keys = feature_keys(config)
+        known = {}
+        for name, key in keys.items():
+            values = self.get(data_key, key, len(data))
+            if values is not None:
+                known[name] = values
+        features = gf.generate_features(data, config, known)
+        self.loaded = [name for name in keys if name in known]
+        self.computed = [name for name in keys if name not in known]
+        for name in self.computed:
+            self.put(data_key, keys[name], name, features[name].to_numpy())
+        logger.info("Features loaded from the store: %s; computed: %s", self.loaded, self.computed)
+        return features
@@ -1,7 +1,11 @@
+import collections
 import logging
+from typing import Iterable, Mapping, NamedTuple, Optional
 import pandas as pd
 import numpy as np
 
+import src.artifact_io as aio
+
 
 # Set up the logger
 logger = logging.getLogger(__name__)
@@ -20,7 +24,7 @@ def log_transform(data: pd.DataFrame, log_transform_config: dict) -> pd.DataFram
     """
     try:
         for new_feature, col in log_transform_config.items():
-            data[new_feature] = data[col].apply(np.log)
+            data[new_feature] = np.log(data[col])
         logger.debug("Feature log transformation(s) finished")
     except KeyError as e:
         logger.error("Wrong column name for the data: %s", e)
@@ -107,24 +111,219 @@ def calculate_norm_range(data: pd.DataFrame, norm_range_config: dict) -> pd.Data
     return data
 
 
-def generate_features(data: pd.DataFrame, config: dict) -> pd.DataFrame:
+class FeaturePlan(NamedTuple):
+    """
+    An ordered, deduplicated expression DAG computing all configured features.
+
+    Slots index the columns the plan works on: source columns come first, then the
+    generated features in output order, then intermediate results.
+
+    Attributes:
+        sources: The input columns read from the dataset.
+        outputs: The names of the generated features, in output order.
+        steps: The (operation, target slot, argument slots) triples to run in order.
+        n_intermediate: The number of slots holding intermediate results.
+    """
+    sources: list[str]
+    outputs: list[str]
+    steps: list[tuple[str, int, tuple[int, ...]]]
+    n_intermediate: int
+
+
+_OPERATIONS = {
+    "log": np.log,
+    "multiply": np.multiply,
+    "subtract": np.subtract,
+    "divide": np.divide,
+    "copy": np.positive,
+}
+
+
+def compile_plan(config: dict) -> FeaturePlan:
+    """
+    Compile the feature generation configuration into an execution plan.
+
+    Features are compiled in the order log_transform, multiply, calculate_range and
+    calculate_norm_range, and may refer to features defined before them. Identical
+    subexpressions, such as a range shared by a range and a normalized range feature,
+    are only computed once.
+
+    Args:
+        config (dict): A dictionary containing the feature generation configuration.
+
+    Returns:
+        FeaturePlan: The plan computing every configured feature.
+
+    Raises:
+        KeyError: If a feature entry is missing one of its column keys.
+    """
+    nodes: dict[tuple, int] = {}
+    expressions: list[tuple] = []
+    features: dict[str, int] = {}
+
+    def node(*expression) -> int:
+        if expression not in nodes:
+            nodes[expression] = len(expressions)
+            expressions.append(expression)
+        return nodes[expression]
+
+    def column(name: str) -> int:
+        return features[name] if name in features else node("column", name)
+
+    for feature, col in config.get("log_transform", {}).items():
+        features[feature] = node("log", column(col))
+    for feature, cols in config.get("multiply", {}).items():
+        features[feature] = node("multiply", column(cols["col_a"]), column(cols["col_b"]))
+    for feature, cols in config.get("calculate_range", {}).items():
+        features[feature] = node("subtract", column(cols["max_col"]), column(cols["min_col"]))
+    for feature, cols in config.get("calculate_norm_range", {}).items():
+        feature_range = node("subtract", column(cols["max_col"]), column(cols["min_col"]))
+        features[feature] = node("divide", feature_range, column(cols["mean_col"]))
+
+    # Lay out slots: sources, then features in output order, then intermediates
+    sources = [i for i, expression in enumerate(expressions) if expression[0] == "column"]
+    outputs = list(features)
+    slots = {i: slot for slot, i in enumerate(sources)}
+    copies = []
+    for slot, feature in enumerate(outputs, start=len(sources)):
+        if features[feature] in slots:
+            # A feature equal to a source or to an earlier feature is copied into its own slot
+            copies.append(("copy", slot, (slots[features[feature]],)))
+        else:
+            slots[features[feature]] = slot
+    n_intermediate = 0
+    for i in range(len(expressions)):
+        if i not in slots:
+            slots[i] = len(sources) + len(outputs) + n_intermediate
+            n_intermediate += 1
+
+    steps = [
+        (expression[0], slots[i], tuple(slots[arg] for arg in expression[1:]))
+        for i, expression in enumerate(expressions)
+        if expression[0] != "column"
+    ]
+    return FeaturePlan(
+        sources=[expressions[i][1] for i in sources],
+        outputs=outputs,
+        steps=steps + copies,
+        n_intermediate=n_intermediate,
+    )
+
+
+def compute_features(columns: Mapping[str, np.ndarray], plan: FeaturePlan, n_rows: int) -> np.ndarray:
+    """
+    Compute the features of a plan into one array.
+
+    Source columns are gathered into one contiguous work array, every step runs as a
+    single vectorized NumPy operation, and all generated features are written into one
+    preallocated array. The work array is float64; the generated features take the
+    float type of the source columns, so float32 sources give float32 features that are
+    computed in double precision and rounded once.
+
+    Args:
+        columns (Mapping[str, np.ndarray]): The source columns, e.g. a DataFrame or a dict of arrays.
+        plan (FeaturePlan): The compiled feature plan.
+        n_rows (int): The number of rows of the source columns.
+
+    Returns:
+        np.ndarray: A (rows x generated features) array, in the order of `plan.outputs`.
+
+    Raises:
+        KeyError: If a source column of the plan is missing.
+    """
+    n_sources = len(plan.sources)
+    dtype = np.result_type(np.float32, *(np.asarray(columns[col]).dtype for col in plan.sources))
+    work = np.empty((n_rows, n_sources + plan.n_intermediate), order="F")
+    generated = np.empty((n_rows, len(plan.outputs)), dtype=dtype, order="F")
+    slots = ([work[:, i] for i in range(n_sources)]
+             + [generated[:, i] for i in range(len(plan.outputs))]
+             + [work[:, n_sources + i] for i in range(plan.n_intermediate)])
+
+    for slot, col in zip(slots, plan.sources):
+        slot[:] = np.asarray(columns[col])
+    for operation, target, args in plan.steps:
+        _OPERATIONS[operation](*(slots[arg] for arg in args), out=slots[target])
+    return generated
+
+
+def execute_plan(data: pd.DataFrame, plan: FeaturePlan) -> pd.DataFrame:
+    """
+    Compute the features of a plan and append them to the dataset.
+
+    All generated features are computed into one preallocated array that becomes the
+    new columns of the output frame.
+
+    Args:
+        data (pd.DataFrame): The input dataset.
+        plan (FeaturePlan): The compiled feature plan.
+
+    Returns:
+        pd.DataFrame: A new dataset with the generated features appended.
+
+    Raises:
+        KeyError: If a source column of the plan is missing from the dataset.
+    """
+    generated = compute_features(data, plan, len(data))
+    features = pd.DataFrame(generated, columns=plan.outputs, index=data.index, copy=False)
+    # Regenerated features replace existing columns of the same name
+    data = data.drop(columns=[col for col in plan.outputs if col in data.columns])
+    return pd.concat([data, features], axis=1)
+
+
+def restrict_config(config: dict, features: Iterable[str]) -> dict:
+    """
+    Keep only some features of a feature generation configuration.
+
+    Args:
+        config (dict): A dictionary containing the feature generation configuration.
+        features (Iterable[str]): The names of the features to keep.
+
+    Returns:
+        dict: The configuration of the kept features.
+    """
+    features = set(features)
+    restricted = {kind: {name: entry for name, entry in entries.items() if name in features}
+                  for kind, entries in config.items()}
+    return {kind: entries for kind, entries in restricted.items() if entries}
+
+
+def generate_features(data: pd.DataFrame, config: dict,
+                      known: Optional[Mapping[str, np.ndarray]] = None) -> pd.DataFrame:
     """
     Generates features for a dataset using a configuration dictionary.
 
     Args:
         data (pd.DataFrame): The input dataset.
         config (dict): A dictionary containing the feature generation configuration.
+        known (Mapping[str, np.ndarray], optional): Values of configured features that
+            were already computed, e.g. loaded from a feature store; only the other
+            features are computed.
 
     Returns:
         pd.DataFrame: The processed dataset with the new features and the target variable.
     """
     try:
-        data = log_transform(data, config["log_transform"])
-        data = multiply(data, config["multiply"])
-        data = calculate_range(data, config["calculate_range"])
-        data = calculate_norm_range(data, config["calculate_norm_range"])
+        plan = compile_plan(config)
+        logger.debug(
+            "Feature plan compiled: %d features from %d columns in %d steps",
+            len(plan.outputs), len(plan.sources), len(plan.steps),
+        )
+        known = {name: values for name, values in (known or {}).items() if name in plan.outputs}
+        if not known:
+            data = execute_plan(data, plan)
+        else:
+            # Compute the missing features only; they may refer to known features
+            missing = compile_plan(restrict_config(config, set(plan.outputs) - set(known)))
+            generated = compute_features(collections.ChainMap(known, data), missing, len(data))
+            columns = {**known, **{name: generated[:, i] for i, name in enumerate(missing.outputs)}}
+            features = pd.DataFrame({name: columns[name] for name in plan.outputs}, index=data.index, copy=False)
+            data = data.drop(columns=[col for col in plan.outputs if col in data.columns])
+            data = pd.concat([data, features], axis=1)
 
         logger.info("Features generated successfully.")
+    except KeyError as e:
+        logger.error("Wrong column name for the data: %s", e)
+        raise
     except Exception as e:
         logger.error("Error while generating features: %s", e)
         raise
@@ -132,17 +331,18 @@ def generate_features(data: pd.DataFrame, config: dict) -> pd.DataFrame:
     return data
 
 
-def save_dataset(data: pd.DataFrame, save_data_path: str):
+def save_dataset(data: pd.DataFrame, save_data_path: str, fmt: str = "csv"):
     """
-    Save the dataset to a CSV file.
+    Save the dataset to disk.
 
     Args:
         data: A pandas DataFrame containing the dataset.
-        save_data_path: The path where the CSV file should be saved.
+        save_data_path: The path where the dataset should be saved.
+        fmt: The artifact format, one of `artifact_io.FORMATS`.
     """
 
     try:
-        data.to_csv(save_data_path, index=False)
+        aio.save_frame(data, save_data_path, fmt)
         logger.info("Dataset saved successfully at %s", save_data_path)
     except FileNotFoundError as e:
         logger.error("Error while saving the dataset: %s", e)
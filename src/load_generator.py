@@ -0,0 +1,91 @@
+import http.client
+import json
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+def run_load(url: str, rows: pd.DataFrame, requests: int = 1000, concurrency: int = 16,
+             rows_per_request: int = 1, timeout: float = 30.0) -> dict:
+    """Sends scoring requests from concurrent clients and measures latency and throughput.
+
+    Args:
+        url: The URL of the scoring endpoint, e.g. http://127.0.0.1:8080/score.
+        rows: The rows requests are drawn from, cycling through them in order.
+        requests: The total number of requests to send.
+        concurrency: The number of clients sending requests at the same time.
+        rows_per_request: The number of rows in each request.
+        timeout: The number of seconds to wait for each response.
+
+    Returns:
+        A dictionary with the number of requests, errors, throughput in requests and rows
+        per second, and latency percentiles in milliseconds.
+    """
+    records = rows.to_dict(orient="records")
+    bodies = [
+        json.dumps({"rows": [records[(i * rows_per_request + j) % len(records)]
+                             for j in range(rows_per_request)]}).encode()
+        for i in range(min(requests, len(records)))
+    ]
+    target = urlsplit(url)
+    latencies = np.full(requests, np.nan)
+    errors = []
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def client():
+        # Each client keeps one persistent connection, like a long-lived service caller
+        connection = http.client.HTTPConnection(target.hostname, target.port, timeout=timeout)
+        try:
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                start = time.perf_counter()
+                try:
+                    connection.request("POST", target.path, body=bodies[i % len(bodies)],
+                                       headers={"Content-Type": "application/json"})
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        raise http.client.HTTPException(f"HTTP {response.status}")
+                    latencies[i] = time.perf_counter() - start
+                except (http.client.HTTPException, OSError) as e:
+                    errors.append(str(e))
+                    connection.close()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    completed = latencies[~np.isnan(latencies)] * 1000
+    if errors:
+        logger.warning("%d of %d requests failed, e.g. %s", len(errors), requests, errors[0])
+    results = {
+        "requests": requests,
+        "errors": len(errors),
+        "concurrency": concurrency,
+        "rows_per_request": rows_per_request,
+        "throughput_requests_per_s": len(completed) / elapsed,
+        "throughput_rows_per_s": len(completed) * rows_per_request / elapsed,
+    }
+    for percentile in (50, 90, 99):
+        results[f"p{percentile}_ms"] = (
+            float(np.percentile(completed, percentile)) if len(completed) else None
+        )
+    logger.info("Load test results: %s", results)
+    return results
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import logging
+import pickle
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+# File or directory name of the trained model in a run directory, per storage format
+MODEL_FILES = {"pickle": "trained_model_object.pkl", "mapped": "trained_model"}
+
+# Arrays describing a forest; node arrays of all trees are concatenated
+FOREST_ARRAYS = ("roots", "depths", "children", "feature", "threshold", "missing_left", "proba")
+STORE_VERSION = 1
+
+
+def model_path(directory: Path, fmt: str = "pickle") -> Path:
+    """Builds the path of the trained model in the given storage format.
+
+    Args:
+        directory: The directory holding the model.
+        fmt: The storage format, one of MODEL_FILES.
+
+    Returns:
+        The path of the model.
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+    if fmt not in MODEL_FILES:
+        raise ValueError(f"Unsupported model format {fmt}; expected one of {list(MODEL_FILES)}")
+    return Path(directory) / MODEL_FILES[fmt]
+
+
+def fingerprint_frame(data: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> str:
+    """Computes a content hash of a DataFrame, independent of its index.
+
+    Args:
+        data: The DataFrame to fingerprint, e.g. the training data of a model, or its
+            consecutive chunks of rows; both give the same hash.
+
+    Returns:
+        The hex-encoded sha256 of the column names and row hashes.
+    """
+    digest = None
+    for chunk in [data] if isinstance(data, pd.DataFrame) else data:
+        if digest is None:
+            digest = hashlib.sha256(json.dumps([str(col) for col in chunk.columns]).encode())
+        digest.update(pd.util.hash_pandas_object(chunk, index=False).to_numpy().tobytes())
+    return (digest or hashlib.sha256(b"[]")).hexdigest()
+
+
+def save_forest(model, directory: Path, fingerprint: Optional[str] = None,
+                compress: bool = False) -> None:
+    """Saves a fitted random forest as flat node arrays with a metadata header.
+
+    The nodes of all trees are concatenated into one array per attribute with global
+    child indices, laid out for branch-free traversal: `children[2 * node + go_left]`
+    is the next node, and leaves point to themselves with an infinite threshold.
+    Missing feature values follow `missing_left`, as in scikit-learn.
+    Leaves store class probabilities, normalized as by
+    `DecisionTreeClassifier.predict_proba`. Uncompressed arrays are written as .npy
+    files that `MappedForest` memory-maps; compressed arrays go into one `forest.npz`,
+    which is smaller but read into memory.
+
+    Args:
+        model: A fitted RandomForestClassifier or ExtraTreesClassifier.
+        directory: The directory to write the model to.
+        fingerprint: A fingerprint of the training data, see `fingerprint_frame`.
+        compress: Whether to compress the arrays.
+
+    Raises:
+        ValueError: If the model is not a fitted single-output forest classifier.
+    """
+    estimators = getattr(model, "estimators_", None)
+    if not estimators or getattr(model, "n_outputs_", 1) != 1 or not hasattr(model, "classes_"):
+        raise ValueError(f"Cannot store {type(model).__name__}; expected a fitted single-output forest classifier")
+
+    roots, depths, children, feature, threshold, missing_left, proba = [], [], [], [], [], [], []
+    offset = 0
+    for tree in (estimator.tree_ for estimator in estimators):
+        roots.append(offset)
+        depths.append(tree.max_depth)
+        is_leaf = tree.children_left == -1
+        nodes = np.arange(tree.node_count) + offset
+        pairs = np.empty((tree.node_count, 2), dtype=np.int64)
+        pairs[:, 0] = np.where(is_leaf, nodes, tree.children_right + offset)
+        pairs[:, 1] = np.where(is_leaf, nodes, tree.children_left + offset)
+        children.append(pairs.ravel())
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        missing_left.append(np.where(is_leaf, True, getattr(tree, "missing_go_to_left", 0) != 0))
+        value = tree.value[:, 0, : model.n_classes_].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba.append(value / normalizer)
+        offset += tree.node_count
+    if 2 * offset > np.iinfo(np.int32).max:
+        raise ValueError(f"Cannot store a forest of {offset} nodes")
+    arrays = {
+        "roots": np.array(roots, dtype=np.int32),
+        "depths": np.array(depths, dtype=np.int32),
+        "children": np.concatenate(children).astype(np.int32),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "missing_left": np.concatenate(missing_left).astype(bool),
+        "proba": np.concatenate(proba),
+    }
+
+    features = getattr(model, "feature_names_in_", None)
+    meta = {
+        "version": STORE_VERSION,
+        "model": type(model).__name__,
+        "params": model.get_params(),
+        "features": None if features is None else [str(col) for col in features],
+        "n_features": int(model.n_features_in_),
+        "classes": model.classes_.tolist(),
+        "n_trees": len(estimators),
+        "n_nodes": offset,
+        "data_fingerprint": fingerprint,
+        "compressed": compress,
+    }
+
+    try:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        if compress:
+            np.savez_compressed(directory / "forest.npz", **arrays)
+        else:
+            for name, array in arrays.items():
+                np.save(directory / f"{name}.npy", array)
+        with open(directory / "meta.json", "w") as f:
+            json.dump(meta, f, indent=2, default=str)
+        logger.info("Forest of %d trees (%d nodes) saved at %s", len(estimators), offset, directory)
+    except OSError as e:
+        logger.error("Error while saving the forest: %s", e)
+        raise
+
+
+class MappedForest:
+    """A random forest evaluated directly from the arrays written by `save_forest`.
+
+    Only the metadata is read when the model is opened; the node arrays are
+    memory-mapped on first use, so processes scoring with the same stored model share
+    one copy of it in the page cache. Predictions are identical to the forest that
+    was saved.
+
+    Attributes:
+        directory: The directory holding the stored forest.
+        meta: The metadata header of the stored forest.
+        classes_: The class labels.
+        n_classes_: The number of classes.
+        n_features_in_: The number of input features.
+        feature_names_in_: The names of the input features, if the forest was fit on a DataFrame.
+    """
+
+    # (row, tree) pairs evaluated at once, bounding the temporary arrays of the traversal
+    chunk_size = 1 << 16
+    # Number of tree levels after which pairs that reached a leaf are set aside
+    compact_every = 8
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        with open(self.directory / "meta.json") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported model store version {self.meta.get('version')} in {directory}")
+        self.classes_ = np.array(self.meta["classes"])
+        self.n_classes_ = len(self.classes_)
+        self.n_features_in_ = self.meta["n_features"]
+        if self.meta["features"] is not None:
+            self.feature_names_in_ = np.array(self.meta["features"], dtype=object)
+        self._arrays: Optional[dict] = None
+
+    @property
+    def arrays(self) -> dict:
+        """The node arrays of the forest, memory-mapped when stored uncompressed."""
+        if self._arrays is None:
+            if self.meta["compressed"]:
+                with np.load(self.directory / "forest.npz") as npz:
+                    self._arrays = {name: npz[name] for name in FOREST_ARRAYS}
+            else:
+                # Plain array views of the maps avoid the np.memmap overhead on every operation
+                self._arrays = {
+                    name: np.asarray(np.load(self.directory / f"{name}.npy", mmap_mode="r"))
+                    for name in FOREST_ARRAYS
+                }
+        return self._arrays
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Computes class probabilities, averaged over the trees in their stored order.
+
+        Args:
+            X: The model features; DataFrame columns are matched to the training features by name.
+
+        Returns:
+            The (rows x classes) probabilities.
+        """
+        if isinstance(X, pd.DataFrame) and self.meta["features"] is not None:
+            X = X[self.meta["features"]]
+        # Trees compare float32 features with float64 thresholds, as in scikit-learn
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        proba = np.zeros((len(X), self.n_classes_))
+        step = max(self.chunk_size // self.meta["n_trees"], 1)
+        for start in range(0, len(X), step):
+            leaves = self._apply(X[start : start + step])
+            out = proba[start : start + step]
+            # Summed tree by tree, in the same order as scikit-learn
+            for t in range(leaves.shape[1]):
+                out += np.take(self.arrays["proba"], leaves[:, t], axis=0)
+        proba /= self.meta["n_trees"]
+        return proba
+
+    def _apply(self, X: np.ndarray) -> np.ndarray:
+        """Finds the leaf reached by each row in each tree, walking all trees at once."""
+        arrays = self.arrays
+        children, feature, threshold = arrays["children"], arrays["feature"], arrays["threshold"]
+        n_trees = len(arrays["roots"])
+        values = X.ravel()
+        has_missing = np.isnan(values).any()
+        row_offsets = np.repeat(np.arange(len(X), dtype=np.int32) * X.shape[1], n_trees)
+        depth = int(arrays["depths"].max(initial=0))
+        leaves = np.tile(arrays["roots"], len(X))
+        active, nodes, offsets = None, leaves, row_offsets
+        for level in range(1, depth + 1):
+            x = np.take(values, offsets + np.take(feature, nodes))
+            go_left = x <= np.take(threshold, nodes)
+            if has_missing:
+                go_left |= np.isnan(x) & np.take(arrays["missing_left"], nodes)
+            nodes = np.take(children, 2 * nodes + go_left)
+            if level % self.compact_every == 0 and level < depth:
+                # Stop walking the (row, tree) pairs that already reached a leaf
+                if active is None:
+                    leaves, active = nodes, np.arange(len(nodes))
+                else:
+                    leaves[active] = nodes
+                unfinished = np.take(children, 2 * nodes) != nodes
+                active, nodes = active[unfinished], nodes[unfinished]
+                offsets = row_offsets[active]
+        if active is None:
+            leaves = nodes
+        else:
+            leaves[active] = nodes
+        return leaves.reshape(len(X), n_trees)
+
+    def predict(self, X) -> np.ndarray:
+        """Predicts the most probable class of each row.
+
+        Args:
+            X: The model features.
+
+        Returns:
+            The predicted class labels.
+        """
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def load_model(path: Path):
+    """Loads a trained model saved either as a pickle or with `save_forest`.
+
+    Stored forests are opened lazily as a `MappedForest`.
+
+    Args:
+        path: The path of the pickle file or stored forest directory.
+
+    Returns:
+        The trained model object.
+    """
+    path = Path(path)
+    start = time.perf_counter()
+    try:
+        if path.is_dir():
+            model = MappedForest(path)
+        else:
+            with open(path, "rb") as f:
+                model = pickle.load(f)
+    except FileNotFoundError as e:
+        logger.error("Error while loading the model: %s", e)
+        raise
+    logger.debug("Model loaded from %s in %.3f s", path, time.perf_counter() - start)
+    return model
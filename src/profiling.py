@@ -0,0 +1,203 @@
+import contextlib
+import cProfile
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILE = "profile.json"
+
+# /proc/self/status reports kB; getrusage reports bytes on macOS and kB elsewhere
+_RUSAGE_UNIT = 1 if sys.platform == "darwin" else 1024
+MB = 1024 * 1024
+
+
+def _peak_rss() -> Optional[int]:
+    """Returns the peak resident set size of this process in bytes, if available."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RUSAGE_UNIT
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """Resets the peak resident set size on Linux, so that it covers the next stage only."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _children_cpu_time() -> float:
+    """Returns the CPU time of terminated child processes, e.g. worker pools, in seconds."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class StageProfiler:
+    """Records the time and memory used by each pipeline stage.
+
+    For every stage it records the wall time, the CPU time of the pipeline process
+    and of worker processes that finished during the stage, the peak resident set
+    size, and the rows processed per second when the stage reports its row count.
+    On Linux the peak resident set size is reset at the start of each stage; elsewhere
+    it is the peak of the process so far. With `trace_memory`, the peak of Python
+    allocations traced by `tracemalloc` is recorded as well, at a cost in speed. With
+    `cprofile`, a cProfile dump of each stage is written to `profiles/<stage>.prof`.
+
+    Stages may run concurrently in threads. The CPU time and memory peaks are measured
+    for the whole process, so a stage that overlapped others lists them in
+    `concurrent_with`, and its peaks are shared with them.
+
+    Attributes:
+        output_dir: The directory that profile.json and the cProfile dumps are written to.
+        enabled: Whether stages are profiled at all.
+        cprofile: Whether a cProfile dump is written for each stage.
+        trace_memory: Whether Python allocations are traced with tracemalloc.
+        stages: Mapping of stage name to its record, in the order the stages ran.
+    """
+
+    def __init__(self, output_dir: Path, enabled: bool = True, cprofile: bool = False,
+                 trace_memory: bool = False):
+        self.output_dir = Path(output_dir)
+        self.enabled = enabled
+        self.cprofile = cprofile
+        self.trace_memory = trace_memory
+        self.stages: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        # perf_counter at the start of the first stage and the end of the last one
+        self._span: list[Optional[float]] = [None, None]
+        self._overlaps: dict[str, set] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[dict]:
+        """Profiles the code run in the context as one stage.
+
+        Args:
+            name: The name of the stage.
+
+        Yields:
+            The record of the stage; set its "rows" entry to the number of rows the
+            stage processed to have rows per second computed.
+        """
+        record: dict = {"rows": None}
+        if not self.enabled:
+            yield record
+            return
+
+        with self._lock:
+            # Peaks are only reset when no other stage is measuring them
+            alone = not self._overlaps
+            for others in self._overlaps.values():
+                others.add(name)
+            self._overlaps[name] = set(self._overlaps)
+            peak_reset = alone and _reset_peak_rss()
+            started_tracing = False
+            if self.trace_memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    started_tracing = True
+                if alone:
+                    tracemalloc.reset_peak()
+        profiler = cProfile.Profile() if self.cprofile else None
+        children_cpu = _children_cpu_time()
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        with self._lock:
+            if self._span[0] is None:
+                self._span[0] = wall
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Python 3.12+ allows one profiler at a time across threads
+                logger.warning("Not profiling stage %s with cProfile: %s", name, e)
+                profiler = None
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            end = time.perf_counter()
+            wall = end - wall
+            with self._lock:
+                self._span[1] = max(end, self._span[1] or end)
+                overlaps = self._overlaps.pop(name)
+                last = not self._overlaps
+            record.update(
+                wall_seconds=wall,
+                cpu_seconds=time.process_time() - cpu,
+                children_cpu_seconds=_children_cpu_time() - children_cpu,
+            )
+            peak = _peak_rss()
+            record["peak_rss_mb"] = None if peak is None else peak / MB
+            record["peak_rss_scope"] = "process" if not peak_reset else "shared" if overlaps else "stage"
+            record["concurrent_with"] = sorted(overlaps)
+            if self.trace_memory:
+                record["tracemalloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / MB
+                if started_tracing and last:
+                    tracemalloc.stop()
+            rows = record.get("rows")
+            record["rows_per_second"] = rows / wall if rows and wall > 0 else None
+            if profiler is not None:
+                profiles = self.output_dir / "profiles"
+                profiles.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(profiles / f"{name}.prof")
+                record["cprofile"] = str(Path("profiles") / f"{name}.prof")
+            with self._lock:
+                self.stages[name] = record
+            logger.info("Stage %s took %.2f s wall, %.2f s CPU, peak RSS %s MB", name, wall,
+                        record["cpu_seconds"] + record["children_cpu_seconds"],
+                        "n/a" if peak is None else f"{peak / MB:.0f}")
+
+    def save(self, path: Optional[Path] = None) -> Optional[Path]:
+        """Writes the records of all stages as JSON.
+
+        `wall_seconds` is the elapsed time from the start of the first stage to the end
+        of the last one. Stages may overlap, so it can be less than `stage_seconds_sum`,
+        the sum of the wall times of all stages.
+
+        Args:
+            path: The file to write; defaults to profile.json in the output directory.
+
+        Returns:
+            The path written, or None when profiling is disabled.
+        """
+        if not self.enabled:
+            return None
+        path = Path(path) if path is not None else self.output_dir / PROFILE_FILE
+        profile = {
+            "wall_seconds": (self._span[1] - self._span[0]) if self._span[0] is not None else 0.0,
+            "stage_seconds_sum": sum(record["wall_seconds"] for record in self.stages.values()),
+            "stages": self.stages,
+        }
+        try:
+            with open(path, "w") as f:
+                json.dump(profile, f, indent=2)
+            logger.info("Stage profile saved at %s", path)
+        except OSError as e:
+            logger.error("Error while saving the stage profile: %s", e)
+            raise
+        return path
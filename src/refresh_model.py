@@ -0,0 +1,122 @@
+import datetime
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import src.model_store as ms
+
+
+logger = logging.getLogger(__name__)
+
+LINEAGE_FILE = "lineage.json"
+
+
+def load_lineage(model_dir: Path, train: pd.DataFrame = None) -> dict:
+    """Loads the training history of the model in a run or refresh directory.
+
+    Directories written by a refresh record their lineage; for a pipeline run, the
+    lineage starts from the fingerprint of its training data.
+
+    Args:
+        model_dir: The run or refresh directory holding the model.
+        train: The training data of a pipeline run, used when no lineage is recorded.
+
+    Returns:
+        A dictionary with the model version and the fingerprints of the data batches
+        the model was trained on, oldest first.
+    """
+    path = Path(model_dir) / LINEAGE_FILE
+    if path.exists():
+        with open(path) as f:
+            return json.load(f)
+    if train is None:
+        raise FileNotFoundError(f"No {LINEAGE_FILE} in {model_dir} and no training data to start one")
+    return {"version": 1, "parent": None, "fingerprints": [ms.fingerprint_frame(train)],
+            "rows": [len(train)]}
+
+
+def save_lineage(lineage: dict, model_dir: Path) -> None:
+    """Writes the training history of a refreshed model.
+
+    Args:
+        lineage: The lineage, as returned by `refresh_model`.
+        model_dir: The directory holding the refreshed model.
+    """
+    with open(Path(model_dir) / LINEAGE_FILE, "w") as f:
+        json.dump(lineage, f, indent=2)
+    logger.info("Model version %d lineage saved in %s", lineage["version"], model_dir)
+
+
+def refresh_model(model, data: pd.DataFrame, config: dict, lineage: dict) -> tuple:
+    """Adds trees trained on a new batch of data to a fitted random forest.
+
+    The existing trees are kept as they are and `n_new_trees` trees are grown on the
+    new rows only, through `warm_start`, so a refresh costs time in proportion to the
+    new data. With mode `replace`, the same number of oldest trees is dropped; with
+    `max_trees` set, the oldest trees beyond that number are dropped.
+
+    Args:
+        model: The fitted RandomForestClassifier; it is updated in place.
+        data: The new rows, with the model features and the target.
+        config: The refresh_model configuration (n_new_trees, mode, max_trees), with the
+            target and initial_features of train_model.
+        lineage: The lineage of the model, see `load_lineage`.
+
+    Returns:
+        The refreshed model and its new lineage, without its parent directory.
+
+    Raises:
+        ValueError: If the model cannot be warm-started, the batch was already used
+            or does not contain every class of the model.
+    """
+    try:
+        target = config["target"]
+        initial_features = config["initial_features"]
+        n_new_trees = config.get("n_new_trees", 10)
+        mode = config.get("mode", "append")
+        if mode not in ("append", "replace"):
+            raise ValueError(f"Unknown refresh mode {mode}; expected append or replace")
+        if not hasattr(model, "estimators_"):
+            raise ValueError(f"Cannot refresh {type(model).__name__}; expected a pickled fitted forest")
+
+        fingerprint = ms.fingerprint_frame(data)
+        if fingerprint in lineage["fingerprints"]:
+            raise ValueError("The model was already trained on this batch of data")
+        # New trees learn the classes from the batch; it must match the existing trees
+        classes = np.unique(data[target])
+        if not np.array_equal(classes, model.classes_):
+            raise ValueError(f"The new data has classes {classes.tolist()}, expected {model.classes_.tolist()}")
+
+        n_trees = len(model.estimators_)
+        model.set_params(warm_start=True, n_estimators=n_trees + n_new_trees)
+        model.fit(data[initial_features], data[target])
+        model.set_params(warm_start=False)
+
+        removed = n_new_trees if mode == "replace" else 0
+        if config.get("max_trees"):
+            removed = max(removed, len(model.estimators_) - config["max_trees"])
+        if removed:
+            model.estimators_ = model.estimators_[removed:]
+            model.set_params(n_estimators=len(model.estimators_))
+        logger.info("Added %d trees trained on %d new rows and removed %d oldest trees; %d trees in total",
+                    n_new_trees, len(data), removed, len(model.estimators_))
+    except KeyError as e:
+        logger.error("Missing key in the configuration: %s", e)
+        raise
+    except ValueError as e:
+        logger.error("Cannot refresh the model: %s", e)
+        raise
+
+    new_lineage = {
+        "version": lineage["version"] + 1,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "fingerprints": lineage["fingerprints"] + [fingerprint],
+        "rows": lineage.get("rows", []) + [len(data)],
+        "trees_added": n_new_trees,
+        "trees_removed": removed,
+        "n_trees": len(model.estimators_),
+    }
+    return model, new_lineage
@@ -1,15 +1,51 @@
 import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
 import pandas as pd
 
+import src.artifact_io as aio
+import src.model_store as ms
+
 
 # Set up the logger
 logger = logging.getLogger(__name__)
 
+# Model loaded once by each scoring worker process
+_worker_model = None
+
+
+def predict_binary(proba: np.ndarray, classes: np.ndarray, threshold: float = 0.5) -> np.ndarray:
+    """Derives class labels from predicted probabilities.
+
+    For two classes the second class is predicted when its probability exceeds the
+    threshold, which at 0.5 gives the same labels as `model.predict`; with more
+    classes the most probable class is predicted.
+
+    Args:
+        proba: The (rows x classes) predicted probabilities.
+        classes: The class labels, in the column order of `proba`.
+        threshold: The probability of the second class above which it is predicted.
+
+    Returns:
+        The predicted label of each row.
+    """
+    if len(classes) == 2:
+        return classes[(proba[:, 1] > threshold).astype(int)]
+    return classes[np.argmax(proba, axis=1)]
+
 
 def score_model(test: pd.DataFrame, model, config: dict) -> pd.DataFrame:
     """
     Scores the model using the test dataset and the provided configuration.
 
+    The forest is evaluated once; the binary prediction is derived from the predicted
+    probability with the configured threshold.
+
     Args:
         test: A DataFrame containing the test dataset.
         model: The trained model object.
@@ -22,10 +58,10 @@ def score_model(test: pd.DataFrame, model, config: dict) -> pd.DataFrame:
     try:
         initial_features = config["initial_features"]
 
-        ypred_proba_test = model.predict_proba(test[initial_features])[:, 1]
-        ypred_bin_test = model.predict(test[initial_features])
+        proba = model.predict_proba(test[initial_features])
+        ypred_bin_test = predict_binary(proba, model.classes_, config.get("threshold", 0.5))
 
-        scores = pd.DataFrame({"predicted_probability": ypred_proba_test,
+        scores = pd.DataFrame({"predicted_probability": proba[:, 1],
                                "predicted_binary": ypred_bin_test})
         logger.info("Model scored successfully.")
         return scores
@@ -37,17 +73,78 @@ def score_model(test: pd.DataFrame, model, config: dict) -> pd.DataFrame:
         raise
 
 
-def save_scores(scores: pd.DataFrame, file_path: str):
+def _init_worker(model_path: Path) -> None:
+    global _worker_model  # pylint: disable=global-statement
+    _worker_model = ms.load_model(model_path)
+
+
+def _score_chunk(chunk: pd.DataFrame, config: dict) -> pd.DataFrame:
+    return score_model(chunk, _worker_model, config)
+
+
+def score_file(input_path: Path, model_path: Path, output_path: Path, config: dict,
+               fmt: str = "csv", processes: Optional[int] = None) -> int:
+    """Scores a dataset artifact in fixed-size chunks and writes the scores incrementally.
+
+    Only the model features are read, `config["chunksize"]` rows at a time, so memory
+    use is bounded by the chunk size rather than the size of the dataset. With more
+    than one process, chunks are scored in worker processes that each load the model
+    once (a model stored with `model_store.save_forest` is memory-mapped and shared
+    by all workers); at most two chunks per worker are in flight and scores are
+    written in input order.
+
+    Args:
+        input_path: The path of the dataset artifact to score.
+        model_path: The path to the trained model, see `model_store.load_model`.
+        output_path: The path of the scores artifact.
+        config: A dictionary containing the configuration parameters for scoring.
+        fmt: The artifact format of the scores, one of `artifact_io.FORMATS`.
+        processes: The number of worker processes; `config["processes"]` if None.
+
+    Returns:
+        The number of rows scored.
+    """
+    chunksize = config.get("chunksize") or 100_000
+    processes = processes or config.get("processes", 1)
+    try:
+        n_rows = aio.count_rows(input_path) if fmt == "npy" else None
+        chunks = aio.iter_frame_chunks(input_path, chunksize, config["initial_features"])
+        with aio.FrameWriter(output_path, fmt, n_rows) as writer:
+            if processes <= 1:
+                model = ms.load_model(model_path)
+                for chunk in chunks:
+                    writer.write(score_model(chunk, model, config))
+            else:
+                with ProcessPoolExecutor(
+                    processes, multiprocessing.get_context("spawn"), _init_worker, (model_path,)
+                ) as pool:
+                    pending: deque = deque()
+                    for chunk in chunks:
+                        pending.append(pool.submit(_score_chunk, chunk, config))
+                        if len(pending) >= 2 * processes:
+                            writer.write(pending.popleft().result())
+                    while pending:
+                        writer.write(pending.popleft().result())
+        logger.info("Scored %d rows from %s in chunks of %d with %d process(es); scores saved at %s",
+                    writer.rows_written, input_path, chunksize, processes, output_path)
+        return writer.rows_written
+    except (FileNotFoundError, KeyError) as e:
+        logger.error("Error while scoring %s: %s", input_path, e)
+        raise
+
+
+def save_scores(scores: pd.DataFrame, file_path: str, fmt: str = "csv"):
     """
-    Save the scores DataFrame to a CSV file.
+    Save the scores DataFrame to disk.
 
     Args:
         scores: A DataFrame containing the predicted probabilities and binary predictions.
-        file_path: The path where the CSV file should be saved.
+        file_path: The path where the scores should be saved.
+        fmt: The artifact format, one of `artifact_io.FORMATS`.
     """
 
     try:
-        scores.to_csv(file_path, index=False)
+        aio.save_frame(scores, file_path, fmt)
         logger.info("Scores saved successfully at %s", file_path)
     except FileNotFoundError as e:
         logger.error("Error while saving the scores: %s", e)
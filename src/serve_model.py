@@ -0,0 +1,266 @@
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+import src.generate_features as gf
+import src.model_store as ms
+import src.score_model as sm
+
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Groups concurrent scoring requests into single model calls.
+
+    Requests are queued; a background thread takes the oldest request, keeps collecting
+    requests until `max_batch_size` rows are gathered or `max_wait_ms` has passed, and
+    scores all of them with one call to `predict`.
+
+    Attributes:
+        predict: Function scoring an array of rows, returning one result row per input row.
+        max_batch_size: The number of rows after which a batch is scored without waiting.
+        max_wait_ms: The longest time a request waits for others to join its batch.
+    """
+
+    def __init__(self, predict: Callable[[np.ndarray], np.ndarray], max_batch_size: int = 256,
+                 max_wait_ms: float = 2.0):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows: np.ndarray) -> Future:
+        """Queues rows for scoring.
+
+        Args:
+            rows: The rows to score.
+
+        Returns:
+            A Future resolving to the scores of the rows.
+        """
+        future: Future = Future()
+        self._queue.put((rows, future))
+        return future
+
+    def close(self) -> None:
+        """Stops the batching thread once queued requests are scored."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            size = len(item[0])
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            while size < self.max_batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._score(batch)
+
+    def _score(self, batch: list[tuple[np.ndarray, Future]]) -> None:
+        try:
+            results = self.predict(np.concatenate([rows for rows, _ in batch]))
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Error while scoring a batch of %d requests: %s", len(batch), e)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        start = 0
+        for rows, future in batch:
+            future.set_result(results[start : start + len(rows)])
+            start += len(rows)
+        logger.debug("Scored %d rows from %d requests in one batch", start, len(batch))
+
+
+def predict_proba(model, X: np.ndarray) -> np.ndarray:
+    """Computes class probabilities for a small batch with as little overhead as possible.
+
+    Random forests are evaluated tree by tree in this thread, skipping the joblib
+    dispatch and input validation of `predict_proba`, which dominate the cost of
+    small batches; the probabilities are summed in the same order as scikit-learn.
+    Stored forests take the rows as they are.
+
+    Args:
+        model: The trained model object.
+        X: The model features, one column per model input feature.
+
+    Returns:
+        The (rows x classes) probabilities.
+    """
+    if isinstance(model, ms.MappedForest):
+        return model.predict_proba(X)
+    estimators = getattr(model, "estimators_", None)
+    if estimators is None or getattr(model, "n_jobs", None) not in (None, 1):
+        return model.predict_proba(pd.DataFrame(X, columns=getattr(model, "feature_names_in_", None)))
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    proba = np.zeros((len(X), model.n_classes_))
+    for tree in estimators:
+        proba += tree.predict_proba(X, check_input=False)
+    proba /= len(estimators)
+    return proba
+
+
+def make_scorer(model, config: dict) -> tuple[Callable[[np.ndarray], np.ndarray], list[str]]:
+    """Builds the function scoring raw rows with the trained model.
+
+    Rows go through the same feature generation as training before the model is
+    evaluated once for all of them.
+
+    Args:
+        model: The trained model object.
+        config: The full pipeline configuration.
+
+    Returns:
+        The scoring function, taking an array with one column per required raw column
+        and returning an array of (probability, binary prediction) rows, and the list
+        of required raw columns.
+    """
+    plan = gf.compile_plan(config["generate_features"])
+    initial_features = config["score_model"]["initial_features"]
+    threshold = config["score_model"].get("threshold", 0.5)
+    required = sorted(
+        set(plan.sources) | {col for col in initial_features if col not in plan.outputs}
+    )
+
+    def score(rows: np.ndarray) -> np.ndarray:
+        raw = {col: rows[:, i] for i, col in enumerate(required)}
+        generated = gf.compute_features(raw, plan, len(rows))
+        X = np.column_stack([
+            generated[:, plan.outputs.index(col)] if col in plan.outputs else raw[col]
+            for col in initial_features
+        ])
+        proba = predict_proba(model, X)
+        binary = sm.predict_binary(proba, model.classes_, threshold)
+        return np.column_stack([proba[:, 1], binary])
+
+    return score, required
+
+
+def make_handler(batcher: MicroBatcher, required: list[str], timeout: float) -> type:
+    """Builds the HTTP request handler class of the scoring server.
+
+    Args:
+        batcher: The micro-batcher scoring requests.
+        required: The raw columns each input row must contain.
+        timeout: The number of seconds a request may wait for its scores.
+
+    Returns:
+        The request handler class.
+    """
+
+    class ScoringHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately; without TCP_NODELAY each response
+        # waits for the client's delayed ACK
+        disable_nagle_algorithm = True
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            if self.path == "/health":
+                self._reply(200, {"status": "ok", "required_columns": required})
+            else:
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            if self.path != "/score":
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                records = body["rows"] if isinstance(body, dict) else body
+                rows = np.array([[row[col] for col in required] for row in records], dtype=np.float64)
+                if rows.ndim != 2 or not len(rows):
+                    raise ValueError("Expected a non-empty list of rows")
+            except (ValueError, KeyError, TypeError) as e:
+                self._reply(400, {"error": str(e)})
+                return
+            try:
+                scores = batcher.submit(rows).result(timeout)
+            except Exception as e:  # pylint: disable=broad-except
+                self._reply(500, {"error": str(e)})
+                return
+            self._reply(200, {
+                "predicted_probability": scores[:, 0].tolist(),
+                "predicted_binary": scores[:, 1].tolist(),
+            })
+
+        def _reply(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            # Per-request access logs would cost more than scoring a request
+            pass
+
+    return ScoringHandler
+
+
+def create_server(model_path: Path, config: dict) -> tuple[ThreadingHTTPServer, MicroBatcher]:
+    """Loads the trained model once and creates the scoring server.
+
+    Args:
+        model_path: The path to the trained model, see `model_store.load_model`.
+        config: The full pipeline configuration; the serve_model section sets host,
+            port, max_batch_size, max_wait_ms and timeout.
+
+    Returns:
+        The HTTP server, not yet serving, and its micro-batcher.
+    """
+    serve_config = config.get("serve_model", {})
+    model = ms.load_model(model_path)
+    logger.info("Model loaded from %s", model_path)
+
+    score, required = make_scorer(model, config)
+    batcher = MicroBatcher(
+        score, serve_config.get("max_batch_size", 256), serve_config.get("max_wait_ms", 2.0)
+    )
+    handler = make_handler(batcher, required, serve_config.get("timeout", 30.0))
+    server = ThreadingHTTPServer(
+        (serve_config.get("host", "127.0.0.1"), serve_config.get("port", 8080)), handler
+    )
+    server.daemon_threads = True
+    return server, batcher
+
+
+def serve(model_path: Path, config: dict) -> None:
+    """Serves scoring requests until interrupted.
+
+    Args:
+        model_path: The path to the trained model, see `model_store.load_model`.
+        config: The full pipeline configuration.
+    """
+    server, batcher = create_server(model_path, config)
+    host, port = server.server_address[:2]
+    logger.info("Scoring server listening on http://%s:%s/score", host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Scoring server stopped.")
+    finally:
+        server.server_close()
+        batcher.close()
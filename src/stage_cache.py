@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import shutil
+from pathlib import Path
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Computes a content hash for a file or a directory of files.
+
+    Args:
+        path: The file or directory to fingerprint.
+        chunk_size: The number of bytes read at a time.
+
+    Returns:
+        The hex digest of the SHA-256 hash of the content.
+    """
+    path = Path(path)
+    digest = hashlib.sha256()
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    for file in files:
+        if path.is_dir():
+            digest.update(str(file.relative_to(path)).encode())
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_key(stage: str, upstream: list[str], config: Any) -> str:
+    """Computes the cache key of a stage from its inputs.
+
+    Args:
+        stage: The name of the pipeline stage.
+        upstream: Fingerprints of the upstream artifacts the stage reads.
+        config: The configuration section of the stage.
+
+    Returns:
+        The hex digest identifying the stage outputs.
+    """
+    payload = json.dumps(
+        {"stage": stage, "upstream": upstream, "config": config},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class StageCache:
+    """Stores stage outputs on disk under the hash of the stage inputs.
+
+    Attributes:
+        root: The directory holding cached stage outputs.
+        enabled: Whether cached outputs are reused and stored.
+        hits: Mapping of stage name to whether its outputs came from the cache.
+    """
+
+    def __init__(self, root: Path, enabled: bool = True):
+        self.root = Path(root)
+        self.enabled = enabled
+        self.hits: dict[str, bool] = {}
+
+    def key(self, stage: str, inputs: list[Path], config: Any) -> str:
+        """Computes the cache key of a stage from its input artifacts and config.
+
+        Args:
+            stage: The name of the pipeline stage.
+            inputs: Paths of the upstream artifacts the stage reads.
+            config: The configuration section of the stage.
+
+        Returns:
+            The cache key of the stage.
+        """
+        return stage_key(stage, [fingerprint_file(path) for path in inputs], config)
+
+    def restore(self, stage: str, key: str, artifacts: Path, outputs: list[str]) -> bool:
+        """Copies cached stage outputs into the artifacts directory.
+
+        Args:
+            stage: The name of the pipeline stage.
+            key: The cache key of the stage.
+            artifacts: The directory the outputs should be restored into.
+            outputs: Names of the output files or directories of the stage.
+
+        Returns:
+            True if every output was restored from the cache, False otherwise.
+        """
+        entry = self.root / stage / key
+        hit = self.enabled and all((entry / name).exists() for name in outputs)
+        if hit:
+            try:
+                for name in outputs:
+                    _copy(entry / name, artifacts / name)
+            except OSError as e:
+                logger.warning("Could not restore cached %s outputs: %s", stage, e)
+                hit = False
+        self.hits[stage] = hit
+        logger.info("Stage %s: cache %s (%s)", stage, "hit" if hit else "miss", key[:12])
+        return hit
+
+    def store(self, stage: str, key: str, artifacts: Path, outputs: list[str]) -> None:
+        """Copies stage outputs from the artifacts directory into the cache.
+
+        Args:
+            stage: The name of the pipeline stage.
+            key: The cache key of the stage.
+            artifacts: The directory holding the outputs of the stage.
+            outputs: Names of the output files or directories of the stage.
+        """
+        if not self.enabled:
+            return
+        entry = self.root / stage / key
+        staging = entry.with_name(key + ".tmp")
+        try:
+            shutil.rmtree(staging, ignore_errors=True)
+            staging.mkdir(parents=True)
+            for name in outputs:
+                _copy(artifacts / name, staging / name)
+            shutil.rmtree(entry, ignore_errors=True)
+            staging.rename(entry)
+            logger.debug("Stored %s outputs in cache at %s", stage, entry)
+        except OSError as e:
+            logger.warning("Could not cache %s outputs: %s", stage, e)
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def report(self) -> dict[str, str]:
+        """Summarizes which stages were served from the cache.
+
+        Returns:
+            Mapping of stage name to "hit" or "miss".
+        """
+        return {stage: "hit" if hit else "miss" for stage, hit in self.hits.items()}
+
+
+def _copy(src: Path, dst: Path) -> None:
+    if src.is_dir():
+        shutil.copytree(src, dst, dirs_exist_ok=True)
+    else:
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(src, dst)
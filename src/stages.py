@@ -0,0 +1,310 @@
+import functools
+import logging
+from pathlib import Path
+from typing import NamedTuple
+
+from src.dag import Stage
+
+# Stage modules are imported by the stages that use them, so that commands running
+# one stage only load the libraries it needs (pandas, scikit-learn, matplotlib...)
+
+
+logger = logging.getLogger(__name__)
+
+RAW_DATA = "clouds.data"
+
+
+class RunPaths(NamedTuple):
+    """The artifacts of a pipeline run.
+
+    Attributes:
+        artifacts: The run directory.
+        fmt: The format of the intermediate datasets, one of `artifact_io.FORMATS`.
+        raw_data: The downloaded source data, one file per data source.
+        acquire_summary: The outcome and timing of each download.
+        dataset: The structured dataset.
+        cleaned: The dataset with the generated features.
+        figures: The directory of histogram figures.
+        train: The training set.
+        test: The test set.
+        model: The trained model, a pickle file or stored forest directory.
+        leaderboard: The ranked candidates of a hyperparameter search.
+        scores: The test set scores.
+        metrics: The evaluation metrics.
+        cv_metrics: The cross-validation metrics.
+    """
+
+    artifacts: Path
+    fmt: str
+    raw_data: tuple[Path, ...]
+    acquire_summary: Path
+    dataset: Path
+    cleaned: Path
+    figures: Path
+    train: Path
+    test: Path
+    model: Path
+    leaderboard: Path
+    scores: Path
+    metrics: Path
+    cv_metrics: Path
+
+
+def run_paths(artifacts: Path, config: dict) -> RunPaths:
+    """Builds the paths of the artifacts of a run from its configuration.
+
+    Args:
+        artifacts: The run directory.
+        config: The pipeline configuration.
+
+    Returns:
+        The artifact paths.
+    """
+    import src.acquire_data as ad
+    import src.artifact_io as aio
+    import src.model_store as ms
+
+    artifacts = Path(artifacts)
+    run_config = config.get("run_config", {})
+    fmt = run_config.get("artifact_format", "csv")
+    store_config = config["train_model"].get("model_store", {})
+    return RunPaths(
+        artifacts=artifacts,
+        fmt=fmt,
+        raw_data=tuple(ad.source_paths(ad.as_sources(run_config["data_source"]), artifacts / RAW_DATA)),
+        acquire_summary=artifacts / ad.SUMMARY_FILE,
+        dataset=aio.artifact_path(artifacts, "clouds", fmt),
+        cleaned=aio.artifact_path(artifacts, "cloud_cleaned", fmt),
+        figures=artifacts / "figures",
+        train=aio.artifact_path(artifacts, "train", fmt),
+        test=aio.artifact_path(artifacts, "test", fmt),
+        model=ms.model_path(artifacts, store_config.get("format", "pickle")),
+        leaderboard=artifacts / "leaderboard.csv",
+        scores=aio.artifact_path(artifacts, "scores", fmt),
+        metrics=artifacts / "metrics.yaml",
+        cv_metrics=artifacts / "cv_metrics.yaml",
+    )
+
+
+def _load(path: Path, config: dict, columns=None):
+    """Loads a dataset artifact, in compact types when the run uses them."""
+    import src.artifact_io as aio
+
+    data = aio.load_frame(path, columns)
+    # CSV artifacts are read back as float64 and int64
+    return aio.compact_frame(data) if config["create_dataset"].get("compact_dtypes", False) else data
+
+
+def _features(values: dict, config: dict, paths: RunPaths):
+    features = values.get("features")
+    return _load(paths.cleaned, config) if features is None else features
+
+
+def download(config: dict, artifacts: Path) -> list[Path]:
+    """Downloads the source data into a run directory.
+
+    `run_config.data_source` is one URL or a list of URLs, downloaded concurrently by up
+    to `run_config.download_workers` threads. An unchanged source is served from the
+    download cache after one conditional request.
+
+    Args:
+        config: The pipeline configuration.
+        artifacts: The run directory.
+
+    Returns:
+        The paths of the raw data, one per data source.
+    """
+    import src.acquire_data as ad
+
+    run_config = config["run_config"]
+    return ad.acquire_sources(ad.as_sources(run_config["data_source"]), Path(artifacts) / RAW_DATA,
+                              run_config.get("download_cache"), run_config.get("download_workers", 4))
+
+
+def acquire(values: dict, config: dict, paths: RunPaths) -> dict:
+    """Downloads the source data, see `download`."""
+    download(config, paths.artifacts)
+    return {}
+
+
+def create(values: dict, config: dict, paths: RunPaths) -> dict:
+    """Creates the structured dataset from the raw data, concatenating the data sources."""
+    import pandas as pd
+
+    import src.create_dataset as cd
+
+    frames = [cd.create_dataset(path, config["create_dataset"]) for path in paths.raw_data]
+    data = frames[0] if len(frames) == 1 else pd.concat(frames)
+    cd.save_dataset(data, paths.dataset, paths.fmt)
+    return {"data": data, "rows": len(data)}
+
+
+def featurize(values: dict, config: dict, paths: RunPaths) -> dict:
+    """Enriches the dataset with the features for model training."""
+    import src.generate_features as gf
+
+    data = values.get("data")
+    if data is None:
+        data = _load(paths.dataset, config)
+    store_root = config["run_config"].get("feature_store")
+    if store_root and all(path.exists() for path in paths.raw_data):
+        # Only the features missing from the store are computed
+        import src.feature_store as fs
+
+        store = fs.FeatureStore(store_root)
+        data_key = fs.dataset_key(paths.raw_data, config["create_dataset"])
+        features = store.generate(data, config["generate_features"], data_key)
+    else:
+        features = gf.generate_features(data, config["generate_features"])
+    gf.save_dataset(features, paths.cleaned, paths.fmt)
+    return {"features": features, "rows": len(features)}
+
+
+def analyze(values: dict, config: dict, paths: RunPaths) -> dict:
+    """Saves histograms of the features."""
+    import matplotlib as mpl
+
+    import src.analysis as eda
+
+    features = _features(values, config, paths)
+    # Figures may be rendered off the main thread, which needs a non-interactive backend
+    mpl.use("Agg")
+    paths.figures.mkdir(exist_ok=True)
+    eda.save_figures(features, paths.figures, config["analysis"],
+                     config["run_config"].get("figure_processes", 1))
+    return {"rows": len(features)}
+
+
+def train(values: dict, config: dict, paths: RunPaths) -> dict:
+    """Splits the data into train and test sets and trains, or searches, the model."""
+    import src.artifact_io as aio
+    import src.model_store as ms
+    import src.train_model as tm
+
+    train_config = config["train_model"]
+    store_config = train_config.get("model_store", {})
+    if tm.is_search(train_config["model_params"]):
+        # Search the declared parameter grid or distributions; the best model is kept
+        model, split, leaderboard = tm.search_model(_features(values, config, paths), train_config)
+        leaderboard.to_csv(paths.leaderboard, index=False)
+    elif train_config.get("out_of_core", {}).get("enabled", False):
+        # Stream the features from disk; the train and test sets are written as they stream
+        model, n_train = tm.train_model_out_of_core(paths.cleaned, paths.artifacts, train_config, paths.fmt)
+        split = None
+    else:
+        model, split = tm.train_model(_features(values, config, paths), train_config)
+    if split is not None:
+        tm.save_data(split, paths.artifacts, paths.fmt)
+        n_train = len(split.train_index)
+    # The pickle is kept with a stored forest too, since refreshing adds trees to it
+    tm.save_model(model, ms.model_path(paths.artifacts, "pickle"))
+    if store_config.get("format", "pickle") == "mapped":
+        train_chunks = (split.chunks(split.train_index) if split is not None
+                        else aio.iter_frame_chunks(paths.train, 100_000))
+        ms.save_forest(model, paths.model, ms.fingerprint_frame(train_chunks), store_config.get("compress", False))
+    return {"model": model, "split": split, "rows": n_train}
+
+
+def _test(values: dict, config: dict, paths: RunPaths, columns: list):
+    """The columns of the test set, gathered from the split of the training stage if it ran."""
+    split = values.get("split")
+    return _load(paths.test, config, columns) if split is None else split.test(columns)
+
+
+def score(values: dict, config: dict, paths: RunPaths) -> dict:
+    """Scores the model on the test set."""
+    import src.model_store as ms
+    import src.score_model as sm
+
+    score_config = config["score_model"]
+    if score_config.get("chunksize"):
+        # Stream the test set from disk in chunks; scores are written as they come
+        rows = sm.score_file(paths.test, paths.model, paths.scores, score_config, paths.fmt)
+        return {"rows": rows}
+    model = values.get("model")
+    if model is None:
+        model = ms.load_model(paths.model)
+    test = _test(values, config, paths, score_config["initial_features"])
+    scores = sm.score_model(test, model, score_config)
+    sm.save_scores(scores, paths.scores, paths.fmt)
+    return {"scores": scores, "rows": len(scores)}
+
+
+def evaluate(values: dict, config: dict, paths: RunPaths) -> dict:
+    """Evaluates the model performance metrics."""
+    import src.artifact_io as aio
+    import src.evaluate_performance as ep
+
+    evaluate_config = config["evaluate_performance"]
+    scores = values.get("scores")
+    if scores is None:
+        scores = aio.load_frame(paths.scores)
+    test = _test(values, config, paths, [evaluate_config["target"]])
+    metrics = ep.evaluate_performance(scores, test, evaluate_config)
+    ep.save_metrics(metrics, paths.metrics)
+    return {"rows": len(scores)}
+
+
+def cross_validate(values: dict, config: dict, paths: RunPaths) -> dict:
+    """Cross-validates the model configuration for variance estimates of its metrics."""
+    import src.cross_validate as cv
+
+    features = _features(values, config, paths)
+    cv.save_cv_metrics(cv.cross_validate(features, config), paths.cv_metrics)
+    return {"rows": len(features)}
+
+
+def pipeline_stages(config: dict, paths: RunPaths) -> list[Stage]:
+    """Declares the stages of the pipeline with their dependencies, inputs and outputs.
+
+    Analysis, training and cross-validation only depend on the features, so they can
+    run concurrently.
+
+    Args:
+        config: The pipeline configuration.
+        paths: The artifacts of the run.
+
+    Returns:
+        The stages, in the order of the linear pipeline.
+    """
+    import src.model_store as ms
+    import src.train_model as tm
+
+    def stage(name, run, requires=(), inputs=(), outputs=(), stage_config=None, cacheable=True):
+        return Stage(name, functools.partial(run, config=config, paths=paths), tuple(requires),
+                     tuple(inputs), tuple(outputs), stage_config, cacheable)
+
+    train_outputs = [paths.train.name, paths.test.name, paths.model.name]
+    if config["train_model"].get("model_store", {}).get("format", "pickle") == "mapped":
+        train_outputs.append(ms.MODEL_FILES["pickle"])
+    search = tm.is_search(config["train_model"]["model_params"])
+    if search:
+        train_outputs.append(paths.leaderboard.name)
+    stages = [
+        # Downloads are cached by URL and revalidated by acquire_data itself
+        stage("acquire_data", acquire, outputs=[*(path.name for path in paths.raw_data),
+                                                paths.acquire_summary.name], cacheable=False),
+        stage("create_dataset", create, ["acquire_data"], paths.raw_data, [paths.dataset.name],
+              config["create_dataset"]),
+        stage("generate_features", featurize, ["create_dataset"], [paths.dataset], [paths.cleaned.name],
+              config["generate_features"]),
+        stage("analysis", analyze, ["generate_features"], [paths.cleaned], [paths.figures.name],
+              config["analysis"]),
+        stage("train_model", train, ["generate_features"], [paths.cleaned], train_outputs,
+              config["train_model"]),
+        stage("score_model", score, ["train_model"], [paths.test, paths.model], [paths.scores.name],
+              config["score_model"]),
+        stage("evaluate_performance", evaluate, ["score_model"], [paths.scores, paths.test],
+              [paths.metrics.name], config["evaluate_performance"]),
+    ]
+
+    cv_config = config.get("cross_validate", {})
+    if cv_config.get("enabled", False):
+        if search:
+            logger.warning("Skipping cross-validation, which needs fixed train_model.model_params")
+        else:
+            stages.append(stage("cross_validate", cross_validate, ["generate_features"], [paths.cleaned],
+                                [paths.cv_metrics.name],
+                                [config["train_model"], cv_config, config["score_model"],
+                                 config["evaluate_performance"]]))
+    return stages
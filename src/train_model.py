@@ -1,26 +1,122 @@
+import itertools
 import logging
+import multiprocessing
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import pickle
+from typing import Any, Iterator, NamedTuple, Optional
+
+import numpy as np
 import pandas as pd
+import sklearn.metrics
 import sklearn.model_selection
 import sklearn.ensemble
 
+import src.artifact_io as aio
+
 
 logger = logging.getLogger(__name__)
 
+# Training data shared read-only by the search worker processes
+_worker_data: dict = {}
+
+
+class TrainTestSplit(NamedTuple):
+    """A train/test split of a dataset held as row positions, without copying the data.
+
+    The train and test sets are gathered from the dataset only when, and only for the
+    columns, they are needed. They hold the features followed by the target, as the
+    train and test artifacts do.
+
+    Attributes:
+        data: The dataset with the features and target.
+        target: The name of the target column.
+        train_index: The positions of the training rows, in split order.
+        test_index: The positions of the test rows, in split order.
+    """
+
+    data: pd.DataFrame
+    target: str
+    train_index: np.ndarray
+    test_index: np.ndarray
+
+    @property
+    def columns(self) -> list:
+        """The columns of the train and test sets: the features, then the target."""
+        return [col for col in self.data.columns if col != self.target] + [self.target]
+
+    def rows(self, index: np.ndarray, columns: Optional[list] = None) -> pd.DataFrame:
+        """Gathers rows of the dataset, copying only the requested columns.
+
+        Args:
+            index: The positions of the rows.
+            columns: The columns to gather; all columns of the split if None.
+
+        Returns:
+            The rows, with their index in the dataset.
+        """
+        return pd.DataFrame({col: self.data[col].to_numpy()[index] for col in columns or self.columns},
+                            index=self.data.index[index], copy=False)
+
+    def train(self, columns: Optional[list] = None) -> pd.DataFrame:
+        """The training set, see `rows`."""
+        return self.rows(self.train_index, columns)
+
+    def test(self, columns: Optional[list] = None) -> pd.DataFrame:
+        """The test set, see `rows`."""
+        return self.rows(self.test_index, columns)
+
+    def chunks(self, index: np.ndarray, chunksize: int = 100_000) -> Iterator[pd.DataFrame]:
+        """Gathers rows of the dataset with all columns, a chunk of rows at a time.
+
+        An empty index yields one empty chunk, which still holds the columns.
+        """
+        for start in range(0, max(len(index), 1), chunksize):
+            yield self.rows(index[start : start + chunksize])
+
+
+def split_data(data: pd.DataFrame, target: str, test_size: float,
+               random_state: Optional[int] = None) -> TrainTestSplit:
+    """Splits a dataset into train and test rows.
+
+    The rows are shuffled as by `sklearn.model_selection.train_test_split`, so a seed
+    gives the same sets, in the same order, as splitting the DataFrame itself.
+
+    Args:
+        data: The dataset with the features and target.
+        target: The name of the target column.
+        test_size: The fraction, or number, of test rows.
+        random_state: The seed of the shuffle.
+
+    Returns:
+        The split.
+
+    Raises:
+        KeyError: If the target column is missing.
+    """
+    if target not in data.columns:
+        raise KeyError(target)
+    train_index, test_index = sklearn.model_selection.train_test_split(
+        np.arange(len(data)), test_size=test_size, random_state=random_state)
+    return TrainTestSplit(data, target, train_index, test_index)
+
 
 def train_model(data: pd.DataFrame, config: dict):
     """
     Trains a model using the specified data and configuration.
 
+    The data is split by row positions, and only the training features are copied, so
+    the training stage holds about one copy of the data.
+
     Args:
         data: A DataFrame containing the features and target variable.
         config: A dictionary containing the configuration parameters for the model.
 
     Returns:
         model: A trained model object.
-        train_df: A DataFrame containing the training data (X_train and y_train).
-        test_df: A DataFrame containing the test data (X_test and y_test).
+        split: The train/test split of the data, see `TrainTestSplit`.
     """
     try:
 
@@ -29,28 +125,16 @@ def train_model(data: pd.DataFrame, config: dict):
         initial_features = config.get("initial_features")
         model_params = config.get("model_params")
 
-        X = data.drop(columns=[target])
-        y = data[target]
-
         # Split data into train/test set and train model based on config
-        X_train, X_test, y_train, y_test = sklearn.model_selection.train_test_split(
-            X, y, test_size=test_size)
+        split = split_data(data, target, test_size, config.get("random_state"))
         logger.debug("Train test split finished")
 
         model = sklearn.ensemble.RandomForestClassifier(**model_params)
-        model.fit(X_train[initial_features], y_train)
+        model.fit(split.train(initial_features), data[target].to_numpy()[split.train_index])
         logger.debug("Model training finished")
 
-        # Combine X_train and y_train into a single DataFrame
-        train_df = X_train.copy()
-        train_df[target] = y_train
-
-        # Combine X_test and y_test into a single DataFrame
-        test_df = X_test.copy()
-        test_df[target] = y_test
-
         logger.info("Model training finished, train and test data generated")
-        return model, train_df, test_df
+        return model, split
     
     except KeyError as e:
         logger.error("Missing key in the configuration: %s", e)
@@ -63,18 +147,345 @@ def train_model(data: pd.DataFrame, config: dict):
         raise
 
 
-def save_data(train: pd.DataFrame, test: pd.DataFrame, artifacts: Path):
+def is_search(model_params: dict) -> bool:
+    """Checks whether model parameters declare a hyperparameter search.
+
+    A parameter given as a list of values is searched over as a grid; a parameter
+    given as a mapping with a `distribution` key is sampled at random, see
+    `sample_candidates`.
+
+    Args:
+        model_params: The model parameters from the configuration.
+
+    Returns:
+        Whether any parameter has several candidate values.
     """
-    Saves the training and test data to disk as CSV files.
+    return any(
+        isinstance(value, list) or (isinstance(value, dict) and "distribution" in value)
+        for value in model_params.values()
+    )
+
+
+def _sample(spec: Any, rng: np.random.Generator) -> Any:
+    if isinstance(spec, list):
+        return spec[rng.integers(len(spec))]
+    if not isinstance(spec, dict):
+        return spec
+    distribution = spec["distribution"]
+    if distribution == "randint":
+        return int(rng.integers(spec["low"], spec["high"]))
+    if distribution == "uniform":
+        return float(rng.uniform(spec["low"], spec["high"]))
+    if distribution == "loguniform":
+        return float(np.exp(rng.uniform(np.log(spec["low"]), np.log(spec["high"]))))
+    if distribution == "choice":
+        return spec["values"][rng.integers(len(spec["values"]))]
+    raise ValueError(f"Unknown distribution {distribution}; expected randint, uniform, loguniform or choice")
+
+
+def sample_candidates(model_params: dict, n_iter: int = 10, random_state: Optional[int] = None) -> list[dict]:
+    """Lists the parameter combinations to evaluate in a hyperparameter search.
+
+    When every searched parameter is a list, all combinations of the grid are
+    returned. Otherwise `n_iter` distinct combinations are sampled: lists uniformly,
+    and mappings from their `distribution` (`randint` in [low, high), `uniform` or
+    `loguniform` between low and high, or `choice` among `values`).
+
+    Args:
+        model_params: The model parameters from the configuration.
+        n_iter: The number of combinations sampled in a random search.
+        random_state: The seed of the random search.
+
+    Returns:
+        The candidate model parameters.
+
+    Raises:
+        ValueError: If a distribution is not supported.
+    """
+    if not any(isinstance(value, dict) and "distribution" in value for value in model_params.values()):
+        grid = {name: value if isinstance(value, list) else [value] for name, value in model_params.items()}
+        return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    rng = np.random.default_rng(random_state)
+    candidates: list[dict] = []
+    for _ in range(100 * n_iter):
+        candidate = {name: _sample(spec, rng) for name, spec in model_params.items()}
+        if candidate not in candidates:
+            candidates.append(candidate)
+        if len(candidates) == n_iter:
+            break
+    return candidates
+
+
+def _init_search_worker(X_path: str, y: np.ndarray, train_index: np.ndarray, valid_index: np.ndarray) -> None:
+    _worker_data.update(X=np.load(X_path, mmap_mode="r"), y=y, train=train_index, valid=valid_index)
+
+
+def _evaluate_group(candidates: list[dict], scoring: str) -> list[tuple[dict, float, float]]:
+    """Fits candidates differing only in n_estimators, growing one forest with warm_start."""
+    X, y = _worker_data["X"], _worker_data["y"]
+    X_train, y_train = X[_worker_data["train"]], y[_worker_data["train"]]
+    X_valid, y_valid = X[_worker_data["valid"]], y[_worker_data["valid"]]
+    scorer = sklearn.metrics.get_scorer(scoring)
+    params = {"n_jobs": 1, **candidates[0], "warm_start": True}
+    model = sklearn.ensemble.RandomForestClassifier(**params)
+    results = []
+    for candidate in sorted(candidates, key=lambda c: c.get("n_estimators", 100)):
+        start = time.perf_counter()
+        model.set_params(n_estimators=candidate.get("n_estimators", 100))
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - start
+        results.append((candidate, float(scorer(model, X_valid, y_valid)), fit_seconds))
+    return results
+
+
+def search_model(data: pd.DataFrame, config: dict) -> tuple:
+    """Searches the model parameters declared in the configuration and trains the best model.
+
+    The data is split into train and test sets as in `train_model`, and a validation
+    set (`search.validation_size`, 0.25 by default) is held out from the training set
+    to score the candidates with `search.scoring` (`roc_auc` by default). Candidates are
+    evaluated by `search.processes` worker processes that memory-map one shared copy of
+    the training features. Candidates that differ only in `n_estimators` are evaluated
+    by growing a single forest with `warm_start`, from the smallest to the largest.
+    The best candidate is refit on the whole training set.
+
+    Args:
+        data: A DataFrame containing the features and target variable.
+        config: A dictionary containing the configuration parameters for the model.
+
+    Returns:
+        model: The best model, trained on the whole training set.
+        split: The train/test split of the data, see `TrainTestSplit`.
+        leaderboard: A DataFrame with one row per candidate, sorted from best to worst.
+    """
+    try:
+        target = config["target"]
+        initial_features = config["initial_features"]
+        search = config.get("search", {})
+        scoring = search.get("scoring", "roc_auc")
+        random_state = search.get("random_state")
+        processes = search.get("processes", 1)
+        candidates = sample_candidates(config["model_params"], search.get("n_iter", 10), random_state)
+
+        split = split_data(data, target, config.get("test_size"), config.get("random_state"))
+        X_train = split.train(initial_features)
+        y_train = data[target].to_numpy()[split.train_index]
+        train_index, valid_index = sklearn.model_selection.train_test_split(
+            np.arange(len(X_train)), test_size=search.get("validation_size", 0.25),
+            random_state=random_state, stratify=y_train)
+
+        # Group candidates that only differ in n_estimators, to be grown with warm_start
+        groups: dict = {}
+        for candidate in candidates:
+            rest = {name: value for name, value in candidate.items() if name != "n_estimators"}
+            groups.setdefault(repr(sorted(rest.items())), []).append(candidate)
+        logger.info("Searching %d candidates in %d warm-started groups with %d process(es)",
+                    len(candidates), len(groups), processes)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            X_path = str(Path(tmp) / "X_train.npy")
+            # Forests train on float32 features; converting once avoids a copy per fit
+            np.save(X_path, X_train.to_numpy(dtype=np.float32))
+            init_args = (X_path, y_train, train_index, valid_index)
+            if processes <= 1:
+                _init_search_worker(*init_args)
+                results = [_evaluate_group(group, scoring) for group in groups.values()]
+                _worker_data.clear()
+            else:
+                with ProcessPoolExecutor(processes, multiprocessing.get_context("spawn"),
+                                         _init_search_worker, init_args) as pool:
+                    results = list(pool.map(_evaluate_group, groups.values(), itertools.repeat(scoring)))
+
+        evaluated = sorted((result for group in results for result in group),
+                           key=lambda result: -result[1])
+        leaderboard = pd.DataFrame(
+            [{"rank": rank, **candidate, "score": score, "fit_seconds": fit_seconds}
+             for rank, (candidate, score, fit_seconds) in enumerate(evaluated, 1)]
+        )
+        best = evaluated[0][0]
+        logger.info("Best candidate %s with %s %.4f", best, scoring, evaluated[0][1])
+
+        model = sklearn.ensemble.RandomForestClassifier(**best)
+        model.fit(X_train, y_train)
+        logger.debug("Best model refit on the whole training set")
+
+        logger.info("Model search finished, train and test data generated")
+        return model, split, leaderboard
+
+    except KeyError as e:
+        logger.error("Missing key in the configuration: %s", e)
+        raise
+    except ValueError as e:
+        logger.error("Invalid value encountered: %s", e)
+        raise
+    except Exception as e:
+        logger.error("Error while searching the model: %s", e)
+        raise
+
+
+def _assign_rows(random_state: int, chunk: int, n_rows: int, test_size: float,
+                 buckets: int) -> tuple[np.ndarray, np.ndarray]:
+    """Draws whether each row of a chunk is a test row, and the bucket of each training row.
+
+    The draws only depend on the seed, the chunk number and its length, so they can
+    be replayed without reading the data.
+    """
+    rng = np.random.default_rng([random_state, chunk])
+    return rng.random(n_rows) < test_size, rng.integers(0, buckets, n_rows)
+
+
+def _fit_bucket(X_path: str, y_path: str, y_dtype: str, features: list[str], params: dict) -> Any:
+    """Fits a sub-forest on the training rows of one bucket."""
+    X = np.fromfile(X_path, dtype=np.float32).reshape(-1, len(features))
+    y = np.fromfile(y_path, dtype=y_dtype)
+    model = sklearn.ensemble.RandomForestClassifier(**params)
+    model.fit(pd.DataFrame(X, columns=features, copy=False), y)
+    return model
+
+
+def merge_forests(forests: list) -> sklearn.ensemble.RandomForestClassifier:
+    """Merges fitted random forests into one forest holding all their trees.
+
+    Args:
+        forests: Forests fitted on the same features and classes.
+
+    Returns:
+        The first forest, extended with the trees of the others.
+
+    Raises:
+        ValueError: If the forests were fitted on different features or classes.
+    """
+    model = forests[0]
+    for forest in forests[1:]:
+        if not np.array_equal(forest.classes_, model.classes_):
+            raise ValueError(f"Cannot merge forests with classes {forest.classes_} and {model.classes_}")
+        if list(forest.feature_names_in_) != list(model.feature_names_in_):
+            raise ValueError("Cannot merge forests fitted on different features")
+        model.estimators_ += forest.estimators_
+    model.n_estimators = len(model.estimators_)
+    return model
+
+
+def train_model_out_of_core(path: Path, artifacts: Path, config: dict, fmt: str = "csv") -> tuple:
+    """Trains a model on a dataset artifact too large for memory.
+
+    The dataset is streamed from disk in chunks of `out_of_core.chunksize` rows. Each
+    row goes to the test set with probability `test_size`, and each training row to
+    one of `out_of_core.buckets` random buckets written to disk, so that every bucket
+    is a random sample of the whole dataset, whatever the order of its rows. The train
+    and test sets are written as they stream, as `save_data` does. Then a sub-forest
+    with an equal share of `model_params.n_estimators` is fitted on each bucket, by
+    `out_of_core.processes` worker processes, and the sub-forests are merged into one
+    forest. A `model_params.random_state` seeds the sub-forest of bucket b with the
+    seed plus b. Memory holds one chunk while streaming, and one bucket per process while
+    fitting.
+
+    Args:
+        path: The dataset artifact with the features and target variable.
+        artifacts: The directory the train and test sets are written to.
+        config: A dictionary containing the configuration parameters for the model.
+        fmt: The format of the train and test artifacts, one of `artifact_io.FORMATS`.
+
+    Returns:
+        model: The merged forest.
+        n_train: The number of training rows.
+    """
+    try:
+        target = config["target"]
+        initial_features = config["initial_features"]
+        test_size = config["test_size"]
+        random_state = config.get("random_state")
+        if random_state is None:
+            # One fresh seed for all chunks, so that their draws can still be replayed
+            random_state = int(np.random.SeedSequence().entropy)
+        out_of_core = config.get("out_of_core", {})
+        chunksize = out_of_core.get("chunksize", 100_000)
+        buckets = out_of_core.get("buckets", 4)
+        processes = out_of_core.get("processes", 1)
+        model_params = dict(config["model_params"])
+        n_estimators = model_params.pop("n_estimators", 100)
+        seed = model_params.pop("random_state", None)
+        if n_estimators < buckets:
+            raise ValueError(f"Cannot split {n_estimators} trees into {buckets} buckets")
+
+        # Replay the draws to size the train and test artifacts up front
+        n_rows = aio.count_rows(path)
+        sizes = [min(chunksize, n_rows - start) for start in range(0, n_rows, chunksize)]
+        n_test = sum(int(_assign_rows(random_state, i, size, test_size, buckets)[0].sum())
+                     for i, size in enumerate(sizes))
+
+        with tempfile.TemporaryDirectory(dir=artifacts) as tmp:
+            X_paths = [str(Path(tmp) / f"X-{b}.f32") for b in range(buckets)]
+            y_paths = [str(Path(tmp) / f"y-{b}.bin") for b in range(buckets)]
+            y_dtype = None
+            with aio.FrameWriter(aio.artifact_path(artifacts, "train", fmt), fmt, n_rows - n_test) as train, \
+                    aio.FrameWriter(aio.artifact_path(artifacts, "test", fmt), fmt, n_test) as test:
+                X_files = [open(p, "wb") for p in X_paths]
+                y_files = [open(p, "wb") for p in y_paths]
+                try:
+                    for i, chunk in enumerate(aio.iter_frame_chunks(path, chunksize)):
+                        is_test, bucket = _assign_rows(random_state, i, len(chunk), test_size, buckets)
+                        chunk = chunk[[col for col in chunk.columns if col != target] + [target]]
+                        train.write(chunk[~is_test])
+                        test.write(chunk[is_test])
+                        X = chunk[initial_features].to_numpy(dtype=np.float32)[~is_test]
+                        y = chunk[target].to_numpy()[~is_test]
+                        y_dtype = y.dtype.str
+                        for b in range(buckets):
+                            rows = bucket[~is_test] == b
+                            X_files[b].write(X[rows].tobytes())
+                            y_files[b].write(y[rows].tobytes())
+                finally:
+                    for f in X_files + y_files:
+                        f.close()
+            logger.debug("Streamed %d rows into %d buckets", n_rows, buckets)
+
+            # Each bucket grows its share of the trees, with its own seed
+            params = [{"n_jobs": 1, **model_params,
+                       "n_estimators": n_estimators // buckets + (b < n_estimators % buckets),
+                       "random_state": None if seed is None else seed + b}
+                      for b in range(buckets)]
+            args = (X_paths, y_paths, [y_dtype] * buckets, [initial_features] * buckets, params)
+            if processes <= 1:
+                forests = list(map(_fit_bucket, *args))
+            else:
+                with ProcessPoolExecutor(processes, multiprocessing.get_context("spawn")) as pool:
+                    forests = list(pool.map(_fit_bucket, *args))
+        model = merge_forests(forests)
+
+        logger.info("Out-of-core model training finished: %d trees on %d rows in %d buckets",
+                    model.n_estimators, n_rows - n_test, buckets)
+        return model, n_rows - n_test
+
+    except KeyError as e:
+        logger.error("Missing key in the configuration: %s", e)
+        raise
+    except ValueError as e:
+        logger.error("Invalid value encountered: %s", e)
+        raise
+    except Exception as e:
+        logger.error("Error while training the model out of core: %s", e)
+        raise
+
+
+def save_data(split: TrainTestSplit, artifacts: Path, fmt: str = "csv", chunksize: int = 100_000):
+    """
+    Saves the training and test data to disk.
+
+    The rows are gathered from the dataset and written a chunk at a time, so the
+    train and test sets are never held in memory as a whole.
 
     Args:
-        train: A DataFrame containing the training data.
-        test: A DataFrame containing the test data.
+        split: The train/test split of the data.
         artifacts: A Path object representing the directory where the data should be saved.
+        fmt: The artifact format, one of `artifact_io.FORMATS`.
+        chunksize: The number of rows written at a time.
     """
     try:
-        train.to_csv(artifacts / "train.csv", index=False)
-        test.to_csv(artifacts / "test.csv", index=False)
+        for name, index in (("train", split.train_index), ("test", split.test_index)):
+            with aio.FrameWriter(aio.artifact_path(artifacts, name, fmt), fmt, len(index)) as writer:
+                for chunk in split.chunks(index, chunksize):
+                    writer.write(chunk)
         logger.info("Train and test data saved successfully.")
     except FileNotFoundError as e:
         logger.error("Error while saving train and test data: %s", e)
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src import acquire_data as ad
+
+
+class Source:
+    """Content served by the test server, with a log of the requests it received."""
+    body = b"".join(b"%9.4f %9.4f\n" % (i, i / 7) for i in range(5000))
+    etag = '"v1"'
+    drop_after = None
+    requests = []
+
+
+class SourceHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=invalid-name
+        Source.requests.append(dict(self.headers))
+        if self.path.startswith("/missing"):
+            self.send_error(404)
+            return
+        if self.path.startswith("/slow"):
+            time.sleep(0.5)
+        if self.headers.get("If-None-Match") == Source.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        start = 0
+        if self.headers.get("Range") and self.headers.get("If-Range") == Source.etag:
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+        self.send_response(206 if start else 200)
+        self.send_header("ETag", Source.etag)
+        self.send_header("Content-Length", str(len(Source.body) - start))
+        self.end_headers()
+        body = Source.body[start:]
+        if Source.drop_after is not None:
+            # Simulate a dropped connection in the middle of the body
+            body, Source.drop_after = body[: Source.drop_after], None
+            self.wfile.write(body)
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+@pytest.fixture
+def url():
+    Source.requests, Source.etag, Source.drop_after = [], '"v1"', None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SourceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://%s:%s/cloud.data" % server.server_address[:2]
+    server.shutdown()
+    server.server_close()
+
+
+# Unit tests for downloading data =======================================
+# Happy path
+def test_acquire_data_conditional_download(url, tmp_path):
+    ad.acquire_data(url, tmp_path / "run1" / "clouds.data", tmp_path / "cache")
+    assert (tmp_path / "run1" / "clouds.data").read_bytes() == Source.body
+
+    # An unchanged source costs one request without a body
+    ad.acquire_data(url, tmp_path / "run2" / "clouds.data", tmp_path / "cache")
+    assert (tmp_path / "run2" / "clouds.data").read_bytes() == Source.body
+    assert len(Source.requests) == 2 and Source.requests[1]["If-None-Match"] == '"v1"'
+
+    # A changed source is downloaded again, leaving earlier runs untouched
+    Source.body, Source.etag = Source.body[::-1], '"v2"'
+    ad.acquire_data(url, tmp_path / "run3" / "clouds.data", tmp_path / "cache")
+    assert (tmp_path / "run3" / "clouds.data").read_bytes() == Source.body
+    assert (tmp_path / "run1" / "clouds.data").read_bytes() == Source.body[::-1]
+    Source.body = Source.body[::-1]
+
+
+# Unhappy path
+def test_download_resumes_after_dropped_connection(url, tmp_path):
+    Source.drop_after = 10000
+    assert ad.download(url, tmp_path / "clouds.data", wait=0, chunk_size=4096)
+    assert (tmp_path / "clouds.data").read_bytes() == Source.body
+    assert Source.requests[1]["Range"] == "bytes=8192-"
+    assert not (tmp_path / "clouds.data.part").exists()
+
+
+# Happy path
+def test_acquire_sources_downloads_concurrently(url, tmp_path):
+    sources = [url.replace("/cloud.data", "/slow/%d.data" % i) for i in range(3)]
+    paths = ad.acquire_sources(sources, tmp_path / "run" / "clouds.data", tmp_path / "cache")
+    assert [path.name for path in paths] == ["clouds-0.data", "clouds-1.data", "clouds-2.data"]
+    assert all(path.read_bytes() == Source.body for path in paths)
+    with open(tmp_path / "run" / ad.SUMMARY_FILE) as f:
+        summary = json.load(f)
+    assert [record["url"] for record in summary["sources"]] == sources
+    assert all(record["downloaded"] and record["bytes"] == len(Source.body) for record in summary["sources"])
+    # The three half-second responses overlap
+    assert summary["wall_seconds"] < sum(record["seconds"] for record in summary["sources"]) / 2
+
+
+# Unhappy path
+def test_acquire_sources_failing_source_does_not_block_others(url, tmp_path):
+    sources = [url.replace("/cloud.data", "/missing.data"), url]
+    with pytest.raises(RuntimeError, match="missing.data"):
+        ad.acquire_sources(sources, tmp_path / "clouds.data", attempts=2, wait=0.2)
+    assert (tmp_path / "clouds-1.data").read_bytes() == Source.body
+    assert not (tmp_path / "clouds-0.data").exists()
+    with open(tmp_path / ad.SUMMARY_FILE) as f:
+        failed, succeeded = json.load(f)["sources"]
+    assert failed["error"] and failed["bytes"] is None
+    assert succeeded["error"] is None and succeeded["seconds"] < failed["seconds"]
+
+
+
+# Unhappy path
+def test_acquire_sources_records_failure_to_link_cached_file(url, tmp_path, monkeypatch):
+    # The cached file vanishes between the download and linking it into the run
+    monkeypatch.setattr(ad, "download", lambda *args, **kwargs: True)
+    with pytest.raises(RuntimeError):
+        ad.acquire_sources([url, url], tmp_path / "clouds.data", tmp_path / "cache")
+    with open(tmp_path / ad.SUMMARY_FILE) as f:
+        records = json.load(f)["sources"]
+    assert len(records) == 2 and all(record["error"] for record in records)
+
+
+# Unhappy path
+def test_download_fails_after_attempts(tmp_path):
+    with pytest.raises(RuntimeError):
+        ad.download("http://127.0.0.1:9/cloud.data", tmp_path / "clouds.data", attempts=2, wait=0)
@@ -0,0 +1,66 @@
+import json
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import analysis as eda
+
+
+df_in = pd.DataFrame({"IR_mean": [163.0, 167.0, 174.0, 155.0, 150.0, 135.0],
+                      "log_entropy": [-3.67, -3.65, -2.68, -3.72, -3.80, -3.22],
+                      "class": [0.0, 0.0, 0.0, 1.0, 1.0, 1.0]})
+config = {"font.size": 16}
+
+
+# Unit tests for histogram rendering =======================================
+# Happy path
+@pytest.mark.parametrize("processes", [1, 2])
+def test_save_figures(tmp_path, processes):
+    paths = eda.save_figures(df_in, tmp_path, config, processes)
+    assert paths == [tmp_path / "IR_mean_histogram.png", tmp_path / "log_entropy_histogram.png"]
+    assert all(path.stat().st_size > 0 for path in paths)
+    # Figures are closed once saved
+    assert plt.get_fignums() == []
+
+
+# Unhappy path
+def test_save_figures_missing_directory(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        eda.save_figures(df_in, tmp_path / "missing", config)
+
+
+# Unit tests for precomputed class histograms =======================================
+# Happy path
+def test_compute_histograms_matches_numpy():
+    histograms = eda.compute_histograms(df_in, "class", bins=4, chunk_size=4)
+    for i, feat in enumerate(histograms["features"]):
+        edges = np.histogram_bin_edges(df_in[feat], 4)
+        assert np.array_equal(histograms["edges"][i], edges)
+        for j, cls in enumerate(histograms["classes"]):
+            expected, _ = np.histogram(df_in.loc[df_in["class"] == cls, feat], edges)
+            assert np.array_equal(histograms["counts"][i, j], expected)
+
+
+# Happy path
+def test_save_figures_writes_histogram_counts(tmp_path):
+    eda.save_figures(df_in, tmp_path, config)
+    with np.load(tmp_path / "histograms.npz") as saved:
+        assert saved["features"].tolist() == ["IR_mean", "log_entropy"]
+        assert saved["counts"].sum() == 2 * len(df_in)
+    with open(tmp_path / "histograms.json") as f:
+        assert sum(json.load(f)["IR_mean"]["counts"]["1"]) == 3
+
+
+# Happy path
+def test_save_figures_uses_configured_bins(tmp_path):
+    eda.save_figures(df_in, tmp_path, {**config, "hist.bins": 4})
+    with np.load(tmp_path / "histograms.npz") as saved:
+        assert saved["counts"].shape == (2, 2, 4)
+
+
+# Unhappy path
+def test_compute_histograms_non_finite():
+    with pytest.raises(ValueError):
+        eda.compute_histograms(df_in.assign(IR_mean=np.inf), "class")
@@ -0,0 +1,89 @@
+import mmap
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import artifact_io as aio
+
+
+df_in = pd.DataFrame({"IR_mean": [163.0, 167.0, 174.0],
+                      "log_entropy": [-3.673006104957646, -3.653512310276645, -2.682382454353632],
+                      "class": [0.0, 1.0, 1.0]})
+
+
+# Unit tests for artifact round trips =======================================
+# Happy path
+@pytest.mark.parametrize("fmt", ["csv", "npy", "parquet", "feather"])
+def test_artifact_round_trip(tmp_path, fmt):
+    if fmt in ("parquet", "feather"):
+        pytest.importorskip("pyarrow")
+    path = aio.artifact_path(tmp_path, "clouds", fmt)
+    aio.save_frame(df_in, path, fmt)
+    assert aio.infer_format(path) == fmt
+    pd.testing.assert_frame_equal(aio.load_frame(path), df_in, check_exact=True)
+    projected = aio.load_frame(path, columns=["class", "IR_mean"])
+    assert list(projected.columns) == ["class", "IR_mean"]
+
+
+# Happy path
+def test_artifact_npy_is_memory_mapped(tmp_path):
+    path = aio.artifact_path(tmp_path, "clouds", "npy")
+    aio.save_frame(df_in, path, "npy")
+    values = aio.load_frame(path, columns=["log_entropy"])["log_entropy"].to_numpy()
+    while isinstance(values, np.ndarray) and not isinstance(values, np.memmap):
+        values = values.base
+    assert isinstance(values, (np.memmap, mmap.mmap))
+
+
+# Unhappy path
+def test_artifact_unsupported_format(tmp_path):
+    with pytest.raises(ValueError):
+        aio.artifact_path(tmp_path, "clouds", "xlsx")
+
+
+# Happy path
+def test_artifact_compact_frame(tmp_path):
+    path = aio.artifact_path(tmp_path, "clouds", "csv")
+    aio.save_frame(df_in.astype({"class": "int8"}), path, "csv")
+    compact = aio.compact_frame(aio.load_frame(path))
+    assert compact.dtypes.tolist() == [np.float32, np.float32, np.int8]
+    assert np.array_equal(compact["log_entropy"], df_in["log_entropy"].astype(np.float32))
+    assert aio.compact_frame(compact) is compact
+
+
+# Unhappy path
+def test_artifact_missing_column(tmp_path):
+    path = aio.artifact_path(tmp_path, "clouds", "npy")
+    aio.save_frame(df_in, path, "npy")
+    with pytest.raises(KeyError):
+        aio.load_frame(path, columns=["IR_max"])
+
+
+# Happy path
+@pytest.mark.parametrize("fmt", ["csv", "npy", "parquet", "feather"])
+def test_artifact_chunked_round_trip(tmp_path, fmt):
+    if fmt in ("parquet", "feather"):
+        pytest.importorskip("pyarrow")
+    path = aio.artifact_path(tmp_path, "clouds", fmt)
+    with aio.FrameWriter(path, fmt, n_rows=len(df_in)) as writer:
+        writer.write(df_in.iloc[:2])
+        writer.write(df_in.iloc[2:])
+    assert aio.count_rows(path) == len(df_in)
+    chunks = list(aio.iter_frame_chunks(path, 2, columns=["class", "IR_mean"]))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True),
+                                  df_in[["class", "IR_mean"]], check_exact=True)
+
+
+# Unhappy path
+def test_frame_writer_keeps_error_raised_in_block(tmp_path):
+    path = aio.artifact_path(tmp_path, "clouds", "npy")
+    with pytest.raises(RuntimeError, match="scoring failed"):
+        with aio.FrameWriter(path, "npy", n_rows=len(df_in)) as writer:
+            writer.write(df_in.iloc[:1])
+            raise RuntimeError("scoring failed")
+    # A clean exit with missing rows is still an error
+    with pytest.raises(ValueError):
+        with aio.FrameWriter(path, "npy", n_rows=len(df_in)) as writer:
+            writer.write(df_in.iloc[:1])
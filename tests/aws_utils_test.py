@@ -0,0 +1,91 @@
+import json
+
+import boto3
+import pytest
+
+from src import aws_utils as aws
+
+moto = pytest.importorskip("moto")
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket="clouds")
+        yield client
+
+
+@pytest.fixture
+def artifacts(tmp_path):
+    run = tmp_path / "run"
+    (run / "figures").mkdir(parents=True)
+    (run / "clouds.csv").write_text("IR_mean,class\n163.0,0.0\n")
+    (run / "figures" / "IR_mean.png").write_bytes(b"\x89PNG" + bytes(range(256)) * 100)
+    (run / "metrics.yaml").write_text("AUC: 0.9\n")
+    return run
+
+
+def keys(s3):
+    return sorted(obj["Key"] for obj in s3.list_objects_v2(Bucket="clouds").get("Contents", []))
+
+
+# Unit tests for uploading artifacts ======================================
+# Happy path
+def test_upload_artifacts_skips_unchanged_files(s3, artifacts, tmp_path):
+    config = {"upload": True, "bucket_name": "clouds", "prefix": "experiments/",
+              "manifest": str(tmp_path / "manifest.json"), "multipart_threshold_mb": 0.01,
+              "multipart_chunksize_mb": 5}
+    uris = aws.upload_artifacts(artifacts, config)
+    assert uris == ["s3://clouds/experiments/clouds.csv", "s3://clouds/experiments/figures/IR_mean.png",
+                    "s3://clouds/experiments/metrics.yaml"]
+    assert keys(s3) == ["experiments/clouds.csv", "experiments/figures/IR_mean.png", "experiments/metrics.yaml"]
+    assert s3.get_object(Bucket="clouds", Key="experiments/figures/IR_mean.png")["Body"].read() \
+        == (artifacts / "figures" / "IR_mean.png").read_bytes()
+    assert set(json.loads((tmp_path / "manifest.json").read_text())) == set(uris)
+
+    # Only the changed file is uploaded again
+    for key in keys(s3):
+        s3.delete_object(Bucket="clouds", Key=key)
+    (artifacts / "metrics.yaml").write_text("AUC: 0.95\n")
+    assert aws.upload_artifacts(artifacts, config) == uris
+    assert keys(s3) == ["experiments/metrics.yaml"]
+
+
+def test_uploader_uploads_files_as_submitted(s3, artifacts):
+    config = {"upload": True, "bucket_name": "clouds", "prefix": "run/", "manifest": None}
+    uploader = aws.ArtifactUploader(artifacts, config)
+    uploader.submit([artifacts / "clouds.csv"])
+    uploader.submit([artifacts / "figures", artifacts / "clouds.csv"])
+    assert uploader.close() == ["s3://clouds/run/clouds.csv", "s3://clouds/run/figures/IR_mean.png"]
+    assert keys(s3) == ["run/clouds.csv", "run/figures/IR_mean.png"]
+
+
+# Unhappy path
+def test_upload_artifacts_retries_failed_files(s3, artifacts, monkeypatch):
+    calls = []
+    upload_file = aws._upload_file
+
+    def flaky_upload(client, file_path, bucket_name, s3_key, transfer_config):
+        calls.append(s3_key)
+        if s3_key.endswith("metrics.yaml") and calls.count(s3_key) == 1:
+            raise ConnectionError("connection reset")
+        upload_file(client, file_path, bucket_name, s3_key, transfer_config)
+
+    monkeypatch.setattr(aws, "_upload_file", flaky_upload)
+    config = {"upload": True, "bucket_name": "clouds", "prefix": "", "manifest": None, "retry_backoff": 0}
+    assert len(aws.upload_artifacts(artifacts, config)) == 3
+    assert sorted(calls) == ["clouds.csv", "figures/IR_mean.png", "metrics.yaml", "metrics.yaml"]
+
+    # Files failing every attempt are left out; the others are still uploaded
+    def failing_upload(client, file_path, bucket_name, s3_key, transfer_config):
+        if s3_key == "clouds.csv":
+            raise ConnectionError("connection reset")
+        upload_file(client, file_path, bucket_name, s3_key, transfer_config)
+
+    monkeypatch.setattr(aws, "_upload_file", failing_upload)
+    assert aws.upload_artifacts(artifacts, {**config, "retries": 1}) == [
+        "s3://clouds/figures/IR_mean.png", "s3://clouds/metrics.yaml"]
@@ -0,0 +1,74 @@
+import io
+
+import numpy as np
+import pytest
+import yaml
+
+from benchmarks import run
+from benchmarks import synthetic as syn
+from src import create_dataset as cd
+
+
+with open("config/default-config.yaml") as f:
+    config = yaml.safe_load(f)
+
+
+# Unit tests for the synthetic data generator ===========================
+# Happy path
+def test_format_rows_matches_savetxt():
+    values = np.round(np.random.default_rng(0).uniform(0, 9999.9999, (200, 10)), 4)
+    values[0] = 0.0
+    expected = io.BytesIO()
+    np.savetxt(expected, values, fmt="%9.4f", delimiter="")
+    assert syn.format_rows(values) == expected.getvalue()
+
+
+def test_write_raw_data_is_read_by_create_dataset(tmp_path):
+    cloud_data_index = syn.write_raw_data(tmp_path / "clouds.data", 2047, random_state=0)
+    # 2,047 rows land at the lines of the default configuration
+    assert cloud_data_index == config["create_dataset"]["cloud_data_index"]
+    data = cd.create_dataset(tmp_path / "clouds.data", config["create_dataset"])
+    assert data.shape == (2047, 11)
+    assert data["class"].value_counts().to_dict() == {0.0: 1024, 1.0: 1023}
+    assert (data["IR_max"] > data["IR_min"]).all()
+
+
+# Unhappy path
+def test_format_rows_rejects_values_out_of_width():
+    with pytest.raises(ValueError):
+        syn.format_rows(np.array([[-1.0]]))
+
+
+# Unit tests for the benchmark runner ===================================
+# Happy path
+def test_run_benchmarks_measures_selected_stages(tmp_path):
+    results = run.run_benchmarks([500], config, ("generate_features", "train_model"), repeat=1,
+                                 data_dir=tmp_path)
+    assert list(results) == ["generate_features@500", "train_model@500"]
+    assert results["train_model@500"]["rows"] == 300
+    assert results["generate_features@500"]["rows_per_second"] > 0
+
+
+def test_run_benchmarks_compares_dtypes(tmp_path):
+    results = run.run_benchmarks([2047], config, data_dir=tmp_path, dtypes=True)
+    report = results["dtypes@2047"]
+    assert report["compact"]["memory_mb"] < 0.6 * report["float64"]["memory_mb"]
+    assert report["compact"]["artifact_mb"] < 0.6 * report["float64"]["artifact_mb"]
+    assert abs(report["difference"]["auc"]) < 0.01
+
+
+def test_run_benchmarks_compares_training(tmp_path):
+    results = run.run_benchmarks([2047], config, data_dir=tmp_path, training=True)
+    report = results["training@2047"]
+    assert set(report) == {"in_memory", "out_of_core"}
+    assert all(0 < record["auc"] <= 1 and record["heap_mb"] > 0 for record in report.values())
+
+
+def test_compare_flags_slowdowns_beyond_threshold():
+    baselines = {"train_model@1000": {"wall_seconds": 1.0}, "score_model@1000": {"wall_seconds": 0.001}}
+    results = {"train_model@1000": {"wall_seconds": 1.3}, "score_model@1000": {"wall_seconds": 0.005},
+               "create_dataset@1000": {"wall_seconds": 9.0}}
+    assert run.compare(results, baselines, threshold=0.5) == []
+    regressions = run.compare(results, baselines, threshold=0.25)
+    # Timings below the noise floor and benchmarks without baseline never regress
+    assert len(regressions) == 1 and regressions[0].startswith("train_model@1000")
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import create_dataset as cd
+
+
+columns = ["visible_mean", "visible_max", "IR_mean"]
+raw_lines = ["header\n",
+             "  3.0000 140.0000 163.0000\n",
+             "  3.0000 135.0000 167.0000\n",
+             "  2.0000 126.0000 174.0000\n",
+             "\n",
+             "  4.0000 197.0000 155.0000\n",
+             "  7.0000 193.0000 150.0000\n"]
+config = {"columns": columns, "cloud_data_index": {"cloud1": [1, 4], "cloud2": [5, 7]}}
+
+
+@pytest.fixture
+def raw_data_path(tmp_path):
+    path = tmp_path / "clouds.data"
+    path.write_text("".join(raw_lines))
+    return path
+
+
+# Unit tests for the memory-mapped raw data parser =======================================
+# Happy path
+def test_create_dataset_mmap_matches_python_parser(raw_data_path):
+    python_df = cd.create_dataset(raw_data_path, {**config, "parser": "python"})
+    # A tiny chunk size forces blocks to be parsed in several pieces
+    mmap_df = cd.create_dataset(raw_data_path, {**config, "parser": "mmap", "chunk_size": 8})
+    pd.testing.assert_frame_equal(python_df, mmap_df, check_exact=True)
+    assert mmap_df["class"].tolist() == [0.0, 0.0, 0.0, 1.0, 1.0]
+    assert mmap_df.index.tolist() == [0, 1, 2, 0, 1]
+    assert np.array_equal(mmap_df["IR_mean"], [163.0, 167.0, 174.0, 155.0, 150.0])
+
+
+# Unhappy path
+def test_create_dataset_mmap_malformed_row(tmp_path):
+    path = tmp_path / "clouds.data"
+    path.write_text("".join(raw_lines).replace(" 135.0000", ""))
+    with pytest.raises(ValueError):
+        cd.create_dataset(path, config)
+
+
+# Unhappy path
+def test_create_dataset_missing_config_key(raw_data_path):
+    with pytest.raises(KeyError):
+        cd.create_dataset(raw_data_path, {"columns": columns})
+
+
+# Unit tests for compact dtypes =======================================
+# Happy path
+@pytest.mark.parametrize("parser", ["mmap", "python"])
+def test_create_dataset_compact_dtypes(raw_data_path, parser):
+    full_df = cd.create_dataset(raw_data_path, {**config, "parser": parser})
+    compact_df = cd.create_dataset(raw_data_path, {**config, "parser": parser, "compact_dtypes": True})
+    assert (compact_df[columns].dtypes == np.float32).all()
+    assert compact_df["class"].dtype == np.int8
+    assert np.array_equal(compact_df[columns], full_df[columns].astype(np.float32))
+    assert compact_df["class"].tolist() == [0, 0, 0, 1, 1]
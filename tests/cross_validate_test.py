@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import cross_validate as cv
+
+
+rng = np.random.default_rng(0)
+data = pd.DataFrame({"log_entropy": rng.normal(-3, 0.5, 300),
+                     "IR_norm_range": rng.uniform(0, 1, 300),
+                     "entropy_x_contrast": rng.uniform(0, 50, 300)})
+data["class"] = (data["IR_norm_range"] + rng.normal(0, 0.3, 300) > 0.5).astype(float)
+config = {"train_model": {"target": "class",
+                          "initial_features": ["log_entropy", "IR_norm_range", "entropy_x_contrast"],
+                          "model_params": {"n_estimators": 5, "max_depth": 3, "random_state": 0}},
+          "evaluate_performance": {"prob_col": "predicted_probability", "bin_col": "predicted_binary",
+                                   "target": "class"},
+          "cross_validate": {"n_splits": 3, "random_state": 0}}
+
+
+# Unit tests for cross-validation =======================================
+# Happy path
+def test_fold_indices_are_stratified_partition():
+    y = data["class"].to_numpy()
+    folds = cv.fold_indices(y, 3, random_state=0)
+    test_rows = np.sort(np.concatenate([test for _, test in folds]))
+    np.testing.assert_array_equal(test_rows, np.arange(len(y)))
+    for train, test in folds:
+        assert not np.intersect1d(train, test).size
+        assert abs(y[test].mean() - y.mean()) < 0.02
+
+
+# Happy path
+def test_cross_validate_parallel_matches_sequential():
+    sequential = cv.cross_validate(data, config)
+    parallel = cv.cross_validate(data, {**config, "cross_validate": {**config["cross_validate"], "processes": 2}})
+    assert sequential == parallel
+    assert len(sequential["folds"]) == 3
+    aucs = [fold["AUC"] for fold in sequential["folds"]]
+    assert sequential["AUC"]["mean"] == pytest.approx(np.mean(aucs))
+    assert sequential["AUC"]["std"] == pytest.approx(np.std(aucs, ddof=1))
+    assert np.sum(sequential["Confusion Matrix"]) == len(data)
+
+
+# Unhappy path
+def test_cross_validate_rejects_search():
+    params = {**config["train_model"]["model_params"], "max_depth": [3, 5]}
+    with pytest.raises(ValueError):
+        cv.cross_validate(data, {**config, "train_model": {**config["train_model"], "model_params": params}})
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from src import dag
+from src import profiling as prof
+from src import stage_cache as sc
+
+
+def write(name, text):
+    def run(values):
+        (values["dir"] / name).write_text(text)
+        return {name: text, "rows": 1}
+    return run
+
+
+# Unit tests for the stage graph ========================================
+# Happy path
+def test_topological_order_keeps_given_order():
+    stages = [dag.Stage("score", None, ("train",)), dag.Stage("acquire", None),
+              dag.Stage("train", None, ("acquire",))]
+    assert [stage.name for stage in dag.topological_order(stages)] == ["acquire", "train", "score"]
+
+
+# Unhappy path
+def test_topological_order_rejects_invalid_graphs():
+    with pytest.raises(ValueError, match="unknown"):
+        dag.topological_order([dag.Stage("train", None, ("features",))])
+    with pytest.raises(ValueError, match="depend on each other"):
+        dag.topological_order([dag.Stage("a", None, ("b",)), dag.Stage("b", None, ("a",))])
+
+
+# Unit tests for the executor ===========================================
+# Happy path
+def test_independent_stages_run_concurrently(tmp_path):
+    # Both branches must be running at once to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    outputs = []
+
+    def branch(name):
+        def run(values):
+            barrier.wait()
+            return {name: values["features"] + 1}
+        return run
+
+    stages = [dag.Stage("features", lambda values: {"features": 1}),
+              dag.Stage("analysis", branch("figures"), ("features",)),
+              dag.Stage("train", branch("model"), ("features",), outputs=("model.pkl",))]
+    profiler = prof.StageProfiler(tmp_path)
+    executor = dag.DagExecutor(tmp_path, profiler=profiler,
+                               on_output=lambda stage, paths: outputs.append((stage.name, paths)))
+    values = executor.run(stages)
+    assert values == {"features": 1, "figures": 2, "model": 2}
+    assert outputs == [("train", [tmp_path / "model.pkl"])]
+    assert profiler.stages["train"]["concurrent_with"] == ["analysis"]
+
+
+def test_cached_stages_are_restored(tmp_path):
+    cache = sc.StageCache(tmp_path / "cache")
+    (tmp_path / "run1").mkdir()
+    (tmp_path / "run2").mkdir()
+    for run_dir in ("run1", "run2"):
+        artifacts = tmp_path / run_dir
+        stages = [dag.Stage("setup", lambda values, artifacts=artifacts: {"dir": artifacts}, cacheable=False),
+                  dag.Stage("create", write("clouds.csv", "a,b\n"), ("setup",), outputs=("clouds.csv",),
+                            config={"columns": ["a", "b"]})]
+        values = dag.DagExecutor(artifacts, cache).run(stages)
+    assert cache.report() == {"create": "hit"}
+    assert "clouds.csv" not in values
+    assert (tmp_path / "run2" / "clouds.csv").read_text() == "a,b\n"
+
+
+# Unhappy path
+def test_failed_stage_stops_dependent_stages(tmp_path):
+    ran = []
+
+    def fail(values):
+        raise ValueError("bad data")
+
+    stages = [dag.Stage("create", fail),
+              dag.Stage("features", lambda values: ran.append("features"), ("create",))]
+    with pytest.raises(ValueError, match="bad data"):
+        dag.DagExecutor(tmp_path).run(stages)
+    assert ran == []
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+import sklearn.metrics
+import yaml
+
+from src import evaluate_performance as ep
+from src import score_model as sm
+
+
+rng = np.random.default_rng(0)
+y = rng.integers(0, 2, 500).astype(float)
+# Rounded scores produce ties, which every threshold must group
+proba = np.round(np.clip(0.3 * y + rng.uniform(size=500), 0, 1), 2)
+config = {"prob_col": "predicted_probability", "bin_col": "predicted_binary", "target": "class"}
+
+
+# Unit tests for the threshold curves ====================================
+# Happy path
+def test_threshold_curves_match_sklearn():
+    curves = ep.threshold_curves(y, proba)
+    fpr, tpr, thresholds = sklearn.metrics.roc_curve(y, proba, drop_intermediate=False)
+    np.testing.assert_array_equal(curves["thresholds"], thresholds)
+    np.testing.assert_allclose(curves["fpr"], fpr)
+    np.testing.assert_allclose(curves["tpr"], tpr)
+    accuracy = [sklearn.metrics.accuracy_score(y, proba >= t) for t in curves["thresholds"]]
+    np.testing.assert_allclose(curves["accuracy"], accuracy)
+    assert ep.curve_auc(curves) == pytest.approx(sklearn.metrics.roc_auc_score(y, proba))
+    assert ep.average_precision(curves) == pytest.approx(sklearn.metrics.average_precision_score(y, proba))
+
+
+
+# Unhappy path
+def test_threshold_curves_need_two_classes():
+    with pytest.raises(ValueError):
+        ep.threshold_curves(np.ones(5), np.linspace(0, 1, 5))
+    with pytest.raises(ValueError):
+        ep.evaluate_performance(pd.DataFrame({"predicted_probability": proba[:5], "predicted_binary": 1}),
+                                pd.DataFrame({"class": np.ones(5)}), config)
+
+# Unit tests for the bootstrap ===========================================
+# Happy path
+def test_bootstrap_auc_is_reproducible_and_batch_independent():
+    aucs = ep.bootstrap_auc(y, proba, 50, random_state=1)
+    np.testing.assert_array_equal(aucs, ep.bootstrap_auc(y, proba, 50, random_state=1))
+    # Replicate i resamples rows drawn by the i-th batch of random integers
+    draws = np.random.default_rng(1).integers(0, 500, (50, 500))
+    order = np.argsort(-proba, kind="mergesort")
+    expected = [sklearn.metrics.roc_auc_score(y[order][d], proba[order][d]) for d in draws]
+    np.testing.assert_allclose(aucs, expected)
+    assert len(ep.bootstrap_auc(y, proba, 50, random_state=1, batch_cells=7 * 500)) == 50
+
+
+# Unit tests for evaluate_performance ====================================
+# Happy path
+def test_evaluate_performance_structured_metrics(tmp_path):
+    scores = pd.DataFrame({"predicted_probability": proba, "predicted_binary": (proba > 0.5).astype(float)})
+    test = pd.DataFrame({"class": y})
+    metrics = ep.evaluate_performance(
+        scores, test, {**config, "curve_points": 11,
+                       "bootstrap": {"replicates": 200, "level": 0.9, "random_state": 0}})
+    assert metrics["AUC"] == pytest.approx(sklearn.metrics.roc_auc_score(y, proba))
+    interval = metrics["AUC Confidence Interval"]
+    assert interval["lower"] < metrics["AUC"] < interval["upper"]
+    assert len(metrics["Curves"]["thresholds"]) == 11
+    ep.save_metrics(metrics, tmp_path / "metrics.yaml")
+    with open(tmp_path / "metrics.yaml") as f:
+        saved = yaml.safe_load(f)
+    assert saved["AUC Confidence Interval"]["replicates"] == 200
+    assert saved["Best Threshold"]["accuracy"] >= saved["Accuracy"]
+
+
+
+# Happy path
+def test_best_threshold_reproduces_accuracy_when_scoring():
+    y_tied = np.array([0, 0, 1, 1, 1, 0, 1, 0])
+    p_tied = np.array([0.2, 0.4, 0.4, 0.6, 0.8, 0.1, 0.4, 0.3])
+    scores = pd.DataFrame({"predicted_probability": p_tied, "predicted_binary": (p_tied > 0.5).astype(int)})
+    best = ep.evaluate_performance(scores, pd.DataFrame({"class": y_tied}), config)["Best Threshold"]
+    assert best["accuracy"] == 0.875
+    predicted = sm.predict_binary(np.c_[1 - p_tied, p_tied], np.array([0, 1]), best["threshold"])
+    assert sklearn.metrics.accuracy_score(y_tied, predicted) == best["accuracy"]
+
+    # Predicting no positives at all is a candidate too
+    y_rare = np.array([0, 0, 0, 0, 1])
+    p_rare = np.array([0.1, 0.2, 0.3, 0.9, 0.8])
+    scores = pd.DataFrame({"predicted_probability": p_rare, "predicted_binary": (p_rare > 0.5).astype(int)})
+    best = ep.evaluate_performance(scores, pd.DataFrame({"class": y_rare}), config)["Best Threshold"]
+    assert best == {"threshold": 0.9, "accuracy": 0.8}
+    predicted = sm.predict_binary(np.c_[1 - p_rare, p_rare], np.array([0, 1]), best["threshold"])
+    assert sklearn.metrics.accuracy_score(y_rare, predicted) == best["accuracy"]
+
+# Unhappy path
+def test_evaluate_performance_missing_column():
+    scores = pd.DataFrame({"predicted_probability": proba})
+    with pytest.raises(KeyError):
+        ep.evaluate_performance(scores, pd.DataFrame({"class": y}), config)
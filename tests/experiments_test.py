@@ -0,0 +1,68 @@
+import copy
+
+import pandas as pd
+import pytest
+import yaml
+
+from benchmarks import synthetic as syn
+from src import acquire_data as ad
+from src import experiments as ex
+
+
+with open("config/default-config.yaml") as f:
+    default_config = yaml.safe_load(f)
+
+
+def experiment_config(tmp_path, **model_params):
+    config = copy.deepcopy(default_config)
+    config["run_config"].update(use_cache=False, profile={"enabled": False}, stage_workers=1,
+                                feature_store=str(tmp_path / "features"), cache_dir=str(tmp_path / "stages"),
+                                download_cache=str(tmp_path / "downloads"))
+    config["analysis"] = {}
+    config["train_model"]["model_params"] = {"n_estimators": 5, "random_state": 0, **model_params}
+    config["evaluate_performance"].update(bootstrap=None, curve_points=None)
+    return config
+
+
+# Unit tests for shared stage detection ==================================
+# Happy path
+def test_shared_stages_stop_at_first_difference(tmp_path):
+    base = experiment_config(tmp_path)
+    deeper = experiment_config(tmp_path, max_depth=3)
+    assert ex.shared_stages([base, deeper]) == ["acquire_data", "create_dataset", "generate_features",
+                                                "analysis"]
+    parsed = copy.deepcopy(base)
+    parsed["create_dataset"]["compact_dtypes"] = True
+    assert ex.shared_stages([base, parsed]) == ["acquire_data"]
+    assert ex.shared_stages([base, copy.deepcopy(base)]) == list(ex.stage_signatures(
+        base, ex.st.pipeline_stages(base, ex.st.run_paths(tmp_path, base))))
+
+
+# Unit tests for the experiment runner ===================================
+# Happy path
+def test_run_experiments_shares_upstream_outputs(tmp_path, monkeypatch):
+    downloads = []
+
+    def acquire_data(url, save_path, cache_dir=None, **kwargs):
+        downloads.append(save_path)
+        syn.write_raw_data(save_path, 2047)
+        return True
+
+    monkeypatch.setattr(ad, "acquire_data", acquire_data)
+    configs = {"shallow": experiment_config(tmp_path, max_depth=2),
+               "deep": experiment_config(tmp_path, max_depth=None)}
+    root = ex.run_experiments(configs, tmp_path / "runs")
+    assert len(downloads) == 1
+    # Shared outputs are linked into every run, not recomputed
+    shared = root / ex.SHARED_DIR / "cloud_cleaned.csv"
+    assert (root / "deep" / "cloud_cleaned.csv").stat().st_ino == shared.stat().st_ino
+    summary = pd.read_csv(root / ex.SUMMARY_FILE)
+    assert sorted(summary["experiment"]) == ["deep", "shallow"]
+    assert summary["AUC"].is_monotonic_decreasing
+    assert "train_model.model_params.max_depth" in summary.columns
+
+
+# Unhappy path
+def test_run_experiments_without_configs(tmp_path):
+    with pytest.raises(ValueError):
+        ex.run_experiments({}, tmp_path)
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import feature_store as fs
+from src import generate_features as gf
+
+
+rng = np.random.default_rng(0)
+data = pd.DataFrame({"visible_contrast": rng.uniform(1, 100, 50),
+                     "visible_entropy": rng.uniform(0.01, 0.2, 50),
+                     "IR_min": rng.uniform(100, 200, 50)})
+data["IR_max"] = data["IR_min"] + rng.uniform(0, 50, 50)
+data["IR_mean"] = (data["IR_min"] + data["IR_max"]) / 2
+config = {"log_transform": {"log_entropy": "visible_entropy"},
+          "calculate_range": {"IR_range": {"min_col": "IR_min", "max_col": "IR_max"}}}
+DATA_KEY = "clouds"
+
+
+# Unit tests for the feature store =======================================
+# Happy path
+def test_generate_computes_only_new_features(tmp_path):
+    store = fs.FeatureStore(tmp_path)
+    first = store.generate(data, config, DATA_KEY)
+    assert store.computed == ["log_entropy", "IR_range"] and store.loaded == []
+    # A new feature referring to a stored one is computed from the stored column
+    extended = {**config, "multiply": {"entropy_x_contrast": {"col_a": "visible_contrast", "col_b": "log_entropy"}},
+                "calculate_norm_range": {"IR_norm_range": {"min_col": "IR_min", "max_col": "IR_max",
+                                                           "mean_col": "IR_mean"}}}
+    second = store.generate(data, extended, DATA_KEY)
+    assert store.computed == ["entropy_x_contrast", "IR_norm_range"]
+    assert store.loaded == ["log_entropy", "IR_range"]
+    pd.testing.assert_frame_equal(second, gf.generate_features(data, extended), check_exact=True)
+    pd.testing.assert_frame_equal(first, gf.generate_features(data, config), check_exact=True)
+
+
+# Happy path
+def test_feature_keys_follow_upstream_definitions():
+    keys = fs.feature_keys({**config, "multiply": {"x": {"col_a": "log_entropy", "col_b": "IR_min"}}})
+    changed = fs.feature_keys({"log_transform": {"log_entropy": "visible_contrast"},
+                               "multiply": {"x": {"col_a": "log_entropy", "col_b": "IR_min"}}})
+    assert keys["x"] != changed["x"]
+    assert fs.feature_keys({"log_transform": {"other_name": "visible_entropy"}})["other_name"] == keys["log_entropy"]
+
+
+# Happy path
+def test_query_by_column(tmp_path):
+    store = fs.FeatureStore(tmp_path)
+    features = store.generate(data, config, DATA_KEY)
+    queried = store.query(DATA_KEY, ["IR_range", "log_entropy"], config)
+    assert np.array_equal(queried, features[["IR_range", "log_entropy"]])
+    assert np.array_equal(store.query(DATA_KEY, ["IR_range"])["IR_range"], features["IR_range"])
+
+
+# Unhappy path
+def test_query_missing_feature(tmp_path):
+    store = fs.FeatureStore(tmp_path)
+    store.generate(data, config, DATA_KEY)
+    with pytest.raises(KeyError):
+        store.query(DATA_KEY, ["entropy_x_contrast"])
+    with pytest.raises(KeyError):
+        store.query("other data", ["IR_range"], config)
@@ -132,3 +132,32 @@ def test_generate_features_calculate_norm_range():
 def test_generate_features_calculate_norm_range_wrong_key():
     with pytest.raises(KeyError):
         gf.calculate_norm_range(df_in, config_keyError['calculate_norm_range'])
+
+# Unit tests for the compiled feature plan =======================================
+# Happy path
+def test_generate_features_compiled_plan():
+    result_df = gf.generate_features(pd.DataFrame(data), config)
+    assert [round(x,5) for x in result_df['log_entropy']]==log_entropy_result
+    assert [round(x,5) for x in result_df['entropy_x_contrast']]==entropy_x_contrast_result
+    assert [round(x,5) for x in result_df['IR_range']]==IR_range_result
+    assert [round(x,5) for x in result_df['IR_norm_range']]==IR_norm_range_result
+
+# Happy path
+def test_generate_features_plan_shares_subexpressions():
+    plan = gf.compile_plan(config)
+    # IR_max - IR_min is computed once for both IR_range and IR_norm_range
+    assert [step[0] for step in plan.steps].count('subtract')==1
+    assert plan.outputs==['log_entropy', 'entropy_x_contrast', 'IR_range', 'IR_norm_range']
+
+# Unhappy path
+def test_generate_features_compiled_plan_wrong_key():
+    with pytest.raises(KeyError):
+        gf.generate_features(pd.DataFrame(data), config_keyError)
+
+# Happy path
+def test_generate_features_compact_dtypes():
+    compact_df = gf.generate_features(pd.DataFrame(data).astype('float32'), config)
+    full_df = gf.generate_features(pd.DataFrame(data).astype('float32').astype('float64'), config)
+    assert (compact_df[gf.compile_plan(config).outputs].dtypes == 'float32').all()
+    # Features are computed in double precision and rounded once
+    pd.testing.assert_frame_equal(compact_df, full_df.astype('float32'), check_exact=True)
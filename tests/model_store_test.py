@@ -0,0 +1,56 @@
+import mmap
+
+import numpy as np
+import pandas as pd
+import pytest
+import sklearn.ensemble
+
+from src import model_store as ms
+
+
+rng = np.random.default_rng(0)
+features = pd.DataFrame({"log_entropy": rng.normal(-3, 0.5, 300),
+                         "IR_norm_range": rng.uniform(0, 1, 300),
+                         "entropy_x_contrast": rng.uniform(0, 50, 300)})
+target = (features["IR_norm_range"] + rng.normal(0, 0.3, 300) > 0.5).astype(float)
+model = sklearn.ensemble.RandomForestClassifier(n_estimators=10, random_state=0).fit(features, target)
+
+
+# Unit tests for the model store ==========================================
+# Happy path
+@pytest.mark.parametrize("compress", [False, True])
+def test_mapped_forest_matches_model(tmp_path, compress):
+    ms.save_forest(model, tmp_path / "trained_model", ms.fingerprint_frame(features), compress)
+    loaded = ms.load_model(tmp_path / "trained_model")
+    assert isinstance(loaded, ms.MappedForest)
+    assert loaded.meta["data_fingerprint"] == ms.fingerprint_frame(features)
+    assert loaded.meta["params"]["n_estimators"] == 10
+    rows = features.copy()
+    rows.iloc[:5, 1] = np.nan
+    np.testing.assert_array_equal(loaded.predict_proba(rows), model.predict_proba(rows))
+    np.testing.assert_array_equal(loaded.predict(rows), model.predict(rows))
+
+
+# Happy path
+def test_fingerprint_frame_of_chunks():
+    chunks = [features.iloc[:7], features.iloc[7:]]
+    assert ms.fingerprint_frame(chunks) == ms.fingerprint_frame(features)
+    assert ms.fingerprint_frame(features.iloc[1:]) != ms.fingerprint_frame(features)
+
+
+# Happy path
+def test_mapped_forest_is_lazy_and_memory_mapped(tmp_path):
+    ms.save_forest(model, tmp_path / "trained_model")
+    loaded = ms.load_model(tmp_path / "trained_model")
+    assert loaded._arrays is None
+    loaded.predict_proba(features.iloc[:1])
+    children = loaded.arrays["children"]
+    while isinstance(children, np.ndarray) and not isinstance(children, np.memmap):
+        children = children.base
+    assert isinstance(children, (np.memmap, mmap.mmap))
+
+
+# Unhappy path
+def test_save_forest_unfitted_model(tmp_path):
+    with pytest.raises(ValueError):
+        ms.save_forest(sklearn.ensemble.RandomForestClassifier(), tmp_path / "trained_model")
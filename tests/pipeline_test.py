@@ -0,0 +1,61 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+import yaml
+
+from benchmarks.synthetic import write_raw_data
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def run_pipeline(*args, importtime=False):
+    options = ["-X", "importtime"] if importtime else []
+    return subprocess.run([sys.executable, *options, "pipeline.py", *args], cwd=ROOT,
+                          capture_output=True, text=True, timeout=120)
+
+
+def imported_modules(stderr):
+    # -X importtime writes "import time: self | cumulative | module" per import
+    return {line.rsplit("|", 1)[1].strip() for line in stderr.splitlines() if line.startswith("import time:")}
+
+
+# Unit tests for the command line =======================================
+# Happy path
+def test_help_starts_without_heavy_imports():
+    for args in (["--help"], ["score", "--help"], ["upload", "--help"], ["experiments", "--help"]):
+        result = run_pipeline(*args, importtime=True)
+        assert result.returncode == 0
+        modules = imported_modules(result.stderr)
+        assert "yaml" in modules
+        assert not modules & {"pandas", "matplotlib", "sklearn", "boto3"}
+
+
+def test_stage_commands_read_and_write_the_run_directory(tmp_path):
+    # Caches go to the test directory rather than the checkout
+    with open(ROOT / "config" / "default-config.yaml") as f:
+        config = yaml.safe_load(f)
+    config["run_config"].update(feature_store=str(tmp_path / "features"), cache_dir=str(tmp_path / "stages"),
+                                download_cache=str(tmp_path / "downloads"))
+    with open(tmp_path / "config.yaml", "w") as f:
+        yaml.dump(config, f)
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    write_raw_data(run_dir / "clouds.data", 2047)
+    for command in ("create", "featurize"):
+        result = run_pipeline(command, "--run-dir", str(run_dir), "--config", str(tmp_path / "config.yaml"))
+        assert result.returncode == 0, result.stdout + result.stderr
+    features = pd.read_csv(run_dir / "cloud_cleaned.csv")
+    assert len(features) == 2047 and "log_entropy" in features
+    assert any((tmp_path / "features").rglob("*.npy"))
+    # The configuration is kept with the artifacts for later commands
+    assert (run_dir / "config.yaml").exists()
+
+
+# Unhappy path
+def test_stage_command_needs_existing_run_directory(tmp_path):
+    result = run_pipeline("score", "--run-dir", str(tmp_path / "missing"), "--config", "config/default-config.yaml")
+    assert result.returncode != 0
+    assert "does not exist" in result.stdout + result.stderr
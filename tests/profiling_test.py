@@ -0,0 +1,77 @@
+import json
+import pstats
+import threading
+import time
+
+import numpy as np
+
+from src import profiling as prof
+
+
+# Unit tests for the stage profiler =====================================
+# Happy path
+def test_stage_records_time_memory_and_throughput(tmp_path):
+    profiler = prof.StageProfiler(tmp_path, trace_memory=True)
+    with profiler.stage("create_dataset") as stage:
+        data = np.ones(4_000_000)
+        stage["rows"] = len(data)
+    record = profiler.stages["create_dataset"]
+    assert record["wall_seconds"] > 0
+    assert record["cpu_seconds"] >= 0
+    assert record["peak_rss_mb"] >= 30
+    assert record["tracemalloc_peak_mb"] >= 30
+    assert record["rows_per_second"] == record["rows"] / record["wall_seconds"]
+
+
+def test_save_writes_profile_and_cprofile_dumps(tmp_path):
+    profiler = prof.StageProfiler(tmp_path, cprofile=True)
+    with profiler.stage("train_model"):
+        sorted(range(1000))
+    with profiler.stage("score_model"):
+        pass
+    path = profiler.save()
+    with open(path) as f:
+        profile = json.load(f)
+    assert path == tmp_path / prof.PROFILE_FILE
+    assert list(profile["stages"]) == ["train_model", "score_model"]
+    assert profile["stages"]["train_model"]["rows_per_second"] is None
+    stats = pstats.Stats(str(tmp_path / profile["stages"]["train_model"]["cprofile"]))
+    assert any("sorted" in name for _, _, name in stats.stats)
+
+
+
+def test_save_records_elapsed_time_of_concurrent_stages(tmp_path):
+    profiler = prof.StageProfiler(tmp_path)
+
+    def stage(name):
+        with profiler.stage(name):
+            time.sleep(0.3)
+
+    threads = [threading.Thread(target=stage, args=(name,)) for name in ("analysis", "train_model")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(profiler.save()) as f:
+        profile = json.load(f)
+    assert profile["stage_seconds_sum"] >= 0.6
+    assert 0.3 <= profile["wall_seconds"] < profile["stage_seconds_sum"]
+
+# Unhappy path
+def test_disabled_profiler_records_nothing(tmp_path):
+    profiler = prof.StageProfiler(tmp_path, enabled=False)
+    with profiler.stage("acquire_data") as stage:
+        stage["rows"] = 10
+    assert profiler.stages == {}
+    assert profiler.save() is None
+    assert not (tmp_path / prof.PROFILE_FILE).exists()
+
+
+def test_stage_is_recorded_when_it_fails(tmp_path):
+    profiler = prof.StageProfiler(tmp_path)
+    try:
+        with profiler.stage("analysis"):
+            raise ValueError("bad figure")
+    except ValueError:
+        pass
+    assert "wall_seconds" in profiler.stages["analysis"]
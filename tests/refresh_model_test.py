@@ -0,0 +1,100 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import sklearn.ensemble
+import yaml
+
+from benchmarks.synthetic import write_raw_data
+from src import create_dataset as cd
+from src import model_store as ms
+from src import refresh_model as rm
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+rng = np.random.default_rng(0)
+
+
+def batch(n):
+    data = pd.DataFrame({"log_entropy": rng.normal(-3, 0.5, n),
+                         "IR_norm_range": rng.uniform(0, 1, n),
+                         "entropy_x_contrast": rng.uniform(0, 50, n)})
+    data["class"] = (data["IR_norm_range"] + rng.normal(0, 0.3, n) > 0.5).astype(float)
+    return data
+
+
+features = ["log_entropy", "IR_norm_range", "entropy_x_contrast"]
+history, new = batch(300), batch(100)
+config = {"target": "class", "initial_features": features, "n_new_trees": 4}
+
+
+def fitted():
+    return sklearn.ensemble.RandomForestClassifier(n_estimators=6, random_state=0).fit(history[features], history["class"])
+
+
+# Unit tests for refreshing models ======================================
+# Happy path
+def test_refresh_model_appends_trees():
+    model = fitted()
+    old_trees = list(model.estimators_)
+    lineage = rm.load_lineage("missing", history)
+    model, new_lineage = rm.refresh_model(model, new, config, lineage)
+    assert len(model.estimators_) == model.n_estimators == 10
+    assert model.estimators_[:6] == old_trees
+    assert new_lineage["version"] == 2 and len(new_lineage["fingerprints"]) == 2
+    assert model.predict_proba(new[features]).shape == (100, 2)
+
+
+# Happy path
+def test_refresh_model_replaces_oldest_trees():
+    model = fitted()
+    old_trees = list(model.estimators_)
+    model, _ = rm.refresh_model(model, new, {**config, "mode": "replace"}, rm.load_lineage("missing", history))
+    assert len(model.estimators_) == 6
+    assert model.estimators_[:2] == old_trees[4:]
+
+
+# Unhappy path
+def test_refresh_model_rejects_same_batch_and_missing_class():
+    lineage = rm.load_lineage("missing", history)
+    model, lineage = rm.refresh_model(fitted(), new, config, lineage)
+    with pytest.raises(ValueError):
+        rm.refresh_model(model, new, config, lineage)
+    with pytest.raises(ValueError):
+        rm.refresh_model(model, new[new["class"] == 1.0], config, lineage)
+
+
+# Unit tests for the refresh command ====================================
+# Happy path
+def test_refresh_command_on_mapped_store_run(tmp_path):
+    with open(ROOT / "config" / "default-config.yaml") as f:
+        run_config = yaml.safe_load(f)
+    run_config["run_config"].update(feature_store=None, cache_dir=str(tmp_path / "stages"))
+    run_config["train_model"]["model_store"]["format"] = "mapped"
+    run_config["train_model"]["model_params"].update(n_estimators=5, max_depth=3)
+    with open(tmp_path / "config.yaml", "w") as f:
+        yaml.dump(run_config, f)
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    write_raw_data(run_dir / "clouds.data", 2047)
+    for command in ("create", "featurize", "train"):
+        result = subprocess.run([sys.executable, "pipeline.py", command, "--run-dir", str(run_dir),
+                                 "--config", str(tmp_path / "config.yaml")],
+                                cwd=ROOT, capture_output=True, text=True, timeout=120)
+        assert result.returncode == 0, result.stdout + result.stderr
+
+    write_raw_data(tmp_path / "new.data", 2047, random_state=1)
+    cd.create_dataset(tmp_path / "new.data", run_config["create_dataset"]).to_csv(tmp_path / "new.csv", index=False)
+    result = subprocess.run([sys.executable, "refresh.py", "--run-dir", str(run_dir), "--new-data",
+                             str(tmp_path / "new.csv"), "--output", str(tmp_path / "refreshed")],
+                            cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stdout + result.stderr
+    (output,) = (tmp_path / "refreshed").iterdir()
+    n_trees = 5 + run_config["refresh_model"]["n_new_trees"]
+    assert len(ms.load_model(ms.model_path(output, "pickle")).estimators_) == n_trees
+    assert len(ms.load_model(ms.model_path(output, "mapped")).arrays["roots"]) == n_trees
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+import sklearn.ensemble
+
+from src import artifact_io as aio
+from src import score_model as sm
+
+
+rng = np.random.default_rng(0)
+features = pd.DataFrame({"log_entropy": rng.normal(-3, 0.5, 200),
+                         "IR_norm_range": rng.uniform(0, 1, 200),
+                         "entropy_x_contrast": rng.uniform(0, 50, 200)})
+target = (features["IR_norm_range"] + rng.normal(0, 0.3, 200) > 0.5).astype(float)
+model = sklearn.ensemble.RandomForestClassifier(n_estimators=10, max_depth=4, random_state=0)
+model.fit(features, target)
+config = {"initial_features": ["log_entropy", "IR_norm_range", "entropy_x_contrast"]}
+
+
+# Unit tests for scoring ==================================================
+# Happy path
+def test_score_model_matches_predict():
+    scores = sm.score_model(features, model, config)
+    np.testing.assert_array_equal(scores["predicted_probability"], model.predict_proba(features)[:, 1])
+    np.testing.assert_array_equal(scores["predicted_binary"], model.predict(features))
+
+
+# Happy path
+def test_score_model_threshold():
+    scores = sm.score_model(features, model, {**config, "threshold": 0.8})
+    expected = (model.predict_proba(features)[:, 1] > 0.8).astype(float)
+    np.testing.assert_array_equal(scores["predicted_binary"], expected)
+
+
+# Happy path
+@pytest.mark.parametrize("fmt,processes", [("csv", 1), ("npy", 2)])
+def test_score_file_matches_in_memory(tmp_path, fmt, processes):
+    test_path = aio.artifact_path(tmp_path, "test", fmt)
+    aio.save_frame(features.assign(**{"class": target}), test_path, fmt)
+    pd.to_pickle(model, tmp_path / "trained_model_object.pkl")
+    scores_path = aio.artifact_path(tmp_path, "scores", fmt)
+    n_rows = sm.score_file(test_path, tmp_path / "trained_model_object.pkl", scores_path,
+                           {**config, "chunksize": 64, "processes": processes}, fmt)
+    assert n_rows == len(features)
+    pd.testing.assert_frame_equal(aio.load_frame(scores_path), sm.score_model(features, model, config),
+                                  check_exact=fmt != "csv")
+
+
+# Unhappy path
+def test_score_model_missing_feature():
+    with pytest.raises(KeyError):
+        sm.score_model(features.drop(columns="IR_norm_range"), model, config)
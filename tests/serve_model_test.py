@@ -0,0 +1,77 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pytest
+import sklearn.ensemble
+
+from src import generate_features as gf
+from src import score_model as sm
+from src import serve_model as srv
+
+
+rng = np.random.default_rng(0)
+raw = pd.DataFrame({"visible_contrast": rng.uniform(100, 900, 60),
+                    "visible_entropy": rng.uniform(0.02, 0.2, 60),
+                    "IR_mean": rng.uniform(90, 180, 60),
+                    "IR_max": rng.uniform(220, 240, 60),
+                    "IR_min": rng.uniform(170, 220, 60)})
+config = {"generate_features": {"calculate_norm_range": {"IR_norm_range": {"min_col": "IR_min", "max_col": "IR_max", "mean_col": "IR_mean"}},
+                                "log_transform": {"log_entropy": "visible_entropy"},
+                                "multiply": {"entropy_x_contrast": {"col_a": "visible_contrast", "col_b": "visible_entropy"}}},
+          "score_model": {"initial_features": ["log_entropy", "IR_norm_range", "entropy_x_contrast"]},
+          "serve_model": {"port": 0, "max_wait_ms": 5}}
+features = gf.generate_features(raw, config["generate_features"])
+model = sklearn.ensemble.RandomForestClassifier(n_estimators=5, max_depth=3, random_state=0)
+model.fit(features[config["score_model"]["initial_features"]], rng.integers(0, 2, 60).astype(float))
+
+
+@pytest.fixture
+def server_url(tmp_path):
+    pd.to_pickle(model, tmp_path / "trained_model_object.pkl")
+    server, batcher = srv.create_server(tmp_path / "trained_model_object.pkl", config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://%s:%s" % server.server_address[:2]
+    server.shutdown()
+    server.server_close()
+    batcher.close()
+
+
+def post(url, payload):
+    request = urllib.request.Request(url + "/score", data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+# Unit tests for the scoring server =======================================
+# Happy path
+def test_serve_model_matches_batch_scoring(server_url):
+    expected = sm.score_model(features, model, config["score_model"])
+    results = [None] * 6
+
+    def client(i):
+        results[i] = post(server_url, {"rows": raw.iloc[i * 10 : (i + 1) * 10].to_dict(orient="records")})
+
+    # Concurrent requests are scored in shared micro-batches
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    probability = sum((result["predicted_probability"] for result in results), [])
+    binary = sum((result["predicted_binary"] for result in results), [])
+    assert probability == expected["predicted_probability"].tolist()
+    assert binary == expected["predicted_binary"].tolist()
+
+
+# Unhappy path
+def test_serve_model_missing_column(server_url):
+    with pytest.raises(urllib.error.HTTPError) as e:
+        post(server_url, {"rows": raw.drop(columns="IR_min").iloc[:2].to_dict(orient="records")})
+    # The error response holds the connection until it is closed
+    e.value.close()
+    assert e.value.code == 400
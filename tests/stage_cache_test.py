@@ -0,0 +1,38 @@
+from src import stage_cache as sc
+
+
+# Unit tests for stage cache keys =======================================
+# Happy path
+def test_stage_cache_key_changes_with_config(tmp_path):
+    raw = tmp_path / "clouds.data"
+    raw.write_text("1 2 3\n")
+    cache = sc.StageCache(tmp_path / "cache")
+    key = cache.key("create_dataset", [raw], {"columns": ["a"]})
+    assert key == cache.key("create_dataset", [raw], {"columns": ["a"]})
+    assert key != cache.key("create_dataset", [raw], {"columns": ["b"]})
+    raw.write_text("1 2 4\n")
+    assert key != cache.key("create_dataset", [raw], {"columns": ["a"]})
+
+
+# Unit tests for storing and restoring stage outputs =======================================
+# Happy path
+def test_stage_cache_restore_after_store(tmp_path):
+    run1, run2 = tmp_path / "run1", tmp_path / "run2"
+    (run1 / "figures").mkdir(parents=True)
+    (run1 / "figures" / "a.png").write_bytes(b"png")
+    (run1 / "scores.csv").write_text("x\n1\n")
+    cache = sc.StageCache(tmp_path / "cache")
+    cache.store("stage", "abc", run1, ["figures", "scores.csv"])
+    run2.mkdir()
+    assert cache.restore("stage", "abc", run2, ["figures", "scores.csv"])
+    assert (run2 / "figures" / "a.png").read_bytes() == b"png"
+    assert cache.report() == {"stage": "hit"}
+
+
+# Unhappy path
+def test_stage_cache_miss_when_disabled(tmp_path):
+    (tmp_path / "scores.csv").write_text("x\n1\n")
+    cache = sc.StageCache(tmp_path / "cache", enabled=False)
+    cache.store("stage", "abc", tmp_path, ["scores.csv"])
+    assert not cache.restore("stage", "abc", tmp_path, ["scores.csv"])
+    assert not (tmp_path / "cache").exists()
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+import sklearn.ensemble
+import sklearn.model_selection
+
+from src import artifact_io as aio
+from src import train_model as tm
+
+
+rng = np.random.default_rng(0)
+data = pd.DataFrame({"log_entropy": rng.normal(-3, 0.5, 400),
+                     "IR_norm_range": rng.uniform(0, 1, 400),
+                     "entropy_x_contrast": rng.uniform(0, 50, 400)})
+data["class"] = (data["IR_norm_range"] + rng.normal(0, 0.3, 400) > 0.5).astype(float)
+config = {"target": "class", "test_size": 0.4,
+          "initial_features": ["log_entropy", "IR_norm_range", "entropy_x_contrast"],
+          "model_params": {"n_estimators": [5, 10], "max_depth": [2, None], "random_state": 0},
+          "search": {"random_state": 0}}
+
+
+# Unit tests for hyperparameter search ====================================
+# Happy path
+def test_sample_candidates_grid_and_random():
+    assert not tm.is_search({"n_estimators": 10, "max_depth": 10})
+    assert tm.is_search(config["model_params"])
+    grid = tm.sample_candidates(config["model_params"])
+    assert len(grid) == 4 and {"n_estimators": 10, "max_depth": None, "random_state": 0} in grid
+    params = {"n_estimators": {"distribution": "randint", "low": 5, "high": 50},
+              "max_features": {"distribution": "uniform", "low": 0.2, "high": 1.0},
+              "criterion": ["gini", "entropy"]}
+    sampled = tm.sample_candidates(params, n_iter=6, random_state=1)
+    assert sampled == tm.sample_candidates(params, n_iter=6, random_state=1)
+    assert len(sampled) == 6
+    assert all(5 <= c["n_estimators"] < 50 and 0.2 <= c["max_features"] <= 1.0 for c in sampled)
+
+
+# Happy path
+def test_search_model_refits_best_candidate():
+    model, split, leaderboard = tm.search_model(data, config)
+    assert len(split.train_index) == 240 and len(split.test_index) == 160
+    assert list(leaderboard["rank"]) == [1, 2, 3, 4]
+    assert leaderboard["score"].is_monotonic_decreasing
+    best = leaderboard.iloc[0]
+    assert model.n_estimators == best["n_estimators"]
+    assert len(model.estimators_) == best["n_estimators"]
+
+
+# Unit tests for the index-based train/test split ============================
+# Happy path
+def test_split_data_matches_frame_split():
+    split = tm.split_data(data, "class", 0.4, random_state=42)
+    X_train, X_test, y_train, y_test = sklearn.model_selection.train_test_split(
+        data.drop(columns=["class"]), data["class"], test_size=0.4, random_state=42)
+    expected = X_test.copy()
+    expected["class"] = y_test
+    pd.testing.assert_frame_equal(split.test(), expected)
+    pd.testing.assert_frame_equal(split.train(["class"]), y_train.to_frame())
+    assert split.rows(split.test_index[:0]).columns.tolist() == split.columns
+
+
+# Happy path
+def test_save_data_writes_split_in_chunks(tmp_path):
+    model, split = tm.train_model(data, {**config, "model_params": {"n_estimators": 5, "random_state": 0}})
+    assert list(model.feature_names_in_) == config["initial_features"]
+    tm.save_data(split, tmp_path, "npy", chunksize=70)
+    pd.testing.assert_frame_equal(aio.load_frame(tmp_path / "train"), split.train().reset_index(drop=True))
+    pd.testing.assert_frame_equal(aio.load_frame(tmp_path / "test"), split.test().reset_index(drop=True))
+
+
+# Unit tests for out-of-core training ======================================
+# Happy path
+def test_train_model_out_of_core_merges_bucket_forests(tmp_path):
+    aio.save_frame(data, tmp_path / "features.csv")
+    ooc_config = {**config, "random_state": 0, "model_params": {"n_estimators": 7, "max_depth": 3, "random_state": 0},
+                  "out_of_core": {"chunksize": 64, "buckets": 3}}
+    model, n_train = tm.train_model_out_of_core(tmp_path / "features.csv", tmp_path, ooc_config)
+    assert model.n_estimators == len(model.estimators_) == 7
+    train, test = aio.load_frame(tmp_path / "train.csv"), aio.load_frame(tmp_path / "test.csv")
+    assert len(train) == n_train and len(train) + len(test) == len(data)
+    assert list(test.columns) == list(data.columns)
+    # The merged forest scores like any fitted forest
+    proba = model.predict_proba(test[config["initial_features"]])
+    assert proba.shape == (len(test), 2) and np.allclose(proba.sum(axis=1), 1)
+    again, _ = tm.train_model_out_of_core(tmp_path / "features.csv", tmp_path, ooc_config)
+    assert np.array_equal(again.predict_proba(test[config["initial_features"]]), proba)
+
+
+
+# Happy path
+def test_train_model_out_of_core_unseeded_split_varies(tmp_path):
+    aio.save_frame(data, tmp_path / "features.csv")
+    ooc_config = {**config, "random_state": None, "model_params": {"n_estimators": 2, "max_depth": 2},
+                  "out_of_core": {"chunksize": 64, "buckets": 2}}
+    tests = []
+    for run in ("first", "second"):
+        (tmp_path / run).mkdir()
+        tm.train_model_out_of_core(tmp_path / "features.csv", tmp_path / run, ooc_config)
+        tests.append(aio.load_frame(tmp_path / run / "test.csv"))
+    seeded = tmp_path / "seeded"
+    seeded.mkdir()
+    tm.train_model_out_of_core(tmp_path / "features.csv", seeded, {**ooc_config, "random_state": 0})
+    assert not tests[0].equals(tests[1])
+    assert not aio.load_frame(seeded / "test.csv").equals(tests[0])
+
+# Unhappy path
+def test_merge_forests_with_different_classes():
+    params = {"n_estimators": 2, "random_state": 0}
+    forests = [sklearn.ensemble.RandomForestClassifier(**params).fit(data[config["initial_features"]], y)
+               for y in (data["class"], data["class"] + 1)]
+    with pytest.raises(ValueError):
+        tm.merge_forests(forests)
+
+
+# Unhappy path
+def test_split_data_missing_target():
+    with pytest.raises(KeyError):
+        tm.split_data(data, "label", 0.4)
+
+
+# Unhappy path
+def test_sample_candidates_unknown_distribution():
+    with pytest.raises(ValueError):
+        tm.sample_candidates({"max_depth": {"distribution": "poisson"}})